@@ -72,8 +72,22 @@ else:
         }
     }
 
+# Conexões persistentes do ORM, validadas antes de reusar
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Pool async (psycopg_pool) do StreamService. Cada long polling só segura uma
+# conexão durante o claim, então max_size dimensiona-se pelos claims
+# simultâneos, não por PIX_MAX_STREAMS_PER_ISPB x ISPBs atendidos.
+PIX_DB_POOL_MIN_SIZE = int(os.getenv('PIX_DB_POOL_MIN_SIZE', '2'))
+PIX_DB_POOL_MAX_SIZE = int(os.getenv('PIX_DB_POOL_MAX_SIZE', '20'))
+PIX_DB_POOL_TIMEOUT = float(os.getenv('PIX_DB_POOL_TIMEOUT', '5'))  # segundos esperando conexão
+PIX_DB_POOL_MAX_IDLE = float(os.getenv('PIX_DB_POOL_MAX_IDLE', '300'))  # segundos
+
 # Redis
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+PIX_REDIS_MAX_CONNECTIONS = int(os.getenv('PIX_REDIS_MAX_CONNECTIONS', '50'))
+PIX_REDIS_POOL_TIMEOUT = float(os.getenv('PIX_REDIS_POOL_TIMEOUT', '5'))  # segundos esperando conexão
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -110,5 +124,55 @@ SPECTACULAR_SETTINGS = {
 
 # PIX Config
 PIX_LONG_POLLING_TIMEOUT = 8  # segundos
+# Teto do linger pedido em `Prefer: linger=M` (ms): lote parcial espera encher
+PIX_MAX_LINGER_MS = int(os.getenv('PIX_MAX_LINGER_MS', '1000'))
 PIX_MAX_STREAMS_PER_ISPB = 6
 PIX_MAX_MESSAGES_PER_REQUEST = 10
+# Teto do max-messages negociado no Accept (multipart/json; max-messages=N)
+PIX_MULTIPART_MAX_MESSAGES = int(os.getenv('PIX_MULTIPART_MAX_MESSAGES', '500'))
+# Compressão dos streams por Accept-Encoding, na ordem de preferência do servidor
+PIX_COMPRESSION_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv('PIX_COMPRESSION_ENCODINGS', 'zstd,gzip').split(',')
+    if encoding.strip()
+]
+PIX_COMPRESSION_MIN_BYTES = int(os.getenv('PIX_COMPRESSION_MIN_BYTES', '1024'))  # abaixo disso vai sem compressão
+PIX_MAX_ACK_BATCH = 1000
+PIX_MAX_INGEST_BATCH = 1000  # mensagens por POST de ingestão (um INSERT só)
+PIX_GENERATE_MAX_MESSAGES = 10_000  # teto do endpoint utilitário de mensagens fake
+# Grava na ingestão o JSON de entrega de cada mensagem; o claim devolve só
+# id e payload e a resposta concatena os bytes guardados
+PIX_PRERENDERED_PAYLOAD = os.getenv('PIX_PRERENDERED_PAYLOAD', 'False') == 'True'
+# Claim listrado: cada stream busca primeiro na sua faixa de buckets do ISPB
+# e só rouba dos outros quando ela esvazia (menos SKIP LOCKED entre irmãos)
+PIX_STRIPED_CLAIM = os.getenv('PIX_STRIPED_CLAIM', 'False') == 'True'
+PIX_STREAM_LEASE_TTL = 60  # segundos sem leitura até o stream ser reciclado
+# Estado dos streams ativos: postgres (pix_stream) ou redis (hash por stream,
+# com pix_stream gravada em lote como histórico)
+PIX_STREAM_REGISTRY = os.getenv('PIX_STREAM_REGISTRY', 'postgres')
+PIX_STREAM_HISTORY_FLUSH_INTERVAL = 5  # segundos
+PIX_STREAM_HISTORY_BATCH_SIZE = 500
+PIX_STREAM_RETENTION_DAYS = 7  # streams fechados mantidos em pix_stream
+# pix_message particionada por dia (manage.py partition_messages)
+PIX_MESSAGE_PARTITION_DAYS_AHEAD = 3
+PIX_MESSAGE_RETENTION_DAYS = 30  # partições só saem com tudo confirmado
+# Claim só olha mensagens criadas nos últimos N dias (partições quentes);
+# o maintain traz as pendentes antigas para dentro. 0 desliga.
+PIX_CLAIM_HORIZON_DAYS = int(os.getenv('PIX_CLAIM_HORIZON_DAYS', '0')) or None
+# Pull-Next assinado (HMAC) com stream, iteração e lease: a continuação
+# dispensa a consulta ao Stream enquanto o lease não vence
+PIX_SIGNED_CURSORS = os.getenv('PIX_SIGNED_CURSORS', 'False') == 'True'
+# Segundos até uma mensagem entregue e não confirmada voltar para a fila.
+# 0 desliga o sweeper.
+PIX_VISIBILITY_TIMEOUT = int(os.getenv('PIX_VISIBILITY_TIMEOUT', '0')) or None
+PIX_SWEEPER_IN_PROCESS = os.getenv('PIX_SWEEPER_IN_PROCESS', 'False') == 'True'
+PIX_SWEEPER_INTERVAL = 30  # segundos
+PIX_SWEEPER_CHUNK_SIZE = 1000
+# Mensagens reservadas por claim para ISPBs com backlog, servidas da memória
+# nas leituras seguintes do stream. 0 desliga.
+PIX_PREFETCH_SIZE = int(os.getenv('PIX_PREFETCH_SIZE', '0'))
+PIX_PREFETCH_MAX_MESSAGES = 5000  # teto de mensagens em buffer por processo
+PIX_PREFETCH_MAX_AGE = 10  # segundos até devolver o que não foi servido
+PIX_POLL_INTERVAL = 0.5  # segundos, polling sem notificação
+# Backend que acorda o long polling: postgres (LISTEN/NOTIFY), redis (pub/sub) ou none
+PIX_NOTIFIER_BACKEND = os.getenv('PIX_NOTIFIER_BACKEND', 'postgres')
+PIX_NOTIFIER_FALLBACK_INTERVAL = 2  # segundos, polling de segurança com notificação
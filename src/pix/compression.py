@@ -0,0 +1,134 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_header_parameters
+import zstandard
+
+GZIP, ZSTD = 'gzip', 'zstd'
+GZIP_LEVEL = 6
+GZIP_WBITS = 31  # deflate com cabeçalho gzip
+ZSTD_LEVEL = 3
+# Contextos zstd livres para a próxima resposta (criar um custa mais que comprimir um lote)
+ZSTD_POOL_SIZE = 32
+# Em streaming, flush a cada tanto de entrada: flush por parte custa CPU e taxa
+FLUSH_BYTES = 16 * 1024
+_zstd_pool: list[zstandard.ZstdCompressor] = []
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Primeira de PIX_COMPRESSION_ENCODINGS que o Accept-Encoding aceita (q > 0)."""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, params = parse_header_parameters(item)
+        try:
+            accepted[coding] = float(params.get('q', 1))
+        except ValueError:
+            accepted[coding] = 0
+
+    for encoding in settings.PIX_COMPRESSION_ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def _take_zstd() -> zstandard.ZstdCompressor:
+    return _zstd_pool.pop() if _zstd_pool else zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+
+
+def _release_zstd(context: zstandard.ZstdCompressor) -> None:
+    if len(_zstd_pool) < ZSTD_POOL_SIZE:
+        _zstd_pool.append(context)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == ZSTD:
+        context = _take_zstd()
+        try:
+            return context.compress(body)
+        finally:
+            _release_zstd(context)
+    # zlib não tem reset de contexto: um compressobj por corpo
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+class ChunkCompressor:
+    """Comprime uma resposta em streaming com flush a cada `flush_bytes` de entrada.
+
+    O que já passou pelo flush o cliente descomprime assim que chega; o
+    dicionário continua valendo entre os flushes, então o lote comprime junto.
+    """
+
+    def __init__(self, encoding: str, flush_bytes: int = FLUSH_BYTES):
+        self.flush_bytes = flush_bytes
+        self.pending = 0
+        self.context = None
+        if encoding == ZSTD:
+            self.context = _take_zstd()
+            self.stream = self.context.compressobj()
+            self.flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self.stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+            self.flush_mode = zlib.Z_SYNC_FLUSH
+
+    def compress(self, chunk: bytes) -> bytes:
+        compressed = self.stream.compress(chunk)
+        self.pending += len(chunk)
+        if self.pending >= self.flush_bytes:
+            self.pending = 0
+            compressed += self.stream.flush(self.flush_mode)
+        return compressed
+
+    def finish(self) -> bytes:
+        tail = self.stream.flush()
+        self.close()
+        return tail
+
+    def close(self) -> None:
+        """Devolve o contexto zstd ao pool (idempotente)."""
+        if self.context is not None:
+            _release_zstd(self.context)
+            self.context = None
+
+
+async def compress_stream(chunks, encoding: str):
+    compressor = ChunkCompressor(encoding)
+    try:
+        async for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.finish()
+    finally:
+        # Cliente desconectado no meio: o contexto volta ao pool mesmo assim
+        compressor.close()
+
+
+def _compress_content(response, encoding: str):
+    if len(response.content) >= settings.PIX_COMPRESSION_MIN_BYTES:
+        response.content = compress(response.content, encoding)
+        response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(response.content))
+    return response
+
+
+def compress_response(response, encoding: str | None, size: int | None = None):
+    """Aplica a codificação negociada a partir de PIX_COMPRESSION_MIN_BYTES.
+
+    Em streaming o corpo ainda não existe: quem chama informa o tamanho
+    estimado em `size`. Response do DRF é comprimido depois de renderizado.
+    """
+    if encoding is None:
+        return response
+    patch_vary_headers(response, ['Accept-Encoding'])
+
+    if response.streaming:
+        if size is not None and size >= settings.PIX_COMPRESSION_MIN_BYTES:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            response['Content-Encoding'] = encoding
+    elif hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+        response.add_post_render_callback(lambda rendered: _compress_content(rendered, encoding))
+    else:
+        _compress_content(response, encoding)
+    return response
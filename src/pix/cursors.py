@@ -0,0 +1,38 @@
+from typing import NamedTuple
+import time
+
+from django.core.signing import BadSignature, Signer
+
+from .models import Stream
+
+
+class Cursor(NamedTuple):
+    stream_id: str
+    iteration: int
+    expires_at: int
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at <= time.time()
+
+
+def _signer(ispb: str) -> Signer:
+    # O ISPB entra no salt: o cursor só vale no path do próprio ISPB
+    return Signer(salt=f'pix.pull-next.{ispb}')
+
+
+def dump(stream: Stream) -> str:
+    """Pull-Next assinado com stream, próxima iteração e vencimento do lease."""
+    expires_at = int(stream.lease_expires_at.timestamp())
+    return _signer(stream.ispb).sign(f'{stream.id}.{stream.iteration + 1}.{expires_at}')
+
+
+def load(ispb: str, token: str) -> Cursor | None:
+    """Valida a assinatura do cursor. Devolve None se não é um cursor válido."""
+    try:
+        value = _signer(ispb).unsign(token)
+    except BadSignature:
+        return None
+
+    stream_id, iteration, expires_at = value.split('.')
+    return Cursor(stream_id, int(iteration), int(expires_at))
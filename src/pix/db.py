@@ -0,0 +1,73 @@
+import asyncio
+from contextlib import asynccontextmanager
+import weakref
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import DEFERRED
+from psycopg_pool import AsyncConnectionPool
+
+# O pool async pertence a um event loop, então há um pool por loop
+_pools: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def connection_kwargs(alias: str = 'default') -> dict:
+    """Parâmetros de conexão psycopg derivados de settings.DATABASES."""
+    params = connections[alias].get_connection_params()
+    # cursor_factory e context são específicos da conexão síncrona do Django
+    params.pop('cursor_factory', None)
+    params.pop('context', None)
+    return params
+
+
+async def get_pool() -> AsyncConnectionPool:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = AsyncConnectionPool(
+            kwargs={'autocommit': True, **connection_kwargs()},
+            min_size=settings.PIX_DB_POOL_MIN_SIZE,
+            max_size=settings.PIX_DB_POOL_MAX_SIZE,
+            timeout=settings.PIX_DB_POOL_TIMEOUT,
+            max_idle=settings.PIX_DB_POOL_MAX_IDLE,
+            # Valida a conexão antes de entregar (descarta as derrubadas pelo servidor)
+            check=AsyncConnectionPool.check_connection,
+            name='pix',
+            open=False,
+        )
+        await pool.open()
+    return pool
+
+
+async def close_pool() -> None:
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def pool_stats() -> dict[str, int]:
+    """Estatísticas somadas dos pools do processo (esperas, timeouts, tamanho)."""
+    stats: dict[str, int] = {}
+    for pool in list(_pools.values()):
+        for key, value in pool.get_stats().items():
+            stats[key] = stats.get(key, 0) + value
+    return stats
+
+
+@asynccontextmanager
+async def async_connection():
+    """Conexão psycopg async, fora do thread único do sync_to_async."""
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+def hydrate(model, cursor, row):
+    """Monta uma instância do model a partir de uma linha do cursor."""
+    values = dict(zip((column.name for column in cursor.description), row))
+    fields = model._meta.concrete_fields
+    return model.from_db(
+        'default',
+        [field.attname for field in fields],
+        [values.get(field.column, DEFERRED) for field in fields],
+    )
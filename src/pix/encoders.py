@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.utils import timezone
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import PixMessage
+
+_valor = PixMessage._meta.get_field('valor')
+VALOR_EXPONENT = Decimal('.1') ** _valor.decimal_places
+
+# Datetimes passam pelo encoder do DRF (ISO com milissegundos e Z), o resto é nativo do orjson
+OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+_default = JSONEncoder().default
+
+
+def format_valor(value) -> str:
+    # DecimalField do DRF: quantiza nas casas do model e devolve string
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value).strip())
+    return f'{value.quantize(VALOR_EXPONENT):f}'
+
+
+def format_datetime(value) -> str:
+    # DateTimeField do DRF: fuso corrente e ISO 8601, com Z no lugar de +00:00
+    current = timezone.get_current_timezone()
+    if timezone.is_aware(value):
+        value = value.astimezone(current)
+    else:
+        value = timezone.make_aware(value, current)
+    text = value.isoformat()
+    return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+
+def message_data(message: PixMessage) -> dict:
+    """O mesmo dict de `PixMessageSerializer(message).data`, sem a maquinaria do serializer."""
+    return {
+        'endToEndId': message.end_to_end_id,
+        'valor': format_valor(message.valor),
+        'pagador': message.pagador,
+        'recebedor': message.recebedor,
+        'campoLivre': message.campo_livre,
+        'txId': message.tx_id,
+        'dataHoraPagamento': format_datetime(message.data_hora_pagamento),
+    }
+
+
+def dumps(data) -> bytes:
+    """JSON compacto igual ao do JSONRenderer do DRF, via orjson.
+
+    Só para a entrega, onde os valores vêm de jsonb (sem NaN/Infinity).
+    Floats podem mudar de grafia (1e16 contra 1e+16), não de valor;
+    inteiros acima de 64 bits, que o orjson recusa, vão pelo JSONRenderer.
+    """
+    try:
+        body = orjson.dumps(data, default=_default, option=OPTIONS)
+    except orjson.JSONEncodeError:
+        return JSONRenderer().render(data)
+    # O JSONRenderer escapa U+2028/U+2029 (JSON que também é JavaScript válido)
+    if b'\xe2\x80\xa8' in body or b'\xe2\x80\xa9' in body:
+        body = body.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return body
+
+
+def render_payload(message: PixMessage) -> bytes:
+    """Payload guardado na ingestão (PIX_PRERENDERED_PAYLOAD)."""
+    return dumps(message_data(message))
+
+
+def encode_messages(messages: list[PixMessage], many: bool) -> bytes:
+    """Corpo da resposta concatenando os payloads; linhas sem payload são codificadas aqui."""
+    parts = [message.payload or render_payload(message) for message in messages]
+    if not many:
+        return bytes(parts[0])
+    return b'[' + b','.join(parts) + b']'
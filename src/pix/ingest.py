@@ -0,0 +1,281 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+import json
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import orjson
+from psycopg.types.json import Jsonb
+
+from . import partitions
+from .encoders import render_payload
+from .models import PixMessage
+from .notifier import publish
+
+COLUMNS = [
+    'id', 'end_to_end_id', 'valor', 'pagador', 'recebedor', 'campo_livre', 'tx_id',
+    'data_hora_pagamento', 'recebedor_ispb', 'status', 'created_at', 'payload',
+]
+
+# seq, bucket e os campos de entrega ficam com os defaults do banco
+INSERT_SQL = f"""
+    INSERT INTO pix_message ({', '.join(COLUMNS)})
+    VALUES {{rows}}
+    {{conflict}}
+    RETURNING end_to_end_id, recebedor_ispb
+"""
+
+# Tabela particionada não tem unique em end_to_end_id: a dedupe é no ledger
+RESERVE_SQL = f"""
+    INSERT INTO {partitions.E2E_TABLE} (end_to_end_id, created_at)
+    VALUES {{rows}}
+    ON CONFLICT DO NOTHING
+    RETURNING end_to_end_id
+"""
+
+
+def message_row(data: dict, now) -> list:
+    """Colunas de uma mensagem validada por PixMessageIngestSerializer."""
+    return [
+        uuid.uuid4(),
+        data['end_to_end_id'],
+        data['valor'],
+        Jsonb(data['pagador']),
+        Jsonb(data['recebedor']),
+        data.get('campo_livre', ''),
+        data.get('tx_id', ''),
+        data['data_hora_pagamento'],
+        # O que o save() do model faria, sem passar por ele
+        data['recebedor']['ispb'],
+        PixMessage.STATUS_PENDING,
+        now,
+        render_payload(PixMessage(**data)) if settings.PIX_PRERENDERED_PAYLOAD else None,
+    ]
+
+
+def placeholders(rows: list, width: int) -> str:
+    row = f'({", ".join(["%s"] * width)})'
+    return ', '.join([row] * len(rows))
+
+
+def insert_messages(messages: list[dict]) -> int:
+    """Insere um lote de mensagens num INSERT só, ignorando end_to_end_ids já existentes.
+
+    Devolve quantas entraram; o resto é duplicado (no banco ou no próprio lote).
+    """
+    if not messages:
+        return 0
+
+    now = timezone.now()
+    # Repetido dentro do lote conta como duplicado: fica a primeira ocorrência
+    unique = {}
+    for data in messages:
+        unique.setdefault(data['end_to_end_id'], data)
+    rows = [message_row(data, now) for data in unique.values()]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if partitions.is_partitioned(cursor):
+            cursor.execute(
+                RESERVE_SQL.format(rows=placeholders(rows, 2)),
+                [value for row in rows for value in (row[1], now)],
+            )
+            reserved = {end_to_end_id for end_to_end_id, in cursor.fetchall()}
+            if not reserved:
+                return 0
+            rows = [row for row in rows if row[1] in reserved]
+            cursor.execute(partitions.RESERVED_SQL)
+            conflict = ''
+        else:
+            conflict = 'ON CONFLICT (end_to_end_id) DO NOTHING'
+
+        cursor.execute(
+            INSERT_SQL.format(rows=placeholders(rows, len(COLUMNS)), conflict=conflict),
+            [value for row in rows for value in row],
+        )
+        inserted = cursor.fetchall()
+
+        # No backend postgres quem avisa é o trigger
+        ispbs = {ispb for _, ispb in inserted}
+        transaction.on_commit(lambda: publish(*ispbs))
+
+    return len(inserted)
+
+
+# Carga em massa: COPY para uma tabela temporária e merge em pix_message
+STAGING_TABLE = 'pix_message_staging'
+STAGING_COLUMNS = [
+    'line', 'end_to_end_id', 'valor', 'pagador', 'recebedor', 'campo_livre', 'tx_id',
+    'data_hora_pagamento', 'payload',
+]
+
+CREATE_STAGING_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+        line bigint,
+        end_to_end_id varchar(50),
+        valor numeric(15, 2),
+        pagador jsonb,
+        recebedor jsonb,
+        campo_livre text,
+        tx_id varchar(35),
+        data_hora_pagamento timestamptz,
+        payload bytea
+    ) ON COMMIT DELETE ROWS
+"""
+
+COPY_SQL = f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN"
+
+# Primeira ocorrência de cada ID no lote, inserida na ordem do arquivo (seq)
+MERGE_SQL = f"""
+    WITH batch AS (
+        SELECT DISTINCT ON (end_to_end_id) * FROM {STAGING_TABLE}
+        ORDER BY end_to_end_id, line
+    ){{reserve}}, inserted AS (
+        INSERT INTO pix_message ({', '.join(COLUMNS)})
+        SELECT gen_random_uuid(), end_to_end_id, valor, pagador, recebedor, campo_livre,
+            tx_id, data_hora_pagamento, recebedor->>'ispb', 'pending', now(), payload
+        FROM batch
+        {{reserved_only}}
+        ORDER BY line
+        {{conflict}}
+        RETURNING recebedor_ispb
+    )
+    SELECT count(*), coalesce(array_agg(DISTINCT recebedor_ispb), '{{{{}}}}') FROM inserted
+"""
+
+MERGE_RESERVE_SQL = f""", reserved AS (
+        INSERT INTO {partitions.E2E_TABLE} (end_to_end_id, created_at)
+        SELECT end_to_end_id, now() FROM batch
+        ON CONFLICT DO NOTHING
+        RETURNING end_to_end_id
+    )"""
+
+
+# Limites das colunas da staging: linha fora deles é rejeitada aqui, não
+# derruba o COPY do lote inteiro
+MAX_END_TO_END_ID = PixMessage._meta.get_field('end_to_end_id').max_length
+MAX_TX_ID = PixMessage._meta.get_field('tx_id').max_length
+# numeric(15, 2): a partir daqui o arredondamento estoura as 13 casas inteiras
+MAX_VALOR = Decimal('9999999999999.995')
+
+
+def parse_valor(value) -> Decimal:
+    try:
+        valor = Decimal(str(value))
+    except InvalidOperation as exc:
+        raise ValueError(f'valor inválido: {value!r}') from exc
+    if not valor.is_finite() or abs(valor) >= MAX_VALOR:
+        raise ValueError(f'valor inválido: {value!r}')
+    return valor
+
+
+def parse_paid_at(value) -> datetime:
+    if not isinstance(value, datetime):
+        try:
+            value = parse_datetime(str(value))
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValueError('dataHoraPagamento inválido')
+    # Sem fuso o COPY grava em UTC (fuso da conexão); o payload tem que bater
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def staging_text(name: str, value, max_length: int | None = None) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f'{name} deve ser texto')
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f'{name} passa de {max_length} caracteres')
+    if '\x00' in value:
+        raise ValueError(f'{name} contém NUL')
+    return value
+
+
+def staging_json(name: str, value) -> str:
+    # NaN/Infinity e \u0000 não entram em jsonb
+    text = json.dumps(value, allow_nan=False)
+    if '\\u0000' in text:
+        raise ValueError(f'{name} contém NUL')
+    return text
+
+
+def staging_payload(row: list) -> bytes | None:
+    """Payload pré-renderizado de uma linha da staging (None com PIX_PRERENDERED_PAYLOAD desligado)."""
+    if not settings.PIX_PRERENDERED_PAYLOAD:
+        return None
+
+    _, end_to_end_id, valor, pagador, recebedor, campo_livre, tx_id, paid_at = row[:8]
+    return render_payload(PixMessage(
+        end_to_end_id=end_to_end_id,
+        valor=parse_valor(valor),
+        pagador=orjson.loads(pagador),
+        recebedor=orjson.loads(recebedor),
+        campo_livre=campo_livre,
+        tx_id=tx_id,
+        data_hora_pagamento=parse_paid_at(paid_at),
+    ))
+
+
+def staging_row(line: int, data: dict) -> list:
+    """Linha da staging a partir de uma mensagem no formato da entrega.
+
+    Levanta ValueError se faltar campo ou algum valor não couber nos tipos
+    da staging (valor, data, tamanhos, ISPB do recebedor).
+    """
+    try:
+        recebedor = data['recebedor']
+        row = [
+            line,
+            staging_text('endToEndId', data['endToEndId'], MAX_END_TO_END_ID),
+            parse_valor(data['valor']),
+            staging_json('pagador', data['pagador']),
+            staging_json('recebedor', recebedor),
+            staging_text('campoLivre', data.get('campoLivre') or ''),
+            staging_text('txId', data.get('txId') or '', MAX_TX_ID),
+            parse_paid_at(data['dataHoraPagamento']),
+        ]
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f'campo ausente: {exc}') from exc
+
+    ispb = recebedor.get('ispb') if isinstance(recebedor, dict) else None
+    if not isinstance(ispb, str) or not ispb.isdigit() or len(ispb) != 8:
+        raise ValueError('recebedor.ispb deve ter 8 dígitos')
+    row.append(staging_payload(row))
+    return row
+
+
+def copy_messages(rows) -> tuple[int, int]:
+    """Carrega linhas da staging (iterável) via COPY e faz o merge numa transação.
+
+    Consome o iterável sem guardá-lo. Devolve (linhas lidas, mensagens novas).
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(CREATE_STAGING_SQL)
+        staged = 0
+        with cursor.copy(COPY_SQL) as copy:
+            for row in rows:
+                copy.write_row(row)
+                staged += 1
+        if not staged:
+            return 0, 0
+
+        if partitions.is_partitioned(cursor):
+            cursor.execute(partitions.RESERVED_SQL)
+            sql = MERGE_SQL.format(
+                reserve=MERGE_RESERVE_SQL,
+                reserved_only='WHERE end_to_end_id IN (SELECT end_to_end_id FROM reserved)',
+                conflict='',
+            )
+        else:
+            sql = MERGE_SQL.format(
+                reserve='', reserved_only='', conflict='ON CONFLICT (end_to_end_id) DO NOTHING',
+            )
+        cursor.execute(sql)
+        accepted, ispbs = cursor.fetchone()
+        transaction.on_commit(lambda: publish(*ispbs))
+
+    return staged, accepted
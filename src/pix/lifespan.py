@@ -0,0 +1,23 @@
+import logging
+
+from .prefetch import buffers
+from .services import StreamService
+
+logger = logging.getLogger(__name__)
+
+
+async def lifespan(scope, receive, send) -> None:
+    """Protocolo lifespan do ASGI: no shutdown devolve o prefetch para a fila."""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            try:
+                released = await StreamService().release_prefetched(buffers.drain())
+                if released:
+                    logger.info('%s mensagens do prefetch devolvidas para a fila', released)
+            except Exception:
+                logger.exception('Falha ao devolver o prefetch no shutdown')
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
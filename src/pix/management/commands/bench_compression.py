@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pix.compression import GZIP, ZSTD, ChunkCompressor, compress
+from pix.encoders import render_payload
+from pix.management.commands.bench_encoder import build_messages
+from pix.multipart import PART_HEADERS
+
+BOUNDARY = b'0123456789abcdef0123456789abcdef'
+
+
+def multipart_chunks(messages) -> list[bytes]:
+    """Os pedaços que pix.multipart envia para um lote, já codificados."""
+    delimiter = b'--' + BOUNDARY + b'\r\n'
+    chunks = [delimiter + PART_HEADERS + render_payload(message) + b'\r\n' for message in messages]
+    return chunks + [b'--' + BOUNDARY + b'--\r\n']
+
+
+def compress_chunks(chunks: list[bytes], encoding: str) -> bytes:
+    compressor = ChunkCompressor(encoding)
+    return b''.join([compressor.compress(chunk) for chunk in chunks] + [compressor.finish()])
+
+
+class Command(BaseCommand):
+    help = 'Mede bytes no fio e CPU por lote das respostas multipart com gzip e zstd'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, action='append', help='Mensagens por resposta (repetível).')
+        parser.add_argument('--seconds', type=float, default=1, help='Duração de cada medição.')
+
+    def handle(self, *args, **options):
+        for size in options['batch'] or [1, 10, 100, 500]:
+            chunks = multipart_chunks(build_messages(size))
+            body = b''.join(chunks)
+            results = [f'lote {size}: identity {len(body)} B']
+
+            for encoding in (GZIP, ZSTD):
+                # Em streaming, como o endpoint envia, e de uma vez, para comparar
+                for mode, encode in (
+                    ('stream', lambda: compress_chunks(chunks, encoding)),
+                    ('inteiro', lambda: compress(body, encoding)),
+                ):
+                    wire = len(encode())
+                    runs = 0
+                    started = time.process_time()
+                    while time.process_time() - started < options['seconds']:
+                        encode()
+                        runs += 1
+                    cpu = (time.process_time() - started) / runs * 1e6
+                    results.append(
+                        f'{encoding} {mode} {wire} B ({wire / len(body):.0%}) {cpu:.0f} µs CPU'
+                    )
+
+            self.stdout.write(', '.join(results))
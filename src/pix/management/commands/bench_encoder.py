@@ -0,0 +1,65 @@
+from datetime import datetime
+from decimal import Decimal
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from pix.encoders import dumps, encode_messages, message_data, render_payload
+from pix.models import PixMessage
+from pix.serializers import PixMessageSerializer
+from pix.synthetic import MessageGenerator
+
+
+def build_messages(count: int) -> list[PixMessage]:
+    """Mensagens em memória (sem banco), com dados do gerador sintético."""
+    rows = MessageGenerator(seed=0, pool_size=count).rows(['12345678'] * count)
+    return [
+        PixMessage(
+            end_to_end_id=end_to_end_id,
+            valor=Decimal(valor),
+            pagador=json.loads(pagador),
+            recebedor=json.loads(recebedor),
+            campo_livre=campo_livre,
+            tx_id=tx_id,
+            data_hora_pagamento=datetime.fromisoformat(paid_at),
+        )
+        for _, end_to_end_id, valor, pagador, recebedor, campo_livre, tx_id, paid_at, _ in rows
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Mede mensagens/s do encoder de entrega e dos payloads pré-renderizados contra PixMessageSerializer + JSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, action='append', help='Mensagens por resposta (repetível).')
+        parser.add_argument('--seconds', type=float, default=2, help='Duração de cada medição.')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        encoders = {
+            'serializer': lambda batch: renderer.render(PixMessageSerializer(batch, many=True).data),
+            'fast': lambda batch: dumps([message_data(message) for message in batch]),
+            'payload': lambda batch: encode_messages(batch, many=True),
+        }
+
+        for size in options['batch'] or [1, 10]:
+            batch = build_messages(size)
+            # Payloads como viriam da ingestão; os outros encoders ignoram o campo
+            for message in batch:
+                message.payload = render_payload(message)
+            rates = {}
+            for name, encode in encoders.items():
+                encoded = 0
+                started = time.perf_counter()
+                while time.perf_counter() - started < options['seconds']:
+                    encode(batch)
+                    encoded += size
+                rates[name] = encoded / (time.perf_counter() - started)
+
+            self.stdout.write(
+                f'lote {size}: serializer {rates["serializer"]:.0f} msgs/s, '
+                f'fast {rates["fast"]:.0f} msgs/s ({rates["fast"] / rates["serializer"]:.1f}x), '
+                f'payload {rates["payload"]:.0f} msgs/s ({rates["payload"] / rates["serializer"]:.1f}x)'
+            )
@@ -0,0 +1,111 @@
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pix.db import close_pool
+from pix.models import PixMessage, Stream
+from pix.services import CLAIM_SQL, StreamService, claim_horizon
+
+PREFIX = 'EBENCH'
+
+
+def orm_claim(stream: Stream, limit: int) -> list[PixMessage]:
+    """Claim pelo ORM do Django, como as views faziam via sync_to_async."""
+    return list(PixMessage.objects.raw(CLAIM_SQL, [
+        stream.id,
+        PixMessage.STATUS_DELIVERED,
+        timezone.now(),
+        stream.iteration,
+        stream.ispb,
+        claim_horizon(),
+        limit,
+    ]))
+
+
+def seed_messages(ispb: str, quantity: int) -> None:
+    now = timezone.now()
+    for start in range(0, quantity, 50000):
+        PixMessage.objects.bulk_create(
+            [
+                PixMessage(
+                    end_to_end_id=f'{PREFIX}{ispb}{i:012d}',
+                    valor=Decimal('10.00'),
+                    pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                    recebedor={'nome': 'Recebedor', 'ispb': ispb},
+                    recebedor_ispb=ispb,
+                    data_hora_pagamento=now,
+                )
+                for i in range(start, min(start + 50000, quantity))
+            ],
+            batch_size=5000,
+        )
+
+
+def reset_messages() -> None:
+    PixMessage.objects.filter(end_to_end_id__startswith=PREFIX).update(
+        stream=None,
+        status=PixMessage.STATUS_PENDING,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Mede o throughput do claim com N streams concorrentes (sync_to_async vs async)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=500)
+        parser.add_argument('--messages', type=int, default=20000)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--ispb', default='00000000')
+
+    def handle(self, *args, **options):
+        ispb = options['ispb']
+        limit = options['limit']
+
+        seed_messages(ispb, options['messages'])
+        streams = Stream.objects.bulk_create(
+            [Stream(ispb=ispb) for _ in range(options['streams'])]
+        )
+
+        claims = {
+            'sync_to_async': lambda stream: sync_to_async(orm_claim)(stream, limit),
+            'async': lambda stream: StreamService().fetch_messages(stream, limit),
+        }
+
+        try:
+            for name, claim in claims.items():
+                reset_messages()
+                delivered, elapsed, latencies = asyncio.run(self._drain(streams, claim))
+                p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+                self.stdout.write(
+                    f'{name}: {delivered} mensagens em {elapsed:.2f}s | '
+                    f'{delivered / elapsed:.0f} msg/s | '
+                    f'{len(latencies) / elapsed:.0f} claims/s | p99 {p99:.1f}ms'
+                )
+        finally:
+            PixMessage.objects.filter(end_to_end_id__startswith=PREFIX).delete()
+            Stream.objects.filter(id__in=[s.id for s in streams]).delete()
+
+    async def _drain(self, streams, claim):
+        latencies = []
+
+        async def worker(stream):
+            delivered = 0
+            while True:
+                start = time.perf_counter()
+                messages = await claim(stream)
+                latencies.append(time.perf_counter() - start)
+                if not messages:
+                    return delivered
+                delivered += len(messages)
+
+        start = time.perf_counter()
+        delivered = await asyncio.gather(*(worker(stream) for stream in streams))
+        elapsed = time.perf_counter() - start
+
+        await close_pool()
+        return sum(delivered), elapsed, latencies
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pix.db import async_connection, close_pool
+from pix.models import PixMessage, Stream
+from pix.services import (
+    CLAIM_BATCH_SQL, CLAIM_BATCH_STRIPED_SQL, CLAIM_SQL, CLAIM_STRIPED_SQL, claim_horizon, claim_slots,
+    stream_bucket,
+)
+from .bench_streams import PREFIX, reset_messages, seed_messages
+
+EXPLAIN = 'EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) '
+
+
+def scanned_rows(plan: dict) -> int:
+    """Linhas lidas pelos nós de scan, incluindo as puladas por lock ou filtro."""
+    rows = 0
+    if 'Scan' in plan['Node Type']:
+        rows += (plan['Actual Rows'] + plan.get('Rows Removed by Filter', 0)) * plan['Actual Loops']
+    for child in plan.get('Plans', []):
+        rows += scanned_rows(child)
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Compara linhas varridas e p99 do claim com e sem listras de bucket (N streams, um ISPB)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=6)
+        parser.add_argument('--messages', type=int, default=1_000_000)
+        parser.add_argument('--claims', type=int, default=500, help='Claims por stream em cada modo')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--ispb', default='00000001')
+        parser.add_argument(
+            '--processes', type=int, default=0,
+            help='Mede o claim em lote (claim_batch), com os streams repartidos entre N processos.',
+        )
+
+    def handle(self, *args, **options):
+        ispb = options['ispb']
+
+        self.stdout.write(f'Gerando {options["messages"]} mensagens...')
+        seed_messages(ispb, options['messages'])
+        streams = Stream.objects.bulk_create(
+            [Stream(ispb=ispb) for _ in range(options['streams'])]
+        )
+
+        try:
+            for striped in (False, True):
+                reset_messages()
+                if options['processes']:
+                    run = self._run_batch(
+                        streams, options['processes'], options['claims'], options['limit'], striped,
+                    )
+                else:
+                    run = self._run(streams, options['claims'], options['limit'], striped)
+                scanned, latencies = asyncio.run(run)
+                p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+                self.stdout.write(
+                    f'{"listrado" if striped else "simples"}: '
+                    f'{statistics.mean(scanned):.0f} linhas varridas/claim | p99 {p99:.1f}ms'
+                )
+        finally:
+            PixMessage.objects.filter(end_to_end_id__startswith=PREFIX).delete()
+            Stream.objects.filter(id__in=[s.id for s in streams]).delete()
+
+    async def _claim(self, conn, sql: str, stream: Stream, limit: int, *filters) -> tuple[int, int]:
+        return await self._explain(conn, sql, [
+            stream.id,
+            PixMessage.STATUS_DELIVERED,
+            timezone.now(),
+            stream.iteration,
+            stream.ispb,
+            claim_horizon(),
+            *filters,
+            limit,
+        ])
+
+    async def _run(self, streams, claims: int, limit: int, striped: bool):
+        scanned, latencies = [], []
+        for stream in streams:
+            stream.iteration = 0
+
+        async def worker(stream):
+            async with async_connection() as conn:
+                for _ in range(claims):
+                    start = time.perf_counter()
+                    claimed, rows = 0, 0
+                    if striped:
+                        claimed, rows = await self._claim(
+                            conn, CLAIM_STRIPED_SQL, stream, limit, stream_bucket(stream),
+                        )
+                    if claimed < limit:
+                        stolen, more = await self._claim(conn, CLAIM_SQL, stream, limit - claimed)
+                        claimed, rows = claimed + stolen, rows + more
+                    latencies.append(time.perf_counter() - start)
+                    scanned.append(rows)
+                    stream.iteration += 1
+                    if not claimed:
+                        return
+
+        await asyncio.gather(*(worker(stream) for stream in streams))
+        await close_pool()
+        return scanned, latencies
+
+    async def _explain(self, conn, sql: str, params: list) -> tuple[int, int]:
+        cursor = await conn.execute(EXPLAIN + sql, params)
+        (plan,), = await cursor.fetchall()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+        return root['Actual Rows'], scanned_rows(root)
+
+    async def _claim_batch(self, conn, streams, limit: int, striped: bool) -> tuple[int, int]:
+        """Os statements do StreamService.claim_batch para os streams de um processo."""
+        ispb = streams[0].ispb
+        stream_ids, iterations, waiters, buckets = claim_slots([(stream, limit, 0) for stream in streams])
+        claimed, rows = 0, 0
+        if striped:
+            claimed, rows = await self._explain(conn, CLAIM_BATCH_STRIPED_SQL, [
+                stream_ids, iterations, waiters, buckets, ispb, claim_horizon(),
+                PixMessage.STATUS_DELIVERED, timezone.now(),
+            ])
+        missing = len(stream_ids) - claimed
+        if missing:
+            # Os slots que sobraram; para contar linhas, quais são não importa
+            stolen, more = await self._explain(conn, CLAIM_BATCH_SQL, [
+                ispb, claim_horizon(), missing, stream_ids[:missing], iterations[:missing],
+                waiters[:missing], PixMessage.STATUS_DELIVERED, timezone.now(),
+            ])
+            claimed, rows = claimed + stolen, rows + more
+        return claimed, rows
+
+    async def _run_batch(self, streams, processes: int, claims: int, limit: int, striped: bool):
+        scanned, latencies = [], []
+        for stream in streams:
+            stream.iteration = 0
+
+        async def worker(group):
+            async with async_connection() as conn:
+                for _ in range(claims):
+                    start = time.perf_counter()
+                    claimed, rows = await self._claim_batch(conn, group, limit, striped)
+                    latencies.append(time.perf_counter() - start)
+                    scanned.append(rows)
+                    for stream in group:
+                        stream.iteration += 1
+                    if not claimed:
+                        return
+
+        groups = [streams[index::processes] for index in range(processes)]
+        await asyncio.gather(*(worker(group) for group in groups if group))
+        await close_pool()
+        return scanned, latencies
@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from pix import partitions
+
+
+class Command(BaseCommand):
+    help = 'Particiona pix_message por dia de created_at e mantém as partições (criação e retenção)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action', choices=['convert', 'maintain'],
+            help='convert: troca a tabela pela particionada (uma vez). '
+                 'maintain: cria partições à frente e tira as vencidas.',
+        )
+        parser.add_argument(
+            '--days-ahead', type=int, default=settings.PIX_MESSAGE_PARTITION_DAYS_AHEAD,
+            help='Partições diárias criadas à frente (padrão: PIX_MESSAGE_PARTITION_DAYS_AHEAD).',
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=settings.PIX_MESSAGE_RETENTION_DAYS,
+            help='Dias de mensagens mantidos (padrão: PIX_MESSAGE_RETENTION_DAYS).',
+        )
+        parser.add_argument(
+            '--drop', action='store_true',
+            help='Apaga as partições vencidas em vez de só desanexá-las.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Segundos entre rodadas do maintain. Sem intervalo, roda uma vez e sai.',
+        )
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if options['action'] == 'convert':
+                self._convert(cursor, options['days_ahead'])
+                return
+
+            if not partitions.is_partitioned(cursor):
+                raise CommandError('pix_message não é particionada; rode antes `partition_messages convert`')
+
+            while True:
+                self._maintain(cursor, options['days_ahead'], options['retention_days'], options['drop'])
+                if not options['interval']:
+                    return
+                time.sleep(options['interval'])
+
+    def _convert(self, cursor, days_ahead: int) -> None:
+        if partitions.is_partitioned(cursor):
+            raise CommandError('pix_message já é particionada')
+
+        partitions.convert(cursor, timezone.now().date(), days_ahead)
+        self.stdout.write(self.style.SUCCESS(
+            f'pix_message particionada; dados atuais em {partitions.LEGACY}'
+        ))
+
+    def _maintain(self, cursor, days_ahead: int, retention_days: int, drop: bool) -> None:
+        now = timezone.now()
+        created, blocked = partitions.create_ahead(cursor, now.date(), days_ahead)
+        for name in created:
+            self.stdout.write(f'{name} criada')
+        for name in blocked:
+            self.stderr.write(self.style.WARNING(
+                f'{name} não criada: o dia já tem linhas em {partitions.DEFAULT}'
+            ))
+
+        # Pendentes a um dia de sair do horizonte do claim
+        if settings.PIX_CLAIM_HORIZON_DAYS:
+            before = now - timedelta(days=settings.PIX_CLAIM_HORIZON_DAYS - 1)
+            moved = partitions.roll_forward(cursor, before, now)
+            if moved:
+                self.stdout.write(f'{moved} mensagens pendentes trazidas para o horizonte do claim')
+
+        cutoff = now.date() - timedelta(days=retention_days)
+        ready, busy = partitions.expired(cursor, cutoff)
+        for name in ready:
+            partitions.detach(cursor, name, drop)
+            self.stdout.write(f'{name} {"apagada" if drop else "desanexada"}')
+        for name in busy:
+            self.stderr.write(self.style.WARNING(f'{name} vencida, mas ainda tem mensagens não confirmadas'))
+
+        pruned = partitions.prune_e2e(cursor, cutoff, busy)
+        if pruned:
+            self.stdout.write(f'{pruned} end_to_end_ids removidos de {partitions.E2E_TABLE}')
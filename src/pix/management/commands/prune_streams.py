@@ -0,0 +1,45 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pix.db import close_pool
+from pix.redis_client import close_redis
+from pix.services import StreamService
+
+
+class Command(BaseCommand):
+    help = 'Remove de pix_stream os streams fechados além do período de retenção'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=float, default=settings.PIX_STREAM_RETENTION_DAYS,
+            help='Dias de retenção (padrão: PIX_STREAM_RETENTION_DAYS).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Segundos entre rodadas. Sem intervalo, roda uma vez e sai.',
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self._main(options['days'], options['batch_size'], options['interval']))
+
+    async def _main(self, days: float, batch_size: int, interval: float) -> None:
+        try:
+            await self._run(days, batch_size, interval)
+        finally:
+            # Pool aberto no loop do asyncio.run: fechar antes do loop acabar
+            await close_pool()
+            await close_redis()
+
+    async def _run(self, days: float, batch_size: int, interval: float) -> None:
+        service = StreamService()
+        while True:
+            pruned = await service.prune_closed_streams(days, batch_size)
+            if pruned:
+                self.stdout.write(f'{pruned} streams removidos')
+
+            if not interval:
+                return
+            await asyncio.sleep(interval)
@@ -0,0 +1,41 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from pix.db import close_pool
+from pix.redis_client import close_redis
+from pix.services import StreamService
+
+
+class Command(BaseCommand):
+    help = 'Fecha streams com lease vencido, reconcilia os contadores do Redis e grava o histórico de streams'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Segundos entre rodadas. Sem intervalo, roda uma vez e sai.',
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self._main(options['interval']))
+
+    async def _main(self, interval: float) -> None:
+        try:
+            await self._run(interval)
+        finally:
+            # Pool aberto no loop do asyncio.run: fechar antes do loop acabar
+            await close_pool()
+            await close_redis()
+
+    async def _run(self, interval: float) -> None:
+        service = StreamService()
+        while True:
+            reaped = await service.reap_expired_streams()
+            fixed = await service.reconcile_counts()
+            await service.flush_stream_history()
+            if reaped or fixed:
+                self.stdout.write(f'{reaped} streams reciclados, {fixed} contadores corrigidos')
+
+            if not interval:
+                return
+            await asyncio.sleep(interval)
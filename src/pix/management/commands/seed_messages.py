@@ -0,0 +1,59 @@
+from datetime import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pix.ingest import copy_messages
+from pix.synthetic import MessageGenerator, parse_ispbs, zipf_ispbs
+
+
+class Command(BaseCommand):
+    help = 'Gera mensagens fake em massa (COPY) distribuídas entre ISPBs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1_000_000)
+        parser.add_argument(
+            '--ispbs',
+            help='ISPBs com peso, ex.: 12345678:5,99999999:1. Sem isso, usa --ispb-count sintéticos.',
+        )
+        parser.add_argument('--ispb-count', type=int, default=100)
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Expoente Zipf dos ISPBs sintéticos (0 = uniforme).',
+        )
+        parser.add_argument('--seed', type=int, help='Semente: mesma semente, mesmas mensagens.')
+        parser.add_argument(
+            '--start', type=datetime.fromisoformat,
+            help='Momento base dos pagamentos (ISO 8601). Com --seed, torna a geração reproduzível.',
+        )
+        parser.add_argument('--batch-size', type=int, default=50_000)
+        parser.add_argument('--pool-size', type=int, default=10_000, help='Pagadores/recebedores pré-gerados.')
+
+    def handle(self, *args, **options):
+        if options['ispbs']:
+            try:
+                ispbs, weights = parse_ispbs(options['ispbs'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        else:
+            ispbs, weights = zipf_ispbs(options['ispb_count'], options['skew'])
+
+        generator = MessageGenerator(
+            seed=options['seed'], pool_size=options['pool_size'], start=options['start'],
+        )
+        started = time.monotonic()
+        total = created = 0
+        while total < options['count']:
+            size = min(options['batch_size'], options['count'] - total)
+            staged, inserted = copy_messages(generator.rows(generator.ispbs(ispbs, weights, size)))
+            total += staged
+            created += inserted
+            self.stdout.write(
+                f'{total}/{options["count"]} geradas, {total / (time.monotonic() - started):.0f} msgs/s'
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{created} mensagens criadas para {len(ispbs)} ISPBs em {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f} msgs/s)'
+        ))
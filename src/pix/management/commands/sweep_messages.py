@@ -0,0 +1,48 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pix.db import close_pool
+from pix.redis_client import close_redis
+from pix.services import StreamService
+
+
+class Command(BaseCommand):
+    help = 'Devolve para a fila mensagens entregues e não confirmadas além do visibility timeout'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=settings.PIX_VISIBILITY_TIMEOUT,
+            help='Visibility timeout em segundos (padrão: PIX_VISIBILITY_TIMEOUT).',
+        )
+        parser.add_argument('--chunk-size', type=int, default=settings.PIX_SWEEPER_CHUNK_SIZE)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Segundos entre rodadas. Sem intervalo, roda uma vez e sai.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['timeout']:
+            raise CommandError('Informe --timeout ou configure PIX_VISIBILITY_TIMEOUT')
+
+        asyncio.run(self._main(options['timeout'], options['chunk_size'], options['interval']))
+
+    async def _main(self, timeout: float, chunk_size: int, interval: float) -> None:
+        try:
+            await self._run(timeout, chunk_size, interval)
+        finally:
+            # Pool aberto no loop do asyncio.run: fechar antes do loop acabar
+            await close_pool()
+            await close_redis()
+
+    async def _run(self, timeout: float, chunk_size: int, interval: float) -> None:
+        service = StreamService()
+        while True:
+            swept = await service.sweep_expired_messages(timeout, chunk_size)
+            if swept:
+                self.stdout.write(f'{swept} mensagens devolvidas para a fila')
+
+            if not interval:
+                return
+            await asyncio.sleep(interval)
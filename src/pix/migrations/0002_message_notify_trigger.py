@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0001_initial'),
+    ]
+
+    operations = [
+        # Avisa o canal pix_message sempre que uma mensagem fica pendente
+        # (insert ou devolução para a fila). O Postgres entrega no commit e
+        # deduplica avisos iguais dentro da mesma transação.
+        migrations.RunSQL(
+            sql="""
+                CREATE OR REPLACE FUNCTION pix_message_notify() RETURNS trigger AS $$
+                BEGIN
+                    IF NEW.status = 'pending' THEN
+                        PERFORM pg_notify('pix_message', NEW.recebedor_ispb);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER pix_message_notify
+                AFTER INSERT OR UPDATE OF status ON pix_message
+                FOR EACH ROW EXECUTE FUNCTION pix_message_notify();
+            """,
+            reverse_sql="""
+                DROP TRIGGER IF EXISTS pix_message_notify ON pix_message;
+                DROP FUNCTION IF EXISTS pix_message_notify();
+            """,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 05:58
+
+import pix.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0002_message_notify_trigger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stream',
+            name='lease_expires_at',
+            field=models.DateTimeField(default=pix.models.lease_expiry),
+        ),
+        migrations.AddIndex(
+            model_name='stream',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='pix_stream_status_26f4d3_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0003_stream_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pixmessage',
+            index=models.Index(fields=['status', 'locked_at'], name='pix_message_status_791654_idx'),
+        ),
+    ]
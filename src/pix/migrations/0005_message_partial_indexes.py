@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0004_message_locked_at_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pixmessage',
+            name='pix_message_status_18b0dd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pixmessage',
+            name='pix_message_status_791654_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pixmessage',
+            index=models.Index(condition=models.Q(('status', 'delivered')), fields=['stream'], name='pix_message_delivered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pixmessage',
+            index=models.Index(condition=models.Q(('status', 'delivered')), fields=['locked_at'], name='pix_message_locked_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0005_message_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pixmessage',
+            name='iteration',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stream',
+            name='iteration',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
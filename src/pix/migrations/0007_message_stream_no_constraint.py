@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0006_stream_iterations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pixmessage',
+            name='stream',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages', to='pix.stream'),
+        ),
+    ]
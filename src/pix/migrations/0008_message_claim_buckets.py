@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:11
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0007_message_stream_no_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pixmessage',
+            name='bucket',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.Func('end_to_end_id', function='hashtext', output_field=models.IntegerField()), '&', models.Value(15)), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='pixmessage',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['recebedor_ispb', 'bucket', 'created_at'], name='pix_message_bucket_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0008_message_claim_buckets'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pixmessage',
+            name='pix_message_bucket_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                # Linhas existentes numeradas na ordem de chegada; as novas pela identity
+                migrations.RunSQL(
+                    sql=[
+                        'ALTER TABLE pix_message ADD COLUMN seq bigint',
+                        """
+                        UPDATE pix_message SET seq = numbered.n
+                        FROM (
+                            SELECT id, row_number() OVER (ORDER BY created_at, id) AS n
+                            FROM pix_message
+                        ) numbered
+                        WHERE pix_message.id = numbered.id
+                        """,
+                        'ALTER TABLE pix_message ALTER COLUMN seq SET NOT NULL',
+                        'ALTER TABLE pix_message ALTER COLUMN seq ADD GENERATED BY DEFAULT AS IDENTITY',
+                        """
+                        SELECT setval(
+                            pg_get_serial_sequence('pix_message', 'seq'),
+                            coalesce(max(seq), 0) + 1,
+                            false
+                        ) FROM pix_message
+                        """,
+                    ],
+                    reverse_sql='ALTER TABLE pix_message DROP COLUMN seq',
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='pixmessage',
+                    name='seq',
+                    field=models.BigIntegerField(db_default=models.Func(models.Value('pix_message_seq_seq'), function='nextval'), editable=False),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pixmessage',
+            index=models.Index(condition=models.Q(('status', 'pending'), ('stream__isnull', True)), fields=['recebedor_ispb', 'seq'], name='pix_message_claim_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pixmessage',
+            index=models.Index(condition=models.Q(('status', 'pending'), ('stream__isnull', True)), fields=['recebedor_ispb', 'bucket', 'seq'], name='pix_message_bucket_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pix', '0009_message_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pixmessage',
+            name='payload',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,8 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from nanoid import generate
 import uuid
 
@@ -6,6 +10,10 @@ def generate_id():
     return generate(size=12)
 
 
+def lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.PIX_STREAM_LEASE_TTL)
+
+
 class Stream(models.Model):
     STATUS_ACTIVE = "active"
     STATUS_CLOSED = "closed"
@@ -23,11 +31,16 @@ class Stream(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     closed_at = models.DateTimeField(null=True, blank=True)
+    # Renovado a cada leitura; vencido, o stream é fechado pelo reaper
+    lease_expires_at = models.DateTimeField(default=lease_expiry)
+    # Última iteração servida; o Pull-Next aponta para a seguinte
+    iteration = models.PositiveIntegerField(default=0)
 
     class Meta:
         db_table = "pix_stream"
         indexes = [
             models.Index(fields=["ispb", "status"]),
+            models.Index(fields=["status", "lease_expires_at"]),
         ]
 
     def __str__(self):
@@ -35,6 +48,9 @@ class Stream(models.Model):
 
 
 class PixMessage(models.Model):
+    # Potência de 2: o bucket é o hash do end_to_end_id com máscara
+    CLAIM_BUCKETS = 16
+
     STATUS_PENDING = "pending"
     STATUS_DELIVERED = "delivered"
     STATUS_CONFIRMED = "confirmed"
@@ -67,16 +83,61 @@ class PixMessage(models.Model):
         blank=True,
         db_index=True,
         related_name="messages",
+        # Com o registro no Redis a linha do stream só chega no flush do histórico
+        db_constraint=False,
     )
 
+    # Momento do claim; entregue e não confirmado além do visibility timeout volta para a fila
     locked_at = models.DateTimeField(null=True, blank=True)
+    # Iteração do stream em que a mensagem foi entregue (replay de retries)
+    iteration = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Identity do Postgres: ordem de chegada do claim, sem empates e crescente
+    # no índice (o uuid4 do id é aleatório e o created_at empata)
+    seq = models.BigIntegerField(
+        db_default=models.Func(models.Value("pix_message_seq_seq"), function="nextval"),
+        editable=False,
+    )
+    # Calculado pelo banco em qualquer caminho de ingestão (ORM, SQL, COPY)
+    bucket = models.GeneratedField(
+        expression=models.Func(
+            "end_to_end_id", function="hashtext", output_field=models.IntegerField()
+        ).bitand(CLAIM_BUCKETS - 1),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    # Mensagem já codificada como na entrega (PIX_PRERENDERED_PAYLOAD);
+    # nula para linhas gravadas sem a opção
+    payload = models.BinaryField(null=True, blank=True)
 
     class Meta:
         db_table = "pix_message"
         indexes = [
             models.Index(fields=["recebedor_ispb", "status"]),
-            models.Index(fields=["status", "stream"]),
+            # Parciais: mensagens confirmadas saem dos índices quentes
+            models.Index(
+                fields=["stream"],
+                condition=models.Q(status="delivered"),
+                name="pix_message_delivered_idx",
+            ),
+            models.Index(
+                fields=["locked_at"],
+                condition=models.Q(status="delivered"),
+                name="pix_message_locked_idx",
+            ),
+            # Claim: range scan em ordem de chegada só sobre as disponíveis,
+            # constante por mais entregues e confirmadas que se acumulem
+            models.Index(
+                fields=["recebedor_ispb", "seq"],
+                condition=models.Q(status="pending", stream__isnull=True),
+                name="pix_message_claim_idx",
+            ),
+            # Claim listrado: o mesmo range scan dentro do bucket
+            models.Index(
+                fields=["recebedor_ispb", "bucket", "seq"],
+                condition=models.Q(status="pending", stream__isnull=True),
+                name="pix_message_bucket_idx",
+            ),
         ]
 
     def __str__(self):
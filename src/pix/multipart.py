@@ -0,0 +1,61 @@
+import secrets
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_header_parameters
+
+from .encoders import render_payload
+
+MEDIA_TYPE = 'multipart/json'
+# Accept: multipart/json; max-messages=200
+LIMIT_PARAM = 'max-messages'
+PART_HEADERS = b'Content-Type: application/json\r\n\r\n'
+
+
+def accepted_limit(accept: str) -> int | None:
+    """Mensagens por resposta negociadas no header Accept.
+
+    None quando o cliente não aceita multipart/json. Sem o parâmetro vale
+    PIX_MAX_MESSAGES_PER_REQUEST; o pedido é limitado a PIX_MULTIPART_MAX_MESSAGES.
+    """
+    for item in accept.split(','):
+        media_type, params = parse_header_parameters(item)
+        if media_type != MEDIA_TYPE:
+            continue
+        try:
+            requested = int(params.get(LIMIT_PARAM, settings.PIX_MAX_MESSAGES_PER_REQUEST))
+        except ValueError:
+            requested = settings.PIX_MAX_MESSAGES_PER_REQUEST
+        return max(1, min(requested, settings.PIX_MULTIPART_MAX_MESSAGES))
+    return None
+
+
+def part_payload(message) -> bytes:
+    return message.payload or render_payload(message)
+
+
+async def parts(messages: list, boundary: bytes, first: bytes | None = None):
+    """Uma parte por mensagem, codificada só quando o servidor vai enviá-la.
+
+    `first` é o payload da primeira mensagem, quando já foi codificado.
+    """
+    delimiter = b'--' + boundary + b'\r\n'
+    for index, message in enumerate(messages):
+        payload = first if index == 0 and first is not None else part_payload(message)
+        yield delimiter + PART_HEADERS + payload + b'\r\n'
+    yield b'--' + boundary + b'--\r\n'
+
+
+def streaming_response(messages: list) -> tuple[StreamingHttpResponse, int]:
+    """Resposta em streaming e o tamanho estimado do corpo.
+
+    O corpo ainda não existe: a estimativa é a primeira mensagem vezes o
+    lote, e essa primeira codificação é reaproveitada na parte.
+    """
+    first = part_payload(messages[0])
+    boundary = secrets.token_hex(16)
+    response = StreamingHttpResponse(
+        parts(messages, boundary.encode(), first),
+        content_type=f'{MEDIA_TYPE}; boundary={boundary}',
+    )
+    return response, len(first) * len(messages)
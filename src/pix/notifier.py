@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+import psycopg
+import redis
+
+from .db import connection_kwargs
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'pix_message'
+RECONNECT_DELAY = 1.0
+
+
+class Notifier:
+    """Estaciona streams em um asyncio.Event por ISPB até chegar mensagem.
+
+    Sem backend de notificação, só espera o intervalo de polling.
+    """
+
+    def __init__(self):
+        self._events: dict[str, asyncio.Event] = {}
+
+    @property
+    def fallback_interval(self) -> float:
+        return settings.PIX_POLL_INTERVAL
+
+    def subscribe(self, ispb: str) -> asyncio.Event:
+        event = self._events.get(ispb)
+        if event is None:
+            event = self._events[ispb] = asyncio.Event()
+        return event
+
+    def wake(self, ispb: str) -> None:
+        event = self._events.pop(ispb, None)
+        if event is not None:
+            event.set()
+
+    def wake_all(self) -> None:
+        for ispb in list(self._events):
+            self.wake(ispb)
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class ListeningNotifier(Notifier):
+    """Notifier com uma task de escuta que acorda os streams do ISPB avisado."""
+
+    def __init__(self):
+        super().__init__()
+        self._task: asyncio.Task | None = None
+        self._connected = False
+
+    @property
+    def fallback_interval(self) -> float:
+        # Sem conexão de escuta, volta ao polling rápido
+        if self._connected:
+            return settings.PIX_NOTIFIER_FALLBACK_INTERVAL
+        return settings.PIX_POLL_INTERVAL
+
+    def subscribe(self, ispb: str) -> asyncio.Event:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return super().subscribe(ispb)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Falha na escuta de notificações')
+            finally:
+                self._connected = False
+            # Avisos podem ter sido perdidos na queda: todos voltam a buscar
+            self.wake_all()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def listen(self) -> None:
+        raise NotImplementedError
+
+
+class PostgresNotifier(ListeningNotifier):
+    """Escuta o canal alimentado pelo trigger de insert em pix_message."""
+
+    async def listen(self) -> None:
+        conn = await psycopg.AsyncConnection.connect(autocommit=True, **connection_kwargs())
+        async with conn:
+            await conn.execute(f'LISTEN {CHANNEL}')
+            self._connected = True
+            async for notify in conn.notifies():
+                self.wake(notify.payload)
+
+
+class RedisNotifier(ListeningNotifier):
+    """Escuta o canal pub/sub publicado por `publish`."""
+
+    async def listen(self) -> None:
+        pubsub = get_redis().pubsub()
+        try:
+            await pubsub.subscribe(CHANNEL)
+            self._connected = True
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    self.wake(message['data'].decode())
+        finally:
+            await pubsub.aclose()
+
+
+BACKENDS = {
+    'postgres': PostgresNotifier,
+    'redis': RedisNotifier,
+    'none': Notifier,
+}
+
+# Eventos e tasks pertencem a um event loop, então há um notifier por loop
+_notifiers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_publisher = None
+
+
+def get_notifier() -> Notifier:
+    loop = asyncio.get_running_loop()
+    notifier = _notifiers.get(loop)
+    if notifier is None:
+        notifier = _notifiers[loop] = BACKENDS[settings.PIX_NOTIFIER_BACKEND]()
+    return notifier
+
+
+def publish(*ispbs: str) -> None:
+    """Avisa os streams dos ISPBs. No backend postgres quem avisa é o trigger."""
+    global _publisher
+
+    if settings.PIX_NOTIFIER_BACKEND != 'redis':
+        return
+
+    if _publisher is None:
+        _publisher = redis.from_url(settings.REDIS_URL)
+
+    for ispb in set(ispbs):
+        _publisher.publish(CHANNEL, ispb)
+
+
+async def apublish(*ispbs: str) -> None:
+    if settings.PIX_NOTIFIER_BACKEND != 'redis':
+        return
+
+    client = get_redis()
+    for ispb in set(ispbs):
+        await client.publish(CHANNEL, ispb)
@@ -0,0 +1,16 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Um objeto JSON por linha; devolve a lista de objetos."""
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return [json.loads(line) for line in stream if line.strip()]
+        except ValueError as exc:
+            raise ParseError(f'NDJSON inválido: {exc}')
@@ -0,0 +1,276 @@
+from datetime import UTC, date, datetime, time, timedelta
+import re
+
+from django.db import transaction
+
+PARENT = 'pix_message'
+LEGACY = 'pix_message_legacy'
+DEFAULT = 'pix_message_default'
+# end_to_end_id único em todas as partições (o Postgres só aceita unique
+# em partição quando a chave inclui created_at)
+E2E_TABLE = 'pix_message_e2e'
+
+PARTITION_RE = re.compile(r'^pix_message_p(\d{8})$')
+
+IS_PARTITIONED_SQL = "SELECT relkind = 'p' FROM pg_class WHERE oid = 'pix_message'::regclass"
+
+PARTITIONS_SQL = """
+    SELECT c.relname FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'pix_message'::regclass
+    ORDER BY c.relname
+"""
+
+# Índices da tabela atual, recriados no pai com o mesmo nome (as migrations
+# os referenciam); o Postgres reaproveita os equivalentes da partição legada
+INDEXES_SQL = """
+    SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = 'pix_message'::regclass AND NOT i.indisunique
+"""
+
+# Duplicado levanta unique_violation como o unique da tabela antiga. Quem já
+# reservou os IDs no ledger (ingestão em lote, roll-forward que move linhas
+# entre partições) desliga a checagem na própria transação com pix.e2e_reserved.
+E2E_TRIGGER_SQL = f"""
+    CREATE OR REPLACE FUNCTION pix_message_e2e() RETURNS trigger AS $$
+    BEGIN
+        IF current_setting('pix.e2e_reserved', true) = 'on' THEN
+            RETURN NEW;
+        END IF;
+        INSERT INTO {E2E_TABLE} (end_to_end_id, created_at)
+        VALUES (NEW.end_to_end_id, NEW.created_at);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER pix_message_e2e
+    BEFORE INSERT ON {PARENT}
+    FOR EACH ROW EXECUTE FUNCTION pix_message_e2e();
+"""
+
+NOTIFY_TRIGGER_SQL = f"""
+    CREATE TRIGGER pix_message_notify
+    AFTER INSERT OR UPDATE OF status ON {PARENT}
+    FOR EACH ROW EXECUTE FUNCTION pix_message_notify()
+"""
+
+# Partição só sai com tudo confirmado; pendente ou entregue ainda é fila
+UNCONFIRMED_SQL = "SELECT EXISTS (SELECT 1 FROM {table} WHERE status <> 'confirmed')"
+LEGACY_EXPIRED_SQL = """
+    SELECT NOT EXISTS (
+        SELECT 1 FROM {table} WHERE status <> 'confirmed' OR created_at >= %s
+    )
+"""
+
+DEFAULT_ROWS_SQL = f"""
+    SELECT EXISTS (SELECT 1 FROM {DEFAULT} WHERE created_at >= %s AND created_at < %s)
+"""
+
+RESERVED_SQL = "SET LOCAL pix.e2e_reserved = 'on'"
+
+PRUNE_E2E_SQL = f'DELETE FROM {E2E_TABLE} WHERE created_at < %s'
+
+# Pendentes perto do horizonte do claim vão para a partição do dia; o seq
+# não muda, então a ordem de entrega continua a de chegada. Em lotes com
+# SKIP LOCKED: não espera o claim nem trava a fila inteira numa transação só.
+ROLL_FORWARD_SQL = f"""
+    WITH picked AS (
+        SELECT id, created_at FROM pix_message
+        WHERE status = 'pending' AND stream_id IS NULL AND created_at < %s
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        UPDATE pix_message SET created_at = %s
+        FROM picked
+        WHERE pix_message.id = picked.id AND pix_message.created_at = picked.created_at
+        RETURNING pix_message.end_to_end_id, pix_message.created_at
+    ), ledger AS (
+        UPDATE {E2E_TABLE} SET created_at = moved.created_at
+        FROM moved WHERE {E2E_TABLE}.end_to_end_id = moved.end_to_end_id
+    )
+    SELECT count(*) FROM moved
+"""
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, UTC)
+
+
+def partition_name(day: date) -> str:
+    return f'{PARENT}_p{day:%Y%m%d}'
+
+
+def partition_day(name: str) -> date | None:
+    match = PARTITION_RE.match(name)
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), '%Y%m%d').date()
+
+
+def create_partition_sql(day: date) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {PARENT} '
+        f"FOR VALUES FROM ('{day_start(day).isoformat()}') "
+        f"TO ('{day_start(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+def convert_sql(indexes: list[tuple[str, str]], first_day: date) -> list[str]:
+    """Troca pix_message por uma tabela particionada por dia de created_at.
+
+    A tabela atual vira a partição legada (tudo antes de `first_day`) e não é
+    reescrita. Roda numa transação só, com a tabela travada por `convert`.
+    """
+    statements = [
+        # Identity não existe em tabela particionada no Postgres 15: vira uma
+        # sequence comum com o mesmo nome, que é o que o db_default do model usa
+        """
+        CREATE TEMP TABLE pix_message_seq_last ON COMMIT DROP AS
+        SELECT coalesce(max(seq), 0) + 1 AS next FROM pix_message
+        """,
+        f'ALTER TABLE {PARENT} ALTER COLUMN seq DROP IDENTITY',
+        'CREATE SEQUENCE pix_message_seq_seq AS bigint',
+        "SELECT setval('pix_message_seq_seq', next, false) FROM pix_message_seq_last",
+        f"ALTER TABLE {PARENT} ALTER COLUMN seq SET DEFAULT nextval('pix_message_seq_seq')",
+        f"""
+        CREATE TABLE {E2E_TABLE} (
+            end_to_end_id varchar(50) PRIMARY KEY,
+            created_at timestamptz NOT NULL
+        )
+        """,
+        f'INSERT INTO {E2E_TABLE} SELECT end_to_end_id, created_at FROM {PARENT}',
+        f'CREATE INDEX {E2E_TABLE}_created_at_idx ON {E2E_TABLE} (created_at)',
+        f'DROP TRIGGER pix_message_notify ON {PARENT}',
+        f'ALTER TABLE {PARENT} RENAME TO {LEGACY}',
+        # A pk da partição tem de ser a do pai: a pk só em id impede o ATTACH.
+        # Um unique em (id, created_at) já pronto vira a pk da partição.
+        f'ALTER TABLE {LEGACY} DROP CONSTRAINT {PARENT}_pkey',
+        f'CREATE UNIQUE INDEX {LEGACY}_pkey ON {LEGACY} (id, created_at)',
+    ]
+    for name, _ in indexes:
+        statements.append(f'ALTER INDEX {name} RENAME TO {legacy_index(name)}')
+
+    statements += [
+        f"""
+        CREATE TABLE {PARENT} (
+            LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """,
+        f'ALTER SEQUENCE pix_message_seq_seq OWNED BY {PARENT}.seq',
+        f"""
+        ALTER TABLE {PARENT} ATTACH PARTITION {LEGACY}
+        FOR VALUES FROM (MINVALUE) TO ('{day_start(first_day).isoformat()}')
+        """,
+    ]
+    # indexdef aponta para "public.pix_message", que agora é o pai
+    statements += [definition for _, definition in indexes]
+    statements += [
+        f'CREATE TABLE {DEFAULT} PARTITION OF {PARENT} DEFAULT',
+        E2E_TRIGGER_SQL,
+        NOTIFY_TRIGGER_SQL,
+    ]
+    return statements
+
+
+def legacy_index(name: str) -> str:
+    # Nomes de índice têm até 63 bytes
+    return f'{name[:55]}_legacy'
+
+
+def is_partitioned(cursor) -> bool:
+    cursor.execute(IS_PARTITIONED_SQL)
+    return cursor.fetchone()[0]
+
+
+def partitions(cursor) -> list[str]:
+    cursor.execute(PARTITIONS_SQL)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def convert(cursor, today: date, days_ahead: int) -> None:
+    # A legada fica com o dia de hoje; as partições diárias começam amanhã
+    first_day = today + timedelta(days=1)
+    with transaction.atomic():
+        cursor.execute(f'LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(INDEXES_SQL)
+        indexes = cursor.fetchall()
+        for statement in convert_sql(indexes, first_day):
+            cursor.execute(statement)
+        for offset in range(days_ahead + 1):
+            cursor.execute(create_partition_sql(first_day + timedelta(days=offset)))
+
+
+def create_ahead(cursor, today: date, days_ahead: int) -> tuple[list[str], list[str]]:
+    """Cria as partições de hoje até `days_ahead` dias à frente.
+
+    Devolve (criadas, bloqueadas). Um dia que já tem linhas na partição
+    default (manutenção atrasada) fica bloqueado: o Postgres recusa a partição.
+    """
+    existing = set(partitions(cursor))
+    days = [day for name in existing if (day := partition_day(name))]
+    created, blocked = [], []
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        name = partition_name(day)
+        # Antes da primeira diária, o intervalo é da partição legada
+        if name in existing or (days and day < min(days)):
+            continue
+        cursor.execute(DEFAULT_ROWS_SQL, [day_start(day), day_start(day + timedelta(days=1))])
+        if cursor.fetchone()[0]:
+            blocked.append(name)
+            continue
+        cursor.execute(create_partition_sql(day))
+        created.append(name)
+    return created, blocked
+
+
+def expired(cursor, cutoff: date) -> tuple[list[str], list[str]]:
+    """Partições inteiras antes de `cutoff`: (prontas para sair, ainda com fila)."""
+    ready, busy = [], []
+    for name in partitions(cursor):
+        day = partition_day(name)
+        if name == LEGACY:
+            cursor.execute(LEGACY_EXPIRED_SQL.format(table=LEGACY), [day_start(cutoff)])
+            if cursor.fetchone()[0]:
+                ready.append(name)
+            continue
+        if day is None or day >= cutoff:
+            continue
+        cursor.execute(UNCONFIRMED_SQL.format(table=name))
+        (busy if cursor.fetchone()[0] else ready).append(name)
+    return ready, busy
+
+
+def detach(cursor, name: str, drop: bool) -> None:
+    with transaction.atomic():
+        cursor.execute(f'ALTER TABLE {PARENT} DETACH PARTITION {name}')
+        if drop:
+            cursor.execute(f'DROP TABLE {name}')
+
+
+def prune_e2e(cursor, cutoff: date, busy: list[str] = ()) -> int:
+    """Tira do ledger os IDs anteriores a `cutoff` cujas partições já saíram.
+
+    Uma partição vencida que ainda tem fila (`busy`) continua anexada: o
+    ledger dela fica, senão um duplicado passaria pelo trigger.
+    """
+    if LEGACY in busy:
+        return 0
+    cutoff = min([cutoff, *(partition_day(name) for name in busy)])
+    cursor.execute(PRUNE_E2E_SQL, [day_start(cutoff)])
+    return cursor.rowcount
+
+
+def roll_forward(cursor, before: datetime, now: datetime, batch_size: int = 1000) -> int:
+    """Move as pendentes anteriores a `before`, uma transação por lote."""
+    moved = 0
+    while True:
+        with transaction.atomic():
+            cursor.execute(RESERVED_SQL)
+            cursor.execute(ROLL_FORWARD_SQL, [before, batch_size, now])
+            count, = cursor.fetchone()
+        moved += count
+        if count < batch_size:
+            return moved
@@ -0,0 +1,117 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+import time
+import weakref
+
+from .notifier import get_notifier
+
+
+@dataclass
+class Waiter:
+    # async (ispb, [(stream, limit, prefetch), ...]) -> [[mensagens], ...] na mesma ordem
+    claim: object
+    stream: object
+    limit: int
+    deadline: float
+    # Mensagens a reservar além de `limit`, depois da demanda de todos
+    prefetch: int = 0
+    # Lote parcial espera até `linger` segundos desde a primeira mensagem para encher
+    linger: float = 0
+    messages: list = field(default_factory=list)
+    ready_at: float = 0
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class IspbPoller:
+    """Long polling de todos os streams de um ISPB neste processo.
+
+    Cada rodada faz um único claim dimensionado pela demanda somada dos
+    streams à espera e reparte as linhas entre eles em ordem de chegada.
+    O volume de claims cresce com o número de ISPBs, não de streams.
+    """
+
+    def __init__(self, ispb: str):
+        self.ispb = ispb
+        self._waiters: deque[Waiter] = deque()
+        self._task: asyncio.Task | None = None
+
+    async def wait(
+        self, claim, stream, limit: int, timeout: float, prefetch: int = 0, linger: float = 0,
+    ) -> list:
+        """Espera o lote do stream. `claim` vem de quem espera, para o poller
+        não prender o serviço de um request já encerrado."""
+        waiter = Waiter(claim, stream, limit, time.monotonic() + timeout, prefetch, linger)
+        self._waiters.append(waiter)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        else:
+            # Quem acabou de chegar não espera a próxima rodada
+            get_notifier().wake(self.ispb)
+
+        return await waiter.future
+
+    async def _run(self) -> None:
+        try:
+            await self._poll()
+        finally:
+            # Ocioso, sai do cache: o próximo wait do ISPB cria outro
+            if not self._waiters:
+                pollers = _pollers.get(asyncio.get_running_loop(), {})
+                if pollers.get(self.ispb) is self:
+                    del pollers[self.ispb]
+
+    async def _poll(self) -> None:
+        notifier = get_notifier()
+        while self._waiters:
+            # Inscreve antes do claim para não perder aviso entre as duas etapas
+            event = notifier.subscribe(self.ispb)
+            waiters = [waiter for waiter in self._waiters if not waiter.future.done()]
+
+            try:
+                # Qualquer waiter serve: os claims só diferem no serviço que os criou
+                batches = await waiters[0].claim(
+                    self.ispb, [(w.stream, w.limit - len(w.messages), w.prefetch) for w in waiters],
+                )
+            except Exception as exc:
+                batches = None
+                for waiter in waiters:
+                    if not waiter.future.done():
+                        waiter.future.set_exception(exc)
+
+            now = time.monotonic()
+            for waiter, messages in zip(waiters, batches or []):
+                # Request cancelado: o lote fica no stream e volta no replay da iteração
+                if waiter.future.done():
+                    continue
+                if messages and not waiter.messages:
+                    waiter.ready_at = min(now + waiter.linger, waiter.deadline)
+                waiter.messages += messages
+                # Extras do prefetch só vêm com a demanda atendida, então len >= limit é lote cheio
+                if len(waiter.messages) >= waiter.limit or waiter.deadline <= now \
+                        or (waiter.messages and waiter.ready_at <= now):
+                    waiter.future.set_result(waiter.messages)
+
+            self._waiters = deque(waiter for waiter in self._waiters if not waiter.future.done())
+            if not self._waiters:
+                return
+
+            # Acorda com aviso do ISPB, no polling de segurança ou no prazo do primeiro waiter
+            timeout = min(
+                waiter.ready_at if waiter.messages else waiter.deadline for waiter in self._waiters
+            ) - now
+            await notifier.wait(event, max(0, min(timeout, notifier.fallback_interval)))
+
+
+# Futures e tasks pertencem a um event loop, então há um conjunto por loop
+_pollers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_poller(ispb: str) -> IspbPoller:
+    loop = asyncio.get_running_loop()
+    pollers = _pollers.setdefault(loop, {})
+    poller = pollers.get(ispb)
+    if poller is None:
+        poller = pollers[ispb] = IspbPoller(ispb)
+    return poller
@@ -0,0 +1,129 @@
+from collections import deque
+from dataclasses import dataclass, field
+import time
+
+from django.conf import settings
+
+
+@dataclass
+class StreamBuffer:
+    ispb: str
+    lease_expires_at: object
+    messages: deque = field(default_factory=deque)
+    # monotonic do claim que encheu o buffer
+    claimed_at: float = 0.0
+    # Último claim veio cheio: o ISPB tem backlog e vale buscar adiantado
+    hot: bool = False
+
+
+class PrefetchBuffers:
+    """Mensagens já reservadas para um stream e ainda não entregues.
+
+    No banco elas ficam entregues ao stream com `iteration` nula, então não
+    entram no ack implícito nem no replay até serem servidas (quem serve grava
+    a iteração). O total do processo é limitado por PIX_PREFETCH_MAX_MESSAGES.
+    """
+
+    def __init__(self):
+        self._buffers: dict[str, StreamBuffer] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.released = 0
+
+    @property
+    def max_age(self) -> float:
+        # Mensagem servida depois do visibility timeout já pode ter voltado para a fila
+        if settings.PIX_VISIBILITY_TIMEOUT:
+            return min(settings.PIX_PREFETCH_MAX_AGE, settings.PIX_VISIBILITY_TIMEOUT / 2)
+        return settings.PIX_PREFETCH_MAX_AGE
+
+    def _get(self, stream) -> StreamBuffer:
+        buffer = self._buffers.get(stream.id)
+        if buffer is None:
+            buffer = self._buffers[stream.id] = StreamBuffer(stream.ispb, stream.lease_expires_at)
+        buffer.lease_expires_at = stream.lease_expires_at
+        return buffer
+
+    def prefetch_size(self, stream, limit: int) -> int:
+        """Quantas mensagens além de `limit` reservar no próximo claim."""
+        size = settings.PIX_PREFETCH_SIZE - limit
+        buffer = self._buffers.get(stream.id)
+        if size <= 0 or buffer is None or not buffer.hot:
+            return 0
+        return max(0, min(size, settings.PIX_PREFETCH_MAX_MESSAGES - self.size))
+
+    def put(self, stream, limit: int, served: list, extra: list) -> None:
+        """Registra o resultado de um claim: `served` foi entregue, `extra` fica guardado."""
+        if not settings.PIX_PREFETCH_SIZE:
+            return
+
+        buffer = self._get(stream)
+        buffer.hot = len(served) >= limit
+        if extra:
+            buffer.messages.extend(extra)
+            buffer.claimed_at = time.monotonic()
+            self.size += len(extra)
+            self.prefetched += len(extra)
+
+    def take(self, stream, limit: int) -> list:
+        buffer = self._buffers.get(stream.id)
+        if buffer is None or not buffer.messages:
+            if settings.PIX_PREFETCH_SIZE:
+                self.misses += 1
+            return []
+
+        buffer.lease_expires_at = stream.lease_expires_at
+        messages = [buffer.messages.popleft() for _ in range(min(limit, len(buffer.messages)))]
+        self.size -= len(messages)
+        self.hits += 1
+        for message in messages:
+            message.iteration = stream.iteration
+        return messages
+
+    def discard(self, stream_id: str) -> list:
+        """Tira o buffer do stream da memória, devolvendo o que não foi servido."""
+        buffer = self._buffers.pop(stream_id, None)
+        if buffer is None:
+            return []
+        self.size -= len(buffer.messages)
+        return list(buffer.messages)
+
+    def evict(self, now) -> dict[str, list]:
+        """Remove buffers de leases vencidos ou velhos demais.
+
+        Devolve {stream_id: mensagens não servidas} para liberar no banco.
+        """
+        oldest = time.monotonic() - self.max_age
+        evicted = {}
+        for stream_id, buffer in list(self._buffers.items()):
+            if buffer.lease_expires_at <= now:
+                evicted[stream_id] = self.discard(stream_id)
+            elif buffer.messages and buffer.claimed_at < oldest:
+                evicted[stream_id] = list(buffer.messages)
+                self.size -= len(buffer.messages)
+                buffer.messages.clear()
+        return {stream_id: messages for stream_id, messages in evicted.items() if messages}
+
+    def drain(self) -> dict[str, list]:
+        """Esvazia todos os buffers (shutdown)."""
+        return {
+            stream_id: messages
+            for stream_id in list(self._buffers)
+            if (messages := self.discard(stream_id))
+        }
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'buffered': self.size,
+            'streams': len(self._buffers),
+            'hits': self.hits,
+            'misses': self.misses,
+            'prefetched': self.prefetched,
+            'released': self.released,
+        }
+
+
+# Mensagens hidratadas não pertencem a um event loop: um conjunto por processo
+buffers = PrefetchBuffers()
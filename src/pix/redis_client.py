@@ -0,0 +1,29 @@
+import asyncio
+import weakref
+
+from django.conf import settings
+import redis.asyncio
+
+# Conexões redis.asyncio pertencem a um event loop, então há um cliente por loop
+_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> redis.asyncio.Redis:
+    """Cliente Redis async do processo, com um único pool de conexões."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # Pool esgotado espera uma conexão livre em vez de falhar na hora
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.PIX_REDIS_MAX_CONNECTIONS,
+            timeout=settings.PIX_REDIS_POOL_TIMEOUT,
+        )
+        client = _clients[loop] = redis.asyncio.Redis.from_pool(pool)
+    return client
+
+
+async def close_redis() -> None:
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,323 @@
+from datetime import UTC, datetime, timedelta
+import json
+
+from django.conf import settings
+from django.utils import timezone
+import redis.asyncio
+
+from .db import async_connection, hydrate
+from .models import Stream, generate_id
+
+INSERT_STREAM_SQL = """
+    INSERT INTO pix_stream (id, ispb, status, created_at, lease_expires_at, iteration)
+    VALUES (%s, %s, %s, %s, %s, 0)
+    RETURNING *
+"""
+
+GET_STREAM_SQL = """
+    SELECT * FROM pix_stream
+    WHERE id = %s AND ispb = %s AND status = %s
+"""
+
+RENEW_STREAM_SQL = """
+    UPDATE pix_stream
+    SET lease_expires_at = %s
+    WHERE id = %s AND ispb = %s AND status = %s AND lease_expires_at > %s
+    RETURNING *
+"""
+
+ADVANCE_ITERATION_SQL = """
+    UPDATE pix_stream
+    SET iteration = %s, lease_expires_at = %s
+    WHERE id = %s AND ispb = %s AND status = %s AND iteration = %s AND lease_expires_at > %s
+    RETURNING *
+"""
+
+CLOSE_STREAM_SQL = """
+    UPDATE pix_stream
+    SET status = %s, closed_at = %s
+    WHERE id = %s AND status = %s
+"""
+
+EXPIRED_STREAMS_SQL = """
+    SELECT * FROM pix_stream
+    WHERE status = %s AND lease_expires_at < %s
+    ORDER BY lease_expires_at
+    LIMIT %s
+"""
+
+ACTIVE_COUNTS_SQL = """
+    SELECT ispb, count(*) FROM pix_stream
+    WHERE status = %s
+    GROUP BY ispb
+"""
+
+# Histórico vindo do Redis; um stream fechado nunca volta a ativo,
+# mesmo que o evento de criação chegue depois do de fechamento
+UPSERT_HISTORY_SQL = """
+    INSERT INTO pix_stream (id, ispb, status, created_at, closed_at, lease_expires_at, iteration)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (id) DO UPDATE SET
+        status = EXCLUDED.status,
+        closed_at = EXCLUDED.closed_at,
+        lease_expires_at = EXCLUDED.lease_expires_at,
+        iteration = EXCLUDED.iteration
+    WHERE pix_stream.status = %s
+"""
+
+# Renova o lease do stream ativo e, com ARGV[6], avança a iteração se ela
+# for a seguinte à atual. Devolve o hash (HGETALL) ou nil.
+RENEW_SCRIPT = """
+local stream = redis.call('HMGET', KEYS[1], 'ispb', 'status', 'lease_expires_at', 'iteration')
+if stream[1] ~= ARGV[1] or stream[2] ~= ARGV[2] or tonumber(stream[3]) <= tonumber(ARGV[3]) then
+    return nil
+end
+if ARGV[6] ~= '' then
+    if tonumber(stream[4]) ~= tonumber(ARGV[6]) - 1 then
+        return nil
+    end
+    redis.call('HSET', KEYS[1], 'iteration', ARGV[6])
+end
+redis.call('HSET', KEYS[1], 'lease_expires_at', ARGV[4])
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[5])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# Remove o stream do registro e enfileira o fechamento no histórico no mesmo
+# passo; devolve 1 só para quem efetivamente fechou
+CLOSE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('RPUSH', KEYS[3], ARGV[3])
+return 1
+"""
+
+
+class PostgresStreamRegistry:
+    """Estado dos streams na tabela pix_stream."""
+
+    async def create(self, ispb: str, lease_ttl: timedelta) -> Stream:
+        now = timezone.now()
+        async with async_connection() as conn:
+            cursor = await conn.execute(INSERT_STREAM_SQL, [
+                generate_id(), ispb, Stream.STATUS_ACTIVE, now, now + lease_ttl,
+            ])
+            return hydrate(Stream, cursor, await cursor.fetchone())
+
+    async def get(self, ispb: str, stream_id: str) -> Stream | None:
+        async with async_connection() as conn:
+            cursor = await conn.execute(GET_STREAM_SQL, [stream_id, ispb, Stream.STATUS_ACTIVE])
+            row = await cursor.fetchone()
+            return hydrate(Stream, cursor, row) if row else None
+
+    async def renew(
+        self, ispb: str, stream_id: str, lease_ttl: timedelta, iteration: int | None = None,
+    ) -> Stream | None:
+        now = timezone.now()
+        if iteration is None:
+            sql = RENEW_STREAM_SQL
+            params = [now + lease_ttl, stream_id, ispb, Stream.STATUS_ACTIVE, now]
+        else:
+            sql = ADVANCE_ITERATION_SQL
+            params = [
+                iteration, now + lease_ttl,
+                stream_id, ispb, Stream.STATUS_ACTIVE, iteration - 1, now,
+            ]
+
+        async with async_connection() as conn:
+            cursor = await conn.execute(sql, params)
+            row = await cursor.fetchone()
+            return hydrate(Stream, cursor, row) if row else None
+
+    async def close(self, stream: Stream, closed_at: datetime) -> bool:
+        async with async_connection() as conn:
+            cursor = await conn.execute(CLOSE_STREAM_SQL, [
+                Stream.STATUS_CLOSED, closed_at, stream.id, Stream.STATUS_ACTIVE,
+            ])
+            return bool(cursor.rowcount)
+
+    async def expired(self, limit: int) -> list[Stream]:
+        async with async_connection() as conn:
+            cursor = await conn.execute(EXPIRED_STREAMS_SQL, [
+                Stream.STATUS_ACTIVE, timezone.now(), limit,
+            ])
+            return [hydrate(Stream, cursor, row) for row in await cursor.fetchall()]
+
+    async def active_counts(self) -> dict[str, int]:
+        async with async_connection() as conn:
+            cursor = await conn.execute(ACTIVE_COUNTS_SQL, [Stream.STATUS_ACTIVE])
+            return dict(await cursor.fetchall())
+
+    async def flush_history(self, batch_size: int = 500) -> int:
+        # Já escreve direto na tabela
+        return 0
+
+
+class RedisStreamRegistry:
+    """Estado dos streams ativos em um hash por stream no Redis.
+
+    Leases ficam também em um sorted set para o reaper achar os vencidos.
+    pix_stream vira só histórico: criação e fechamento entram em uma fila
+    no Redis e são gravados em lote por `flush_history`.
+    """
+
+    LEASES_KEY = 'stream:leases'
+    HISTORY_KEY = 'stream:history'
+    FIELDS = ['id', 'ispb', 'status', 'created_at', 'closed_at', 'lease_expires_at', 'iteration']
+
+    def __init__(self, redis_client: redis.asyncio.Redis):
+        self.redis = redis_client
+        self._renew = self.redis.register_script(RENEW_SCRIPT)
+        self._close = self.redis.register_script(CLOSE_SCRIPT)
+
+    def _key(self, stream_id: str) -> str:
+        return f'stream:state:{stream_id}'
+
+    def _load(self, data: dict) -> Stream:
+        data = {key.decode(): value.decode() for key, value in data.items()}
+        return Stream.from_db('default', self.FIELDS, [
+            data['id'],
+            data['ispb'],
+            data['status'],
+            datetime.fromtimestamp(float(data['created_at']), UTC),
+            None,
+            datetime.fromtimestamp(float(data['lease_expires_at']), UTC),
+            int(data['iteration']),
+        ])
+
+    def _history(self, stream: Stream, closed_at: datetime | None = None) -> str:
+        return json.dumps({
+            'id': stream.id,
+            'ispb': stream.ispb,
+            'status': Stream.STATUS_CLOSED if closed_at else Stream.STATUS_ACTIVE,
+            'created_at': stream.created_at.isoformat(),
+            'closed_at': closed_at.isoformat() if closed_at else None,
+            'lease_expires_at': stream.lease_expires_at.isoformat(),
+            'iteration': stream.iteration,
+        })
+
+    async def create(self, ispb: str, lease_ttl: timedelta) -> Stream:
+        now = timezone.now()
+        stream = Stream(
+            id=generate_id(), ispb=ispb, status=Stream.STATUS_ACTIVE,
+            created_at=now, lease_expires_at=now + lease_ttl, iteration=0,
+        )
+        lease = stream.lease_expires_at.timestamp()
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(stream.id), mapping={
+                'id': stream.id,
+                'ispb': ispb,
+                'status': stream.status,
+                'created_at': now.timestamp(),
+                'lease_expires_at': lease,
+                'iteration': 0,
+            })
+            pipe.zadd(self.LEASES_KEY, {stream.id: lease})
+            pipe.rpush(self.HISTORY_KEY, self._history(stream))
+            await pipe.execute()
+
+        stream._state.adding = False
+        return stream
+
+    async def get(self, ispb: str, stream_id: str) -> Stream | None:
+        data = await self.redis.hgetall(self._key(stream_id))
+        if not data:
+            return None
+        stream = self._load(data)
+        if stream.ispb != ispb or stream.status != Stream.STATUS_ACTIVE:
+            return None
+        return stream
+
+    async def renew(
+        self, ispb: str, stream_id: str, lease_ttl: timedelta, iteration: int | None = None,
+    ) -> Stream | None:
+        now = timezone.now()
+        result = await self._renew(
+            keys=[self._key(stream_id), self.LEASES_KEY],
+            args=[
+                ispb, Stream.STATUS_ACTIVE, now.timestamp(), (now + lease_ttl).timestamp(),
+                stream_id, '' if iteration is None else iteration,
+            ],
+        )
+        if not result:
+            return None
+        return self._load(dict(zip(result[::2], result[1::2])))
+
+    async def close(self, stream: Stream, closed_at: datetime) -> bool:
+        closed = await self._close(
+            keys=[self._key(stream.id), self.LEASES_KEY, self.HISTORY_KEY],
+            args=[Stream.STATUS_ACTIVE, stream.id, self._history(stream, closed_at)],
+        )
+        return bool(closed)
+
+    async def expired(self, limit: int) -> list[Stream]:
+        ids = await self.redis.zrangebyscore(
+            self.LEASES_KEY, '-inf', timezone.now().timestamp(), start=0, num=limit,
+        )
+        states = await self._hgetall_many(ids)
+
+        streams = [self._load(data) for data in states if data]
+        # Hash sumiu sem passar pelo close: só tira do índice
+        missing = [stream_id for stream_id, data in zip(ids, states) if not data]
+        if missing:
+            await self.redis.zrem(self.LEASES_KEY, *missing)
+        return streams
+
+    async def active_counts(self) -> dict[str, int]:
+        ids = await self.redis.zrange(self.LEASES_KEY, 0, -1)
+        if not ids:
+            return {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stream_id in ids:
+                pipe.hget(self._key(stream_id.decode()), 'ispb')
+            ispbs = await pipe.execute()
+
+        counts: dict[str, int] = {}
+        for ispb in filter(None, ispbs):
+            counts[ispb.decode()] = counts.get(ispb.decode(), 0) + 1
+        return counts
+
+    async def _hgetall_many(self, ids: list[bytes]) -> list[dict]:
+        """Hashes dos streams em um round trip."""
+        if not ids:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for stream_id in ids:
+                pipe.hgetall(self._key(stream_id.decode()))
+            return await pipe.execute()
+
+    async def flush_history(self, batch_size: int = 500) -> int:
+        """Grava em pix_stream um lote da fila de histórico. Devolve quantos gravou."""
+        events = await self.redis.lpop(self.HISTORY_KEY, batch_size)
+        if not events:
+            return 0
+
+        rows = []
+        for event in events:
+            data = json.loads(event)
+            rows.append([
+                data['id'], data['ispb'], data['status'], data['created_at'],
+                data['closed_at'], data['lease_expires_at'], data['iteration'],
+                Stream.STATUS_ACTIVE,
+            ])
+
+        try:
+            async with async_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.executemany(UPSERT_HISTORY_SQL, rows)
+        except BaseException:
+            # Devolve o lote para o início da fila, na ordem original
+            await self.redis.lpush(self.HISTORY_KEY, *reversed(events))
+            raise
+
+        return len(events)
+
+
+def get_registry(redis_client: redis.asyncio.Redis) -> PostgresStreamRegistry | RedisStreamRegistry:
+    if settings.PIX_STREAM_REGISTRY == 'redis':
+        return RedisStreamRegistry(redis_client)
+    return PostgresStreamRegistry()
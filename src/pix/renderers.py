@@ -2,5 +2,7 @@ from rest_framework.renderers import JSONRenderer
 
 
 class MultipartJSONRenderer(JSONRenderer):
+    """Lote como array JSON (?format=multipart); o multipart por partes sai de pix.multipart."""
+
     media_type = 'multipart/json'
     format = 'multipart'
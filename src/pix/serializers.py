@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import PixMessage
 
@@ -19,3 +20,34 @@ class PixMessageSerializer(serializers.ModelSerializer):
             'txId',
             'dataHoraPagamento',
         ]
+
+
+class PixMessageIngestSerializer(PixMessageSerializer):
+    """Mensagem recebida na ingestão em lote (mesmo formato da entrega).
+
+    endToEndId é declarado sem UniqueValidator: a dedupe é do INSERT, não
+    uma consulta por mensagem.
+    """
+
+    endToEndId = serializers.CharField(source='end_to_end_id', max_length=50)
+    campoLivre = serializers.CharField(source='campo_livre', required=False, allow_blank=True)
+    txId = serializers.CharField(source='tx_id', required=False, allow_blank=True, max_length=35)
+
+    def validate_pagador(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Deve ser um objeto')
+        return value
+
+    def validate_recebedor(self, value):
+        ispb = value.get('ispb') if isinstance(value, dict) else None
+        if not isinstance(ispb, str) or not ispb.isdigit() or len(ispb) != 8:
+            raise serializers.ValidationError('recebedor.ispb deve ter 8 dígitos')
+        return value
+
+
+class AckSerializer(serializers.Serializer):
+    endToEndIds = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        allow_empty=False,
+        max_length=settings.PIX_MAX_ACK_BATCH,
+    )
@@ -1,95 +1,683 @@
 import asyncio
-import time
+from datetime import UTC, datetime, timedelta
+import math
+import zlib
 
-from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db import transaction
 from django.utils import timezone
-import redis
+import psycopg
+import redis.asyncio
 
+from .db import async_connection, hydrate
 from .models import Stream, PixMessage
+from .notifier import apublish
+from .poller import get_poller
+from .prefetch import buffers
+from .redis_client import get_redis
+from .registry import get_registry
+
+# Checa o limite e ocupa um slot em uma única operação atômica no Redis.
+# Devolve o número do slot (1..limite) ou 0 quando o ISPB está cheio.
+ADMIT_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+if count >= tonumber(ARGV[1]) then
+    return 0
+end
+return redis.call('INCR', KEYS[1])
+"""
+
+# Corrige o contador só se ninguém mexeu nele desde a leitura (compare-and-set).
+# Baixar só na segunda rodada que vê a mesma sobra: um stream/start ou DELETE
+# em andamento deixa o contador acima do registro por um instante, e baixar
+# nessa hora deixaria o contador abaixo dos streams ativos (admite a mais).
+RECONCILE_SCRIPT = """
+local current = redis.call('GET', KEYS[1]) or ''
+if current ~= ARGV[1] then
+    return 0
+end
+if current ~= '' and tonumber(ARGV[2]) < tonumber(current) then
+    local seen = current .. ':' .. ARGV[2]
+    if redis.call('GET', KEYS[2]) ~= seen then
+        redis.call('SET', KEYS[2], seen, 'EX', ARGV[3])
+        return 0
+    end
+    redis.call('DEL', KEYS[2])
+end
+if ARGV[2] == '0' then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], ARGV[2])
+end
+return 1
+"""
+# Quanto tempo a sobra vista numa rodada espera a confirmação da próxima
+RECONCILE_DRIFT_TTL = 3600
+
+# Tira a marca de leitura em andamento só se ainda é da mesma iteração
+END_POLL_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+# Folga da marca além do prazo do long polling (o claim em si, a resposta)
+POLL_MARK_MARGIN = 5
+# Intervalo com que um retry confere se a leitura original já terminou
+REPLAY_CHECK_INTERVAL = 0.05
+
+# Status literal (não parâmetro) para o planner casar o predicado do índice
+# parcial pix_message_claim_idx mesmo com plano genérico de statement preparado.
+# O limite em created_at (horizonte) deixa o claim só nas partições quentes
+# quando pix_message é particionada; (id, created_at) acha a partição da linha.
+_CLAIM_SQL = """
+    UPDATE pix_message
+    SET stream_id = %s, status = %s, locked_at = %s, iteration = %s
+    WHERE (id, created_at) IN (
+        SELECT id, created_at FROM pix_message
+        WHERE recebedor_ispb = %s AND status = 'pending' AND stream_id IS NULL
+            AND created_at >= %s{buckets}
+        ORDER BY seq
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING {returning}
+"""
+
+NO_HORIZON = datetime.min.replace(tzinfo=UTC)
+
+# O roll-forward de partições muda created_at de pendentes: o claim que trava
+# uma linha já movida de partição falha com serialization_failure mesmo em
+# read committed. Com autocommit o statement é a transação, então basta repetir.
+CLAIM_ATTEMPTS = 3
+
+# Variante listrada: um bucket só, range scan em pix_message_bucket_idx
+BUCKET_FILTER = ' AND bucket = %s'
+
+# Com PIX_PRERENDERED_PAYLOAD o claim devolve o payload pronto; os campos da
+# mensagem só voltam do banco para linhas sem payload (anteriores à opção)
+PAYLOAD_FIELDS = [
+    'end_to_end_id', 'valor', 'pagador', 'recebedor', 'campo_livre', 'tx_id', 'data_hora_pagamento',
+]
+
+
+async def execute_claim(conn, sql: str, params: list):
+    """Executa um claim, repetindo quando a linha travada mudou de partição."""
+    for attempt in range(CLAIM_ATTEMPTS):
+        try:
+            return await conn.execute(sql, params)
+        except psycopg.errors.SerializationFailure:
+            if attempt == CLAIM_ATTEMPTS - 1:
+                raise
+
+
+def payload_columns(table: str = '') -> str:
+    prefix = f'{table}.' if table else ''
+    columns = [f'{prefix}{column}' for column in ['id', 'seq', 'stream_id', 'iteration', 'payload']]
+    columns += [
+        f'CASE WHEN {prefix}payload IS NULL THEN {prefix}{field} END AS {field}'
+        for field in PAYLOAD_FIELDS
+    ]
+    return ', '.join(columns)
+
+
+def claim_variants(template: str, table: str = '') -> dict[tuple[bool, bool], str]:
+    """SQL por (listrado, payload)."""
+    return {
+        (striped, payload): template.format(
+            buckets=BUCKET_FILTER if striped else '',
+            returning=payload_columns(table) if payload else f'{table}.*' if table else '*',
+        )
+        for striped in (False, True)
+        for payload in (False, True)
+    }
+
+
+CLAIM_VARIANTS = claim_variants(_CLAIM_SQL)
+CLAIM_SQL = CLAIM_VARIANTS[False, False]
+CLAIM_STRIPED_SQL = CLAIM_VARIANTS[True, False]
+
+# Claim único para vários streams do ISPB: cada linha travada (na ordem de
+# chegada) ocupa um slot; os slots vêm na ordem dos waiters, `limit` por waiter
+_CLAIM_BATCH_SQL = """
+    WITH picked AS (
+        SELECT id, created_at, row_number() OVER (ORDER BY seq) AS slot
+        FROM (
+            SELECT id, created_at, seq FROM pix_message
+            WHERE recebedor_ispb = %s AND status = 'pending' AND stream_id IS NULL
+                AND created_at >= %s{buckets}
+            ORDER BY seq
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ) locked
+    ), slots AS (
+        SELECT * FROM unnest(%s::varchar[], %s::integer[], %s::integer[])
+            WITH ORDINALITY AS s(stream_id, iteration, waiter, slot)
+    )
+    UPDATE pix_message
+    SET stream_id = slots.stream_id, status = %s, locked_at = %s, iteration = slots.iteration
+    FROM picked JOIN slots USING (slot)
+    WHERE pix_message.id = picked.id AND pix_message.created_at = picked.created_at
+    RETURNING {returning}, slots.waiter
+"""
+
+CLAIM_BATCH_VARIANTS = claim_variants(_CLAIM_BATCH_SQL, 'pix_message')
+CLAIM_BATCH_SQL = CLAIM_BATCH_VARIANTS[False, False]
+
+# Variante listrada do claim em lote: cada slot leva o bucket do seu stream e
+# cada bucket pedido trava, no próprio range do índice, só o que os seus
+# slots pedem. Os slots de um bucket pegam as linhas dele em ordem de chegada.
+_CLAIM_BATCH_STRIPED_SQL = """
+    WITH slots AS (
+        SELECT s.*, row_number() OVER (PARTITION BY s.bucket ORDER BY s.ord) AS slot
+        FROM unnest(%s::varchar[], %s::integer[], %s::integer[], %s::integer[])
+            WITH ORDINALITY AS s(stream_id, iteration, waiter, bucket, ord)
+    ), wanted AS (
+        SELECT bucket, count(*) AS size FROM slots GROUP BY bucket
+    ), picked AS (
+        SELECT locked.id, locked.created_at, wanted.bucket,
+            row_number() OVER (PARTITION BY wanted.bucket ORDER BY locked.seq) AS slot
+        FROM wanted CROSS JOIN LATERAL (
+            SELECT id, created_at, seq FROM pix_message
+            WHERE recebedor_ispb = %s AND status = 'pending' AND stream_id IS NULL
+                AND created_at >= %s AND bucket = wanted.bucket
+            ORDER BY seq
+            LIMIT wanted.size
+            FOR UPDATE SKIP LOCKED
+        ) locked
+    )
+    UPDATE pix_message
+    SET stream_id = slots.stream_id, status = %s, locked_at = %s, iteration = slots.iteration
+    FROM picked JOIN slots USING (bucket, slot)
+    WHERE pix_message.id = picked.id AND pix_message.created_at = picked.created_at
+    RETURNING {returning}, slots.ord, slots.waiter
+"""
+
+# SQL por payload; o filtro de bucket já faz parte do template
+CLAIM_BATCH_STRIPED_VARIANTS = {
+    payload: claim_variants(_CLAIM_BATCH_STRIPED_SQL, 'pix_message')[False, payload]
+    for payload in (False, True)
+}
+CLAIM_BATCH_STRIPED_SQL = CLAIM_BATCH_STRIPED_VARIANTS[False]
+
+RELEASE_MESSAGES_SQL = """
+    UPDATE pix_message
+    SET stream_id = NULL, status = %s, locked_at = NULL, iteration = NULL
+    WHERE stream_id = %s AND status = %s
+"""
+
+CONFIRM_MESSAGES_SQL = """
+    UPDATE pix_message
+    SET status = %s, locked_at = NULL
+    WHERE stream_id = %s AND status = %s AND end_to_end_id = ANY(%s)
+"""
+
+CONFIRM_ITERATIONS_SQL = """
+    UPDATE pix_message
+    SET status = %s, locked_at = NULL
+    WHERE stream_id = %s AND status = %s AND iteration < %s
+"""
+
+REPLAY_ITERATION_SQL = """
+    SELECT {columns} FROM pix_message
+    WHERE stream_id = %s AND status = %s AND iteration = %s
+    ORDER BY seq
+"""
+
+# Apaga streams fechados antigos soltando as mensagens que apontam para eles,
+# como o on_delete=SET_NULL faria (a FK não tem constraint no banco)
+PRUNE_STREAMS_SQL = """
+    WITH pruned AS (
+        DELETE FROM pix_stream
+        WHERE id IN (
+            SELECT id FROM pix_stream
+            WHERE status = %s AND closed_at < %s
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+    ), detached AS (
+        UPDATE pix_message SET stream_id = NULL
+        WHERE stream_id IN (SELECT id FROM pruned)
+    )
+    SELECT count(*) FROM pruned
+"""
+
+# Grava a iteração das servidas do prefetch: o ack implícito e o replay as
+# acham no banco em qualquer worker. A que o sweep já devolveu para a fila
+# não volta na lista e não é servida.
+SERVE_PREFETCHED_SQL = """
+    UPDATE pix_message
+    SET iteration = %s
+    WHERE id = ANY(%s) AND stream_id = %s AND status = %s AND iteration IS NULL
+    RETURNING id
+"""
+
+# Devolve para a fila mensagens reservadas no prefetch e nunca servidas
+RELEASE_PREFETCHED_SQL = """
+    UPDATE pix_message
+    SET stream_id = NULL, status = %s, locked_at = NULL, iteration = NULL
+    WHERE (id, stream_id) IN (SELECT * FROM unnest(%s::uuid[], %s::varchar[]))
+        AND status = %s AND iteration IS NULL
+    RETURNING recebedor_ispb
+"""
+
+SWEEP_MESSAGES_SQL = """
+    UPDATE pix_message
+    SET stream_id = NULL, status = %s, locked_at = NULL, iteration = NULL
+    WHERE id IN (
+        SELECT id FROM pix_message
+        WHERE status = %s AND locked_at < %s
+        ORDER BY locked_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING recebedor_ispb
+"""
+
+
+def claim_horizon() -> datetime:
+    """Mensagens mais antigas que isso ficam fora do claim (PIX_CLAIM_HORIZON_DAYS).
+
+    Sem horizonte, o limite não corta nada. Com ele, o `partition_messages
+    maintain` traz para a partição do dia as pendentes que se aproximam do limite.
+    """
+    if not settings.PIX_CLAIM_HORIZON_DAYS:
+        return NO_HORIZON
+    return timezone.now() - timedelta(days=settings.PIX_CLAIM_HORIZON_DAYS)
+
+
+def stream_bucket(stream: Stream) -> int:
+    """Bucket preferido do stream nesta iteração.
+
+    Cada stream começa em um ponto do anel de buckets e gira um a cada
+    iteração, então streams irmãos raramente disputam o mesmo bucket e
+    nenhum bucket fica sem dono.
+    """
+    return (zlib.crc32(stream.id.encode()) + stream.iteration) % PixMessage.CLAIM_BUCKETS
+
+
+def claim_slots(demands: list[tuple[Stream, int, int]]) -> tuple[list, list, list, list]:
+    """Slots do claim em lote: (stream_ids, iterations, waiters, buckets).
+
+    Primeiro `limit` slots de cada demanda, na ordem; depois os de prefetch,
+    sem iteração.
+    """
+    stream_ids, iterations, waiters, buckets = [], [], [], []
+    for index, (stream, limit, _) in enumerate(demands):
+        stream_ids += [stream.id] * limit
+        iterations += [stream.iteration] * limit
+        waiters += [index] * limit
+        buckets += [stream_bucket(stream)] * limit
+    for index, (stream, _, prefetch) in enumerate(demands):
+        stream_ids += [stream.id] * prefetch
+        iterations += [None] * prefetch
+        waiters += [index] * prefetch
+        buckets += [stream_bucket(stream)] * prefetch
+    return stream_ids, iterations, waiters, buckets
 
 
 class StreamService:
+    """Operações de stream sobre conexões psycopg async.
+
+    O acesso ao banco roda direto no event loop, sem passar pelo thread
+    único do sync_to_async, então long pollings concorrentes não se
+    serializam.
+    """
 
-    def __init__(self):
-        self.redis = redis.from_url(settings.REDIS_URL)
+    def __init__(self, redis_client: redis.asyncio.Redis | None = None, registry=None):
+        self.redis = redis_client or get_redis()
+        # Onde fica o estado dos streams ativos: pix_stream ou hash no Redis
+        self.registry = registry or get_registry(self.redis)
         self.max_streams = settings.PIX_MAX_STREAMS_PER_ISPB
+        self.lease_ttl = timedelta(seconds=settings.PIX_STREAM_LEASE_TTL)
+        self._admit = self.redis.register_script(ADMIT_SCRIPT)
+        self._reconcile = self.redis.register_script(RECONCILE_SCRIPT)
+        self._end_poll = self.redis.register_script(END_POLL_SCRIPT)
 
     def _stream_count_key(self, ispb: str) -> str:
         return f'stream:count:{ispb}'
 
-    def get_active_count(self, ispb: str) -> int:
-        count = self.redis.get(self._stream_count_key(ispb))
+    def _stream_drift_key(self, ispb: str) -> str:
+        return f'stream:drift:{ispb}'
+
+    def _stream_polling_key(self, stream_id: str) -> str:
+        return f'stream:polling:{stream_id}'
+
+    async def get_active_count(self, ispb: str) -> int:
+        count = await self.redis.get(self._stream_count_key(ispb))
         return int(count) if count else 0
 
-    def create_stream(self, ispb: str) -> Stream | None:
-        if self.get_active_count(ispb) >= self.max_streams:
+    async def create_stream(self, ispb: str) -> Stream | None:
+        key = self._stream_count_key(ispb)
+        slot = await self._admit(keys=[key], args=[self.max_streams])
+        if not slot:
             return None
 
-        stream = Stream.objects.create(ispb=ispb)
-        self.redis.incr(self._stream_count_key(ispb))
-        return stream
-
-    def get_stream(self, ispb: str, stream_id: str) -> Stream | None:
         try:
-            return Stream.objects.get(id=stream_id, ispb=ispb, status=Stream.STATUS_ACTIVE)
-        except Stream.DoesNotExist:
-            return None
+            return await self.registry.create(ispb, self.lease_ttl)
+        except BaseException:
+            # Stream não foi criado: devolve o slot
+            await self.redis.decr(key)
+            raise
+
+    async def get_stream(self, ispb: str, stream_id: str) -> Stream | None:
+        return await self.registry.get(ispb, stream_id)
 
-    @transaction.atomic
-    def close_stream(self, stream: Stream) -> None:
+    async def renew_stream(self, ispb: str, stream_id: str) -> Stream | None:
+        """Busca o stream ativo renovando o lease. Lease vencido conta como fechado."""
+        return await self.registry.renew(ispb, stream_id, self.lease_ttl)
+
+    async def close_stream(self, stream: Stream) -> None:
         if stream.status == Stream.STATUS_CLOSED:
             return
 
-        # Libera mensagens não confirmadas
-        PixMessage.objects.filter(
-            stream=stream,
-            status=PixMessage.STATUS_DELIVERED,
-        ).update(
-            stream=None,
-            status=PixMessage.STATUS_PENDING,
-        )
+        closed_at = timezone.now()
+        # Fecha antes de liberar: depois disso nenhuma continuação faz claim
+        closed = await self.registry.close(stream, closed_at)
+        async with async_connection() as conn:
+            # Libera mensagens não confirmadas
+            await conn.execute(RELEASE_MESSAGES_SQL, [
+                PixMessage.STATUS_PENDING, stream.id, PixMessage.STATUS_DELIVERED,
+            ])
 
+        # O release acima já devolveu o que estava no buffer
+        buffers.discard(stream.id)
         stream.status = Stream.STATUS_CLOSED
-        stream.closed_at = timezone.now()
-        stream.save()
-
-        self.redis.decr(self._stream_count_key(stream.ispb))
-
-    @transaction.atomic
-    def fetch_messages(self, stream: Stream, limit: int = 1) -> list[PixMessage]:
-        messages = list(
-            PixMessage.objects
-            .select_for_update(skip_locked=True)
-            .filter(
-                recebedor_ispb=stream.ispb,
-                status=PixMessage.STATUS_PENDING,
-                stream__isnull=True,
-            )
-            .order_by('created_at')[:limit]
-        )
+        stream.closed_at = closed_at
 
-        if messages:
-            ids = [m.id for m in messages]
-            PixMessage.objects.filter(id__in=ids).update(
-                stream=stream,
-                status=PixMessage.STATUS_DELIVERED,
-            )
-            messages = list(PixMessage.objects.filter(id__in=ids))
+        # Só devolve o slot se este fechamento mudou o status
+        if closed:
+            await self.redis.decr(self._stream_count_key(stream.ispb))
+        await apublish(stream.ispb)
 
-        return messages
+    async def confirm_messages(self, stream: Stream, end_to_end_ids: list[str]) -> int:
+        """Confirma em um único UPDATE as mensagens entregues a este stream."""
+        async with async_connection() as conn:
+            cursor = await conn.execute(CONFIRM_MESSAGES_SQL, [
+                PixMessage.STATUS_CONFIRMED,
+                stream.id,
+                PixMessage.STATUS_DELIVERED,
+                list(end_to_end_ids),
+            ])
+            return cursor.rowcount
+
+    async def advance_stream(self, ispb: str, stream_id: str, iteration: int) -> Stream | None:
+        """Avança o stream ativo para `iteration`, renovando o lease e
+        confirmando os lotes anteriores.
+
+        Puxar a próxima iteração é o ack implícito do que já foi entregue.
+        Devolve None se `iteration` não é a seguinte à atual. Se a confirmação
+        falhar depois do avanço, o próximo avanço confirma o que ficou para trás.
+        """
+        stream = await self.registry.renew(ispb, stream_id, self.lease_ttl, iteration)
+        if stream is None:
+            return None
+
+        async with async_connection() as conn:
+            await conn.execute(CONFIRM_ITERATIONS_SQL, [
+                PixMessage.STATUS_CONFIRMED, stream.id, PixMessage.STATUS_DELIVERED, iteration,
+            ])
+
+        return stream
+
+    async def start_iteration(self, stream: Stream, iteration: int) -> bool:
+        advanced = await self.advance_stream(stream.ispb, stream.id, iteration)
+        if advanced is None:
+            return False
+
+        stream.iteration = advanced.iteration
+        stream.lease_expires_at = advanced.lease_expires_at
+        return True
 
-    async def fetch_messages_with_polling(self, stream: Stream, limit: int = 1) -> list[PixMessage]:
-        timeout = settings.PIX_LONG_POLLING_TIMEOUT
-        start = time.time()
+    async def replay_iteration(self, stream: Stream, iteration: int) -> list[PixMessage]:
+        """Lote já entregue na iteração, para responder um retry sem novo claim.
 
+        Se a leitura original da iteração ainda está no long polling (em
+        qualquer worker), espera ela terminar: o lote que ela pegar é o que
+        o retry tem de devolver.
+        """
+        key = self._stream_polling_key(stream.id)
+        while await self.redis.get(key) == str(iteration).encode():
+            await asyncio.sleep(REPLAY_CHECK_INTERVAL)
+
+        async with async_connection() as conn:
+            columns = payload_columns() if settings.PIX_PRERENDERED_PAYLOAD else '*'
+            cursor = await conn.execute(REPLAY_ITERATION_SQL.format(columns=columns), [
+                stream.id, PixMessage.STATUS_DELIVERED, iteration,
+            ])
+            return [hydrate(PixMessage, cursor, row) for row in await cursor.fetchall()]
+
+    async def reap_expired_streams(self, batch_size: int = 100) -> int:
+        """Fecha streams com lease vencido, devolvendo as mensagens para a fila."""
+        reaped = 0
+        while True:
+            streams = await self.registry.expired(batch_size)
+            for stream in streams:
+                await self.close_stream(stream)
+            reaped += len(streams)
+
+            if len(streams) < batch_size:
+                return reaped
+
+    async def reconcile_counts(self) -> int:
+        """Alinha os contadores do Redis com os streams ativos no registro.
+
+        Contador abaixo do registro sobe na hora. Acima, só baixa quando duas
+        rodadas seguidas veem a mesma sobra com o contador parado: uma
+        admissão ou fechamento em andamento não derruba o contador abaixo do
+        real.
+        """
+        prefix = self._stream_count_key('')
+        keys = [key.decode() async for key in self.redis.scan_iter(match=f'{prefix}*')]
+        current = dict(zip(keys, await self.redis.mget(keys))) if keys else {}
+
+        actual = {
+            self._stream_count_key(ispb): count
+            for ispb, count in (await self.registry.active_counts()).items()
+        }
+
+        fixed = 0
+        for key in current.keys() | actual.keys():
+            value = current.get(key)
+            expected = actual.get(key, 0)
+            if int(value or 0) != expected:
+                fixed += await self._reconcile(
+                    keys=[key, self._stream_drift_key(key.removeprefix(prefix))],
+                    args=[value.decode() if value else '', expected, RECONCILE_DRIFT_TTL],
+                )
+        return fixed
+
+    async def flush_stream_history(self, batch_size: int = 500) -> int:
+        """Grava em pix_stream o histórico pendente do registro no Redis."""
+        flushed = 0
         while True:
-            messages = await sync_to_async(self.fetch_messages)(stream, limit)
+            count = await self.registry.flush_history(batch_size)
+            flushed += count
+            if count < batch_size:
+                return flushed
+
+    async def prune_closed_streams(self, days: float, batch_size: int = 1000) -> int:
+        """Remove de pix_stream os streams fechados há mais de `days` dias."""
+        cutoff = timezone.now() - timedelta(days=days)
+        pruned = 0
+        while True:
+            async with async_connection() as conn:
+                cursor = await conn.execute(PRUNE_STREAMS_SQL, [
+                    Stream.STATUS_CLOSED, cutoff, batch_size,
+                ])
+                count, = await cursor.fetchone()
+
+            pruned += count
+            if count < batch_size:
+                return pruned
+
+    async def sweep_expired_messages(self, timeout: float, chunk_size: int = 1000) -> int:
+        """Devolve para a fila mensagens entregues há mais de `timeout` segundos
+        sem confirmação, em lotes de `chunk_size` para não segurar locks longos.
+        """
+        cutoff = timezone.now() - timedelta(seconds=timeout)
+        swept = 0
+        while True:
+            async with async_connection() as conn:
+                cursor = await conn.execute(SWEEP_MESSAGES_SQL, [
+                    PixMessage.STATUS_PENDING, PixMessage.STATUS_DELIVERED, cutoff, chunk_size,
+                ])
+                ispbs = [ispb for ispb, in await cursor.fetchall()]
+
+            if ispbs:
+                await apublish(*ispbs)
+            swept += len(ispbs)
+
+            if len(ispbs) < chunk_size:
+                return swept
+
+    async def fetch_messages(self, stream: Stream, limit: int = 1) -> list[PixMessage]:
+        # Claim em um único statement: trava, marca e devolve as linhas
+        params = [
+            stream.id,
+            PixMessage.STATUS_DELIVERED,
+            timezone.now(),
+            stream.iteration,
+            stream.ispb,
+            claim_horizon(),
+        ]
+        payload = settings.PIX_PRERENDERED_PAYLOAD
+        messages = []
+        async with async_connection() as conn:
+            if settings.PIX_STRIPED_CLAIM:
+                cursor = await execute_claim(conn, CLAIM_VARIANTS[True, payload], [
+                    *params, stream_bucket(stream), limit,
+                ])
+                messages = [hydrate(PixMessage, cursor, row) for row in await cursor.fetchall()]
+
+            if len(messages) < limit:
+                # Sem listras ou com o bucket próprio vazio: rouba dos outros
+                cursor = await execute_claim(conn, CLAIM_VARIANTS[False, payload], [*params, limit - len(messages)])
+                messages += [hydrate(PixMessage, cursor, row) for row in await cursor.fetchall()]
+
+        # RETURNING não garante ordem
+        messages.sort(key=lambda m: m.seq)
+        return messages
+
+    async def claim_batch(
+        self, ispb: str, demands: list[tuple[Stream, int, int]],
+    ) -> list[list[PixMessage]]:
+        """Claim em um único statement para vários streams do ISPB.
+
+        As linhas mais antigas vão para os primeiros da lista, até `limit`
+        de cada um; só depois de atendida a demanda de todos entram as
+        `prefetch` reservadas além do limite, sem iteração. Devolve os lotes
+        na ordem de `demands`. Com PIX_STRIPED_CLAIM, cada stream tenta antes
+        o seu bucket e os slots que sobrarem vão para os demais buckets.
+        """
+        stream_ids, iterations, waiters, buckets = claim_slots(demands)
+        batches: list[list[PixMessage]] = [[] for _ in demands]
+        payload = settings.PIX_PRERENDERED_PAYLOAD
+        async with async_connection() as conn:
+            if settings.PIX_STRIPED_CLAIM and stream_ids:
+                cursor = await execute_claim(conn, CLAIM_BATCH_STRIPED_VARIANTS[payload], [
+                    stream_ids, iterations, waiters, buckets, ispb, claim_horizon(),
+                    PixMessage.STATUS_DELIVERED, timezone.now(),
+                ])
+                # ord é 1-based; os slots que sobraram seguem na ordem original
+                filled = set()
+                for row in await cursor.fetchall():
+                    filled.add(row[-2] - 1)
+                    batches[row[-1]].append(hydrate(PixMessage, cursor, row))
+                missing = [slot for slot in range(len(stream_ids)) if slot not in filled]
+                stream_ids = [stream_ids[slot] for slot in missing]
+                iterations = [iterations[slot] for slot in missing]
+                waiters = [waiters[slot] for slot in missing]
+
+            if stream_ids:
+                await self._claim_slots(
+                    conn, CLAIM_BATCH_VARIANTS[False, payload], [ispb, claim_horizon()],
+                    stream_ids, iterations, waiters, batches,
+                )
+
+        # RETURNING não garante ordem
+        for messages in batches:
+            messages.sort(key=lambda m: m.seq)
+        return batches
+
+    async def _claim_slots(self, conn, sql, filters, stream_ids, iterations, waiters, batches) -> int:
+        cursor = await execute_claim(conn, sql, [
+            *filters,
+            len(stream_ids),
+            stream_ids,
+            iterations,
+            waiters,
+            PixMessage.STATUS_DELIVERED,
+            timezone.now(),
+        ])
+        rows = await cursor.fetchall()
+        for row in rows:
+            batches[row[-1]].append(hydrate(PixMessage, cursor, row))
+        return len(rows)
+
+    async def release_prefetched(self, evicted: dict[str, list[PixMessage]]) -> int:
+        """Devolve para a fila mensagens do prefetch que não chegaram a ser servidas."""
+        ids, stream_ids = [], []
+        for stream_id, messages in evicted.items():
+            ids += [message.id for message in messages]
+            stream_ids += [stream_id] * len(messages)
+        if not ids:
+            return 0
+
+        async with async_connection() as conn:
+            cursor = await conn.execute(RELEASE_PREFETCHED_SQL, [
+                PixMessage.STATUS_PENDING, ids, stream_ids, PixMessage.STATUS_DELIVERED,
+            ])
+            ispbs = [ispb for ispb, in await cursor.fetchall()]
+
+        buffers.released += len(ispbs)
+        await apublish(*ispbs)
+        return len(ispbs)
+
+    async def serve_prefetched(self, stream: Stream, messages: list[PixMessage]) -> list[PixMessage]:
+        """Marca no banco a iteração das mensagens tiradas do buffer."""
+        async with async_connection() as conn:
+            cursor = await conn.execute(SERVE_PREFETCHED_SQL, [
+                stream.iteration, [message.id for message in messages], stream.id,
+                PixMessage.STATUS_DELIVERED,
+            ])
+            stamped = {message_id for message_id, in await cursor.fetchall()}
+        return [message for message in messages if message.id in stamped]
+
+    async def fetch_messages_with_polling(
+        self, stream: Stream, limit: int = 1, wait: float | None = None, linger: float = 0,
+    ) -> list[PixMessage]:
+        """Long polling: até `wait` segundos (PIX_LONG_POLLING_TIMEOUT sem preferência).
+
+        Com `linger`, um lote parcial espera até esse tanto desde a primeira
+        mensagem para encher, sem passar do prazo total. Enquanto espera, a
+        iteração fica marcada no Redis para um retry dela aguardar o lote.
+        """
+        if wait is None:
+            wait = settings.PIX_LONG_POLLING_TIMEOUT
+        key = self._stream_polling_key(stream.id)
+        # A marca vence sozinha se o processo morrer no meio
+        await self.redis.set(key, stream.iteration, ex=math.ceil(wait) + POLL_MARK_MARGIN)
+        try:
+            return await self._poll_messages(stream, limit, wait, linger)
+        finally:
+            await self._end_poll(keys=[key], args=[stream.iteration])
+
+    async def _poll_messages(self, stream: Stream, limit: int, wait: float, linger: float) -> list[PixMessage]:
+        if settings.PIX_PREFETCH_SIZE:
+            await self.release_prefetched(buffers.evict(timezone.now()))
+            messages = buffers.take(stream, limit)
+            if messages:
+                messages = await self.serve_prefetched(stream, messages)
             if messages:
                 return messages
 
-            if time.time() - start >= timeout:
-                return []
+        # Os streams do ISPB esperam juntos: um claim por rodada para todos
+        poller = get_poller(stream.ispb)
+        messages = await poller.wait(
+            self.claim_batch, stream, limit, wait, buffers.prefetch_size(stream, limit), linger,
+        )
 
-            await asyncio.sleep(0.5)
+        served = [message for message in messages if message.iteration is not None]
+        buffers.put(stream, limit, served, [m for m in messages if m.iteration is None])
+        return served
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .encoders import render_payload
+from .models import PixMessage
+from .notifier import publish
+
+
+@receiver(pre_save, sender=PixMessage)
+def prerender_payload(sender, instance, **kwargs):
+    if not settings.PIX_PRERENDERED_PAYLOAD or instance.payload is not None:
+        return
+    # Data em string vira datetime antes, como o save faria
+    field = sender._meta.get_field('data_hora_pagamento')
+    instance.data_hora_pagamento = field.to_python(instance.data_hora_pagamento)
+    instance.payload = render_payload(instance)
+
+
+@receiver(post_save, sender=PixMessage)
+def notify_new_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish(instance.recebedor_ispb))
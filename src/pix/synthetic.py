@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+import json
+import random
+import string
+
+from django.utils import timezone
+from faker import Faker
+
+from .ingest import staging_payload
+
+ALPHANUMERIC = string.ascii_uppercase + string.digits
+# Pagamentos espalhados pela última hora antes de `start`
+SPREAD_SECONDS = 3600
+
+
+class MessageGenerator:
+    """Mensagens fake em lote a partir de pools gerados uma vez.
+
+    O Faker só roda na montagem dos pools (nomes, CPFs, contas), já
+    codificados em JSON; cada mensagem só sorteia índices. Com `seed` e
+    `start` fixos a sequência gerada é sempre a mesma.
+    """
+
+    def __init__(self, seed: int | None = None, pool_size: int = 1000, start: datetime | None = None):
+        self.random = random.Random(seed)
+        fake = Faker('pt_BR')
+        fake.seed_instance(self.random.getrandbits(32))
+
+        parties = [
+            {
+                'nome': fake.name(),
+                'cpfCnpj': fake.cpf(),
+                'agencia': fake.numerify('####'),
+                'contaTransacional': fake.numerify('#######'),
+                'tipoConta': fake.random_element(['CACC', 'SVGS']),
+            }
+            for _ in range(pool_size)
+        ]
+        self.pagadores = [json.dumps({**party, 'ispb': fake.numerify('########')}) for party in parties]
+        # O ISPB do recebedor é do lote: entra no fim do JSON já codificado
+        self.recebedores = [json.dumps(party)[:-1] + ', "ispb": "' for party in parties]
+
+        # Sem start, os pagamentos são relativos ao momento de cada lote
+        self.start = start
+        self.line = 0
+
+    def rows(self, ispbs: list[str]) -> list[list]:
+        """Uma linha da staging de carga (pix.ingest.STAGING_COLUMNS) por ISPB recebedor."""
+        count = len(ispbs)
+        rng = self.random
+        start = self.start or timezone.now()
+        pagadores = rng.choices(self.pagadores, k=count)
+        recebedores = rng.choices(self.recebedores, k=count)
+        seconds = rng.choices(range(SPREAD_SECONDS), k=count)
+        # (ISO do pagamento, AAAAMMDDHHMM do end_to_end_id) por segundo sorteado
+        stamps = {}
+
+        rows = []
+        for ispb, pagador, recebedor, second in zip(ispbs, pagadores, recebedores, seconds):
+            stamp = stamps.get(second)
+            if stamp is None:
+                moment = start - timedelta(seconds=second)
+                stamp = stamps[second] = (moment.isoformat(), moment.strftime('%Y%m%d%H%M'))
+
+            self.line += 1
+            cents = rng.randint(1, 999_999)
+            row = [
+                self.line,
+                # E + ISPB + AAAAMMDDHHMM + 11 alfanuméricos, como no SPI
+                f'E{ispb}{stamp[1]}{"".join(rng.choices(ALPHANUMERIC, k=11))}',
+                f'{cents // 100}.{cents % 100:02d}',
+                pagador,
+                f'{recebedor}{ispb}"}}',
+                '',
+                '',
+                stamp[0],
+            ]
+            row.append(staging_payload(row))
+            rows.append(row)
+        return rows
+
+    def ispbs(self, choices: list[str], weights: list[float], count: int) -> list[str]:
+        return self.random.choices(choices, weights, k=count)
+
+
+def zipf_ispbs(count: int, skew: float) -> tuple[list[str], list[float]]:
+    """`count` ISPBs sintéticos com peso 1/posição^skew (poucos concentram o volume)."""
+    ispbs = [f'{90_000_000 + rank:08d}' for rank in range(1, count + 1)]
+    return ispbs, [1 / rank ** skew for rank in range(1, count + 1)]
+
+
+def parse_ispbs(value: str) -> tuple[list[str], list[float]]:
+    """`12345678:5,99999999:1` -> ISPBs e pesos (peso 1 quando omitido)."""
+    ispbs, weights = [], []
+    for item in value.split(','):
+        ispb, _, weight = item.strip().partition(':')
+        if not ispb.isdigit() or len(ispb) != 8:
+            raise ValueError(f'ISPB inválido: {ispb!r}')
+        ispbs.append(ispb)
+        weights.append(float(weight) if weight else 1.0)
+    return ispbs, weights
+
+
+_generator: MessageGenerator | None = None
+
+
+def get_generator() -> MessageGenerator:
+    """Gerador do processo para o endpoint utilitário (pools montados uma vez)."""
+    global _generator
+    if _generator is None:
+        _generator = MessageGenerator()
+    return _generator
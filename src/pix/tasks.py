@@ -0,0 +1,56 @@
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+
+from .services import StreamService
+
+logger = logging.getLogger(__name__)
+
+# Tasks por event loop (um por worker do uvicorn)
+_tasks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def start_background_tasks() -> None:
+    """Sobe sweeper e flush do histórico no event loop atual, se habilitados. Idempotente."""
+    loop = asyncio.get_running_loop()
+    if loop in _tasks:
+        return
+
+    tasks = []
+    if settings.PIX_SWEEPER_IN_PROCESS and settings.PIX_VISIBILITY_TIMEOUT:
+        tasks.append(loop.create_task(_sweep_forever()))
+    if settings.PIX_STREAM_REGISTRY == 'redis':
+        tasks.append(loop.create_task(_flush_history_forever()))
+
+    if tasks:
+        _tasks[loop] = tasks
+
+
+async def _sweep_forever() -> None:
+    service = StreamService()
+    while True:
+        try:
+            swept = await service.sweep_expired_messages(
+                settings.PIX_VISIBILITY_TIMEOUT, settings.PIX_SWEEPER_CHUNK_SIZE,
+            )
+            if swept:
+                logger.info('%s mensagens devolvidas para a fila', swept)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Falha no sweeper de mensagens')
+        await asyncio.sleep(settings.PIX_SWEEPER_INTERVAL)
+
+
+async def _flush_history_forever() -> None:
+    service = StreamService()
+    while True:
+        try:
+            await service.flush_stream_history(settings.PIX_STREAM_HISTORY_BATCH_SIZE)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Falha na gravação do histórico de streams')
+        await asyncio.sleep(settings.PIX_STREAM_HISTORY_FLUSH_INTERVAL)
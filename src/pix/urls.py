@@ -1,10 +1,14 @@
 from django.urls import path
-from .views import generate_messages, stream_start, stream_continue
+from .views import generate_messages, ingest_messages, metrics, stream_ack, stream_start, stream_continue
 
 urlpatterns = [
     # Stream endpoints
     path('<str:ispb>/stream/start', stream_start, name='stream-start'),
     path('<str:ispb>/stream/<str:interation_id>', stream_continue, name='stream-continue'),
+    path('<str:ispb>/stream/<str:interation_id>/ack', stream_ack, name='stream-ack'),
+    # Ingestão
+    path('messages/ingest', ingest_messages, name='ingest-messages'),
     # Utilitários
     path('util/msgs/<str:ispb>/<int:quantity>/', generate_messages, name='generate-messages'),
+    path('util/metrics/', metrics, name='metrics'),
 ]
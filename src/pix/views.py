@@ -1,38 +1,99 @@
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from django.utils import timezone
 from django.conf import settings
-from faker import Faker
+from django.http import HttpResponse
 from adrf.decorators import api_view as async_api_view
-from asgiref.sync import sync_to_async
 
-from .models import PixMessage
+from . import compression, cursors, multipart
+from .db import pool_stats
+from .encoders import encode_messages
+from .ingest import copy_messages, insert_messages
+from .parsers import NDJSONParser
+from .prefetch import buffers
+from .renderers import MultipartJSONRenderer
 from .services import StreamService
-from .serializers import PixMessageSerializer
+from .synthetic import get_generator
+from .tasks import start_background_tasks
+from .serializers import AckSerializer, PixMessageIngestSerializer
 
-fake = Faker('pt_BR')
 
+# Formatos de entrega: uma mensagem, array JSON (?format=multipart) ou multipart de verdade
+SINGLE, ARRAY, MULTIPART = 'single', 'array', 'multipart'
 
-def get_message_limit(request) -> int:
-    accept = request.headers.get('Accept', '')
-    format_param = request.query_params.get('format', '')
-    
-    if 'multipart/json' in accept or format_param == 'multipart':
-        return settings.PIX_MAX_MESSAGES_PER_REQUEST
-    return 1
 
-def build_response(messages, ispb, stream_id, is_multipart):
-    serializer = PixMessageSerializer(messages, many=True)
-    
-    if messages:
-        data = serializer.data if is_multipart else serializer.data[0]
-        response = Response(data, status=status.HTTP_200_OK)
+def negotiate_delivery(request) -> tuple[int, str]:
+    """(mensagens por resposta, formato) a partir do Accept e do ?format."""
+    if request.query_params.get('format', '') == 'multipart':
+        return settings.PIX_MAX_MESSAGES_PER_REQUEST, ARRAY
+
+    limit = multipart.accepted_limit(request.headers.get('Accept', ''))
+    if limit is not None:
+        return limit, MULTIPART
+    return 1, SINGLE
+
+
+def get_wait_preferences(request) -> tuple[float | None, float, str]:
+    """`Prefer: wait=N, linger=M`: espera total (s) e linger (ms) do long polling.
+
+    Devolve (wait em s ou None, linger em s, valor do Preference-Applied).
+    wait fica limitado a PIX_LONG_POLLING_TIMEOUT e linger a PIX_MAX_LINGER_MS.
+    """
+    preferences = {}
+    for item in request.headers.get('Prefer', '').split(','):
+        name, _, value = item.split(';')[0].strip().partition('=')
+        try:
+            preferences.setdefault(name.lower(), max(0, int(value.strip().strip('"'))))
+        except ValueError:
+            continue
+
+    wait = linger = None
+    if 'wait' in preferences:
+        wait = min(preferences['wait'], settings.PIX_LONG_POLLING_TIMEOUT)
+    if 'linger' in preferences:
+        linger = min(preferences['linger'], settings.PIX_MAX_LINGER_MS)
+
+    applied = [f'{name}={value}' for name, value in (('wait', wait), ('linger', linger)) if value is not None]
+    return wait, (linger or 0) / 1000, ', '.join(applied)
+
+
+def parse_interation_id(interation_id: str) -> tuple[str, int | None]:
+    """Separa `{stream_id}.{iteração}`. IDs sem iteração são do formato antigo."""
+    stream_id, _, iteration = interation_id.partition(':')[0].partition('.')
+    if not iteration:
+        return stream_id, None
+    return stream_id, int(iteration) if iteration.isdigit() else -1
+
+
+def pull_next_id(stream) -> str:
+    if settings.PIX_SIGNED_CURSORS:
+        return cursors.dump(stream)
+    return f'{stream.id}.{stream.iteration + 1}'
+
+
+def build_response(messages, ispb, interation_id, delivery, applied='', encoding=None):
+    if messages and delivery == MULTIPART:
+        # Uma parte por mensagem, enviada conforme é codificada
+        response, size = multipart.streaming_response(messages)
+    elif messages:
+        # Mesmo formato do PixMessageSerializer, direto das linhas do claim
+        # (ou o payload gravado na ingestão), sem passar pelo renderer
+        response = HttpResponse(
+            encode_messages(messages, delivery == ARRAY),
+            content_type=MultipartJSONRenderer.media_type if delivery == ARRAY else 'application/json',
+        )
     else:
         response = Response(status=status.HTTP_204_NO_CONTENT)
     
-    response['Pull-Next'] = f'/api/pix/{ispb}/stream/{stream_id}'
+    response['Pull-Next'] = f'/api/pix/{ispb}/stream/{interation_id}'
+    if applied:
+        response['Preference-Applied'] = applied
+    if messages and delivery == MULTIPART:
+        compression.compress_response(response, encoding, size)
+    elif messages:
+        compression.compress_response(response, encoding)
     return response
 
 
@@ -52,6 +113,8 @@ def build_response(messages, ispb, stream_id, is_multipart):
 )
 @async_api_view(['GET'])
 async def stream_start(request, ispb: str):    
+    start_background_tasks()
+
     if not ispb.isdigit() or len(ispb) != 8:
         return Response(
             {'error': 'ISPB deve ter 8 dígitos'},
@@ -59,7 +122,7 @@ async def stream_start(request, ispb: str):
         )
     
     service = StreamService()
-    stream = await sync_to_async(service.create_stream)(ispb)
+    stream = await service.create_stream(ispb)
     
     if not stream:
         return Response(
@@ -67,11 +130,12 @@ async def stream_start(request, ispb: str):
             status=status.HTTP_429_TOO_MANY_REQUESTS,
         )
     
-    limit = get_message_limit(request)
-    is_multipart = limit > 1
-    messages = await service.fetch_messages_with_polling(stream, limit)
+    limit, delivery = negotiate_delivery(request)
+    wait, linger, applied = get_wait_preferences(request)
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding', ''))
+    messages = await service.fetch_messages_with_polling(stream, limit, wait, linger)
     
-    return build_response(messages, ispb, stream.id, is_multipart)
+    return build_response(messages, ispb, pull_next_id(stream), delivery, applied, encoding)
 
 
 @extend_schema(
@@ -84,13 +148,14 @@ async def stream_start(request, ispb: str):
         200: {'description': 'Mensagens disponíveis ou stream fechado'},
         204: {'description': 'Sem mensagens disponíveis'},
         400: {'description': 'ISPB inválido'},
-        404: {'description': 'Stream não encontrado'},
+        404: {'description': 'Stream ou iteração não encontrados'},
     },
     tags=['PIX Stream'],
 )
 @async_api_view(['GET', 'DELETE'])
 async def stream_continue(request, ispb: str, interation_id: str):
     """Continua leitura (GET) ou fecha stream (DELETE)."""
+    start_background_tasks()
     
     if not ispb.isdigit() or len(ispb) != 8:
         return Response(
@@ -98,8 +163,31 @@ async def stream_continue(request, ispb: str, interation_id: str):
             status=status.HTTP_400_BAD_REQUEST,
         )
     
+    limit, delivery = negotiate_delivery(request)
+    wait, linger, applied = get_wait_preferences(request)
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding', ''))
     service = StreamService()
-    stream = await sync_to_async(service.get_stream)(ispb, interation_id)
+
+    cursor = cursors.load(ispb, interation_id) if settings.PIX_SIGNED_CURSORS else None
+    if cursor:
+        stream_id, iteration = cursor.stream_id, cursor.iteration
+    else:
+        stream_id, iteration = parse_interation_id(interation_id)
+
+    if request.method == 'GET' and cursor and not cursor.expired:
+        # Cursor assinado: avança direto, sem consultar o Stream antes. O avanço
+        # continua no registro: lease, ack implícito e ordem das iterações
+        stream = await service.advance_stream(ispb, stream_id, iteration)
+        if stream:
+            messages = await service.fetch_messages_with_polling(stream, limit, wait, linger)
+            return build_response(messages, ispb, pull_next_id(stream), delivery, applied, encoding)
+        # Retry ou stream fechado: segue pelo caminho com consulta
+
+    if request.method == 'DELETE':
+        stream = await service.get_stream(ispb, stream_id)
+    else:
+        # Cada leitura renova o lease do stream
+        stream = await service.renew_stream(ispb, stream_id)
     
     if not stream:
         return Response(
@@ -108,24 +196,117 @@ async def stream_continue(request, ispb: str, interation_id: str):
         )
     
     if request.method == 'DELETE':
-        await sync_to_async(service.close_stream)(stream)
+        # DELETE no último Pull-Next confirma o que foi entregue antes de fechar
+        if iteration == stream.iteration + 1:
+            await service.start_iteration(stream, iteration)
+        await service.close_stream(stream)
         return Response({}, status=status.HTTP_200_OK)
     
     # GET - busca mensagens
-    limit = get_message_limit(request)
-    is_multipart = limit > 1
-    messages = await service.fetch_messages_with_polling(stream, limit)
+    if iteration is not None and iteration == stream.iteration:
+        # Retry de uma resposta perdida: devolve o mesmo lote, sem novo claim
+        messages = await service.replay_iteration(stream, iteration)
+    elif iteration is None or await service.start_iteration(stream, iteration):
+        messages = await service.fetch_messages_with_polling(stream, limit, wait, linger)
+    else:
+        return Response(
+            {'error': 'Iteração não encontrada'},
+            status=status.HTTP_404_NOT_FOUND,
+        )
     
-    return build_response(messages, ispb, stream.id, is_multipart)
+    return build_response(messages, ispb, pull_next_id(stream), delivery, applied, encoding)
 
 
 
 
+@extend_schema(
+    summary='Confirma o recebimento de mensagens do stream',
+    parameters=[
+        OpenApiParameter(name='ispb', type=str, location='path', description='ISPB (8 dígitos)'),
+        OpenApiParameter(name='interation_id', type=str, location='path', description='ID do stream'),
+    ],
+    request=AckSerializer,
+    responses={
+        200: {'description': 'Quantidade de mensagens confirmadas'},
+        400: {'description': 'ISPB ou corpo inválido'},
+        404: {'description': 'Stream não encontrado'},
+    },
+    tags=['PIX Stream'],
+)
+@async_api_view(['POST'])
+async def stream_ack(request, ispb: str, interation_id: str):
+    """Confirma em lote mensagens entregues pelo stream."""
+
+    if not ispb.isdigit() or len(ispb) != 8:
+        return Response(
+            {'error': 'ISPB deve ter 8 dígitos'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    serializer = AckSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    stream_id, _ = parse_interation_id(interation_id)
+    service = StreamService()
+    stream = await service.renew_stream(ispb, stream_id)
+
+    if not stream:
+        return Response(
+            {'error': 'Stream não encontrado'},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    confirmed = await service.confirm_messages(stream, serializer.validated_data['endToEndIds'])
+    return Response({'confirmed': confirmed}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary='Ingestão em lote de mensagens PIX',
+    request=PixMessageIngestSerializer(many=True),
+    responses={
+        201: {'description': 'Quantas mensagens entraram e quantas eram duplicadas'},
+        400: {'description': 'Corpo inválido'},
+    },
+    tags=['PIX Ingest'],
+)
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+def ingest_messages(request):
+    """Recebe um lote (array JSON ou NDJSON) e insere num INSERT só.
+
+    end_to_end_id já existente (ou repetido no lote) é ignorado e contado
+    como duplicado.
+    """
+
+    if not isinstance(request.data, list) or not request.data:
+        return Response(
+            {'error': 'Envie um array JSON ou NDJSON com ao menos uma mensagem'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if len(request.data) > settings.PIX_MAX_INGEST_BATCH:
+        return Response(
+            {'error': f'Lote acima de {settings.PIX_MAX_INGEST_BATCH} mensagens'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    serializer = PixMessageIngestSerializer(data=request.data, many=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    accepted = insert_messages(serializer.validated_data)
+    return Response(
+        {'accepted': accepted, 'duplicates': len(request.data) - accepted},
+        status=status.HTTP_201_CREATED,
+    )
+
+
 @extend_schema(
     summary='Gera mensagens PIX fake para testes',
     parameters=[
         OpenApiParameter(name='ispb', type=str, location='path', description='ISPB do recebedor (8 dígitos)'),
-        OpenApiParameter(name='quantity', type=int, location='path', description='Quantidade de mensagens (1-100)'),
+        OpenApiParameter(name='quantity', type=int, location='path', description='Quantidade de mensagens (até PIX_GENERATE_MAX_MESSAGES)'),
     ],
     responses={201: {'description': 'Mensagens criadas'}},
     tags=['Utilitários'],
@@ -140,38 +321,32 @@ def generate_messages(request, ispb: str, quantity: int):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    if quantity < 1 or quantity > 100:
+    if quantity < 1 or quantity > settings.PIX_GENERATE_MAX_MESSAGES:
         return Response(
-            {'error': 'Quantidade deve ser entre 1 e 100'},
+            {'error': f'Quantidade deve ser entre 1 e {settings.PIX_GENERATE_MAX_MESSAGES}'},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    messages = []
-    for _ in range(quantity):
-        msg = PixMessage.objects.create(
-            end_to_end_id=f'E{ispb}{timezone.now().strftime("%Y%m%d%H%M%S")}{fake.bothify("??########")}',
-            valor=fake.pydecimal(left_digits=4, right_digits=2, positive=True),
-            pagador={
-                'nome': fake.name(),
-                'cpfCnpj': fake.cpf(),
-                'ispb': fake.numerify('########'),
-                'agencia': fake.numerify('####'),
-                'contaTransacional': fake.numerify('#######'),
-                'tipoConta': fake.random_element(['CACC', 'SVGS']),
-            },
-            recebedor={
-                'nome': fake.name(),
-                'cpfCnpj': fake.cpf(),
-                'ispb': ispb,
-                'agencia': fake.numerify('####'),
-                'contaTransacional': fake.numerify('#######'),
-                'tipoConta': fake.random_element(['CACC', 'SVGS']),
-            },
-            data_hora_pagamento=timezone.now(),
-        )
-        messages.append(msg.end_to_end_id)
+    rows = get_generator().rows([ispb] * quantity)
+    _, created = copy_messages(rows)
+    messages = [row[1] for row in rows]
 
     return Response(
-        {'created': len(messages), 'ispb': ispb, 'messages': messages},
+        {'created': created, 'ispb': ispb, 'messages': messages},
         status=status.HTTP_201_CREATED,
     )
+
+
+@extend_schema(
+    summary='Métricas do processo (pool de conexões e prefetch)',
+    responses={200: {'description': 'Métricas'}},
+    tags=['Utilitários'],
+)
+@api_view(['GET'])
+def metrics(request):
+    """Métricas do processo que atendeu a requisição."""
+
+    return Response(
+        {'db_pool': pool_stats(), 'prefetch': buffers.stats()},
+        status=status.HTTP_200_OK,
+    )
@@ -0,0 +1,28 @@
+import pytest
+
+from pix import db, notifier, redis_client
+
+
+def discard_closed_loops():
+    """Solta pools, clientes e notifiers de event loops já fechados.
+
+    O APIClient síncrono passa por async_to_sync, que cria um loop por
+    requisição; sem isso cada teste deixa conexões do pool abertas.
+    """
+    for loop in [loop for loop in db._pools if loop.is_closed()]:
+        pool = db._pools.pop(loop)
+        # pool.close() precisa do loop: fecha os sockets direto
+        for conn in list(pool._pool):
+            conn.pgconn.finish()
+    for registry in (redis_client._clients, notifier._notifiers):
+        for loop in [loop for loop in registry if loop.is_closed()]:
+            del registry[loop]
+
+
+@pytest.fixture(autouse=True)
+def close_loop_resources(settings):
+    # Sem mínimo o pool não abre conexões em background depois do request:
+    # cancelado junto com o loop, esse connect é reagendado e trava o fim do loop
+    settings.PIX_DB_POOL_MIN_SIZE = 0
+    yield
+    discard_closed_loops()
@@ -0,0 +1,128 @@
+import zlib
+
+import pytest
+import zstandard
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from pix import compression
+from pix.compression import ChunkCompressor, compress, compress_response, compress_stream, negotiate
+
+BODY = b'{"nome": "Pagador", "cpfCnpj": "123.456.789-00"}' * 100
+
+
+@pytest.fixture(autouse=True)
+def compression_settings(settings):
+    settings.PIX_COMPRESSION_ENCODINGS = ['zstd', 'gzip']
+    settings.PIX_COMPRESSION_MIN_BYTES = 1024
+
+
+def decompress(body, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return zlib.decompress(body, 31)
+
+
+class TestNegotiate:
+
+    def test_server_preference_wins(self):
+        assert negotiate('gzip, deflate, br, zstd') == 'zstd'
+        assert negotiate('gzip;q=1.0, zstd;q=0.5') == 'zstd'
+
+    def test_refused_or_missing(self):
+        assert negotiate('') is None
+        assert negotiate('identity') is None
+        assert negotiate('zstd;q=0, gzip') == 'gzip'
+
+    def test_wildcard(self):
+        assert negotiate('*') == 'zstd'
+        assert negotiate('*, zstd;q=0') == 'gzip'
+
+    def test_disabled(self, settings):
+        settings.PIX_COMPRESSION_ENCODINGS = []
+
+        assert negotiate('gzip, zstd') is None
+
+
+class TestCompress:
+
+    @pytest.mark.parametrize('encoding', ['gzip', 'zstd'])
+    def test_round_trip(self, encoding):
+        assert decompress(compress(BODY, encoding), encoding) == BODY
+        # Contexto devolvido ao pool serve a próxima resposta
+        assert decompress(compress(BODY, encoding), encoding) == BODY
+
+    @pytest.mark.parametrize('encoding', ['gzip', 'zstd'])
+    def test_flushed_chunks_decode_on_arrival(self, encoding):
+        compressor = ChunkCompressor(encoding, flush_bytes=5)
+        decoder = zstandard.ZstdDecompressor().decompressobj() if encoding == 'zstd' else zlib.decompressobj(31)
+
+        assert decoder.decompress(compressor.compress(b'parte 1')) == b'parte 1'
+        assert decoder.decompress(compressor.compress(b'parte 2')) == b'parte 2'
+        assert decoder.decompress(compressor.finish()) == b''
+
+    def test_small_chunks_wait_for_flush(self):
+        compressor = ChunkCompressor('gzip', flush_bytes=1024)
+        decoder = zlib.decompressobj(31)
+
+        assert decoder.decompress(compressor.compress(b'parte 1')) == b''
+        assert decoder.decompress(compressor.finish()) == b'parte 1'
+
+
+class TestCompressResponse:
+
+    def test_small_body_untouched(self):
+        response = compress_response(HttpResponse(b'{}'), 'gzip')
+
+        assert response.content == b'{}'
+        assert 'Content-Encoding' not in response
+        assert response['Vary'] == 'Accept-Encoding'
+
+    def test_body_over_threshold(self):
+        response = compress_response(HttpResponse(BODY), 'gzip')
+
+        assert response['Content-Encoding'] == 'gzip'
+        assert response['Content-Length'] == str(len(response.content))
+        assert decompress(response.content, 'gzip') == BODY
+
+    def test_drf_response_compressed_after_render(self):
+        data = [{'nome': 'Pagador', 'cpfCnpj': '123.456.789-00'}] * 50
+        response = Response(data)
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = 'application/json'
+        response.renderer_context = {}
+
+        compress_response(response, 'zstd')
+        response.render()
+
+        assert response['Content-Encoding'] == 'zstd'
+        assert decompress(response.content, 'zstd') == JSONRenderer().render(data)
+
+    @pytest.mark.asyncio
+    async def test_streaming_uses_size_hint(self):
+        async def chunks():
+            yield BODY[:100]
+            yield BODY[100:]
+
+        small = compress_response(StreamingHttpResponse(chunks()), 'zstd', size=10)
+        large = compress_response(StreamingHttpResponse(chunks()), 'zstd', size=len(BODY))
+
+        assert 'Content-Encoding' not in small
+        assert large['Content-Encoding'] == 'zstd'
+        assert decompress(b''.join([chunk async for chunk in large]), 'zstd') == BODY
+
+    @pytest.mark.asyncio
+    async def test_abandoned_stream_releases_context(self):
+        async def chunks():
+            # Acima de FLUSH_BYTES: cada pedaço sai comprimido na hora
+            yield BODY * 4
+            yield BODY * 4
+
+        compression._zstd_pool.clear()
+        stream = compress_stream(chunks(), 'zstd')
+        await anext(stream)
+        # Cliente desconectou: o servidor fecha o iterador sem consumir o resto
+        await stream.aclose()
+
+        assert len(compression._zstd_pool) == 1
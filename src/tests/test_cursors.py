@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from pix import cursors
+from pix.models import Stream
+
+
+def make_stream(**kwargs):
+    return Stream(
+        id='abc123', ispb='12345678', iteration=3,
+        lease_expires_at=timezone.now() + timedelta(seconds=60), **kwargs,
+    )
+
+
+class TestCursors:
+
+    def test_roundtrip(self):
+        stream = make_stream()
+
+        cursor = cursors.load('12345678', cursors.dump(stream))
+
+        assert cursor.stream_id == 'abc123'
+        assert cursor.iteration == 4
+        assert cursor.expires_at == int(stream.lease_expires_at.timestamp())
+        assert not cursor.expired
+
+    def test_other_ispb_rejected(self):
+        token = cursors.dump(make_stream())
+
+        assert cursors.load('99999999', token) is None
+
+    def test_tampered_iteration_rejected(self):
+        token = cursors.dump(make_stream())
+        value, signature = token.split(':')
+        stream_id, _, expires_at = value.split('.')
+
+        assert cursors.load('12345678', f'{stream_id}.9.{expires_at}:{signature}') is None
+
+    def test_plain_id_is_not_a_cursor(self):
+        assert cursors.load('12345678', 'abc123.4') is None
+
+    def test_expired_cursor(self):
+        stream = make_stream()
+        stream.lease_expires_at = timezone.now() - timedelta(seconds=1)
+
+        assert cursors.load('12345678', cursors.dump(stream)).expired
@@ -0,0 +1,69 @@
+from collections import namedtuple
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+import pytest
+from django.core.management import call_command
+
+from pix import db
+from pix.models import PixMessage, Stream
+
+Column = namedtuple('Column', 'name')
+
+
+class FakeCursor:
+
+    def __init__(self, *columns):
+        self.description = [Column(name) for name in columns]
+
+
+class TestHydrate:
+
+    def test_hydrate_maps_columns_to_fields(self):
+        cursor = FakeCursor('id', 'ispb', 'status', 'created_at', 'closed_at')
+
+        stream = db.hydrate(Stream, cursor, ('abc', '12345678', 'active', None, None))
+
+        assert stream.id == 'abc'
+        assert stream.ispb == '12345678'
+        assert stream._state.adding is False
+
+    def test_hydrate_uses_column_names_not_order(self):
+        cursor = FakeCursor('valor', 'stream_id', 'id', 'end_to_end_id')
+
+        msg = db.hydrate(PixMessage, cursor, (Decimal('1.00'), 'abc', 'some-id', 'E1'))
+
+        assert msg.stream_id == 'abc'
+        assert msg.end_to_end_id == 'E1'
+        assert msg.valor == Decimal('1.00')
+        assert 'pagador' in msg.get_deferred_fields()
+
+
+class TestPoolStats:
+
+    def test_pool_stats_empty_without_pools(self):
+        with patch.object(db, '_pools', {}):
+            assert db.pool_stats() == {}
+
+    def test_pool_stats_sums_pools(self):
+        first, second = MagicMock(), MagicMock()
+        first.get_stats.return_value = {'requests_waiting': 1, 'requests_wait_ms': 10}
+        second.get_stats.return_value = {'requests_waiting': 2, 'requests_wait_ms': 5}
+
+        with patch.object(db, '_pools', {'a': first, 'b': second}):
+            assert db.pool_stats() == {'requests_waiting': 3, 'requests_wait_ms': 15}
+
+
+@pytest.mark.django_db(transaction=True)
+class TestCommandsClosePool:
+
+    @pytest.mark.parametrize('command, args', [
+        ('reap_streams', []),
+        ('prune_streams', []),
+        ('sweep_messages', ['--timeout', '60']),
+    ])
+    def test_pool_closed_before_loop_ends(self, command, args):
+        call_command(command, *args)
+
+        # Pool deixado num loop fechado segura conexões e pode travar a saída
+        assert not [loop for loop in db._pools if loop.is_closed()]
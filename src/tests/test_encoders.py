@@ -0,0 +1,67 @@
+from datetime import UTC, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from pix.encoders import dumps, encode_messages, message_data, render_payload
+from pix.models import PixMessage
+from pix.serializers import PixMessageSerializer
+
+
+def build_message(**overrides):
+    fields = {
+        'end_to_end_id': 'E12345678202610171200ABCDEFGHIJK',
+        'valor': Decimal('100.00'),
+        'pagador': {'nome': 'João Ünicode', 'cpfCnpj': '123.456.789-00', 'ispb': '00000000'},
+        'recebedor': {'nome': 'Recebedor', 'ispb': '12345678', 'agencia': '0001'},
+        'campo_livre': '',
+        'tx_id': '',
+        'data_hora_pagamento': datetime(2026, 10, 17, 15, 30, tzinfo=UTC),
+    }
+    fields.update(overrides)
+    return PixMessage(**fields)
+
+
+# Variações que exercitam cada conversão do serializer
+GOLDEN = [
+    build_message(),
+    build_message(valor=Decimal('7')),
+    build_message(valor=Decimal('12.345')),
+    build_message(valor=Decimal('0.5')),
+    build_message(campo_livre='linha\u2028separada\u2029 "aspas" \\ barra', tx_id='TX-é'),
+    build_message(data_hora_pagamento=datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=UTC)),
+    build_message(data_hora_pagamento=datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone(timedelta(hours=5)))),
+    build_message(data_hora_pagamento=datetime(2026, 6, 1, 12, 0)),
+    build_message(pagador={'nome': 'X', 'nested': {'lista': [1, 2.5, True, None]}, 'emoji': '💸'}),
+]
+
+
+class TestDeliveryEncoder:
+
+    @pytest.mark.parametrize('message', GOLDEN)
+    def test_message_data_matches_serializer(self, message):
+        assert message_data(message) == PixMessageSerializer(message).data
+
+    @pytest.mark.parametrize('message', GOLDEN)
+    def test_wire_bytes_match_drf(self, message):
+        expected = JSONRenderer().render(PixMessageSerializer(message).data)
+
+        assert dumps(message_data(message)) == expected
+
+    def test_dumps_falls_back_for_big_ints(self):
+        assert dumps({'n': 2 ** 70}) == JSONRenderer().render({'n': 2 ** 70})
+
+    def test_encode_messages_matches_drf(self):
+        expected = JSONRenderer().render(PixMessageSerializer(GOLDEN, many=True).data)
+
+        assert encode_messages(GOLDEN, many=True) == expected
+        assert encode_messages(GOLDEN[:1], many=False) == JSONRenderer().render(PixMessageSerializer(GOLDEN[0]).data)
+
+    def test_encode_messages_uses_stored_payload(self):
+        stored = build_message(payload=memoryview(b'{"gravado":true}'))
+
+        assert encode_messages([stored], many=False) == b'{"gravado":true}'
+        assert encode_messages([stored, GOLDEN[0]], many=True) == (
+            b'[{"gravado":true},' + render_payload(GOLDEN[0]) + b']'
+        )
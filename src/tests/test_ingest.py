@@ -0,0 +1,130 @@
+import csv
+from decimal import Decimal
+import io
+import json
+
+import orjson
+import pytest
+from django.core.management import call_command
+
+from pix.ingest import staging_row
+from pix.models import PixMessage
+
+
+def message(end_to_end_id, ispb='12345678'):
+    return {
+        'endToEndId': end_to_end_id,
+        'valor': '10.50',
+        'pagador': {'nome': 'Pagador', 'ispb': '00000000'},
+        'recebedor': {'nome': 'Recebedor', 'ispb': ispb},
+        'dataHoraPagamento': '2026-10-17T10:00:00Z',
+    }
+
+
+class TestStagingRow:
+
+    def test_row_in_staging_column_order(self):
+        row = staging_row(7, message('E1STAGE0001'))
+
+        assert row[:3] == [7, 'E1STAGE0001', Decimal('10.50')]
+        assert json.loads(row[4])['ispb'] == '12345678'
+        assert row[5:7] == ['', '']
+
+    def test_missing_field_rejected(self):
+        data = message('E1STAGE0002')
+        del data['valor']
+
+        with pytest.raises(ValueError):
+            staging_row(1, data)
+
+    def test_invalid_recebedor_ispb_rejected(self):
+        with pytest.raises(ValueError):
+            staging_row(1, message('E1STAGE0003', ispb='1234'))
+
+    @pytest.mark.parametrize('field, value', [
+        ('valor', 'dez'),
+        ('valor', 'NaN'),
+        ('valor', '10000000000000'),
+        ('dataHoraPagamento', 'ontem'),
+        ('dataHoraPagamento', '2026-13-45T10:00:00Z'),
+        ('endToEndId', 'E' * 51),
+        ('txId', 'T' * 36),
+        ('campoLivre', 'com\x00nul'),
+        ('pagador', {'nome': float('nan')}),
+    ])
+    def test_values_outside_staging_types_rejected(self, settings, field, value):
+        # Vale com ou sem payload pré-renderizado
+        settings.PIX_PRERENDERED_PAYLOAD = False
+        data = message('E1STAGE0006')
+        data[field] = value
+
+        with pytest.raises(ValueError):
+            staging_row(1, data)
+
+    def test_payload_only_when_enabled(self, settings):
+        settings.PIX_PRERENDERED_PAYLOAD = False
+        assert staging_row(1, message('E1STAGE0004'))[8] is None
+
+        settings.PIX_PRERENDERED_PAYLOAD = True
+        row = staging_row(1, message('E1STAGE0004'))
+
+        assert orjson.loads(row[8]) == {
+            'endToEndId': 'E1STAGE0004',
+            'valor': '10.50',
+            'pagador': {'nome': 'Pagador', 'ispb': '00000000'},
+            'recebedor': {'nome': 'Recebedor', 'ispb': '12345678'},
+            'campoLivre': '',
+            'txId': '',
+            'dataHoraPagamento': '2026-10-17T07:00:00-03:00',
+        }
+
+    def test_payload_rejects_invalid_date(self, settings):
+        settings.PIX_PRERENDERED_PAYLOAD = True
+        data = message('E1STAGE0005')
+        data['dataHoraPagamento'] = 'ontem'
+
+        with pytest.raises(ValueError):
+            staging_row(1, data)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestLoadMessages:
+
+    def test_load_ndjson_dedupes(self, tmp_path):
+        PixMessage.objects.create(
+            end_to_end_id='E1LOAD0001', valor='1.00', pagador={}, recebedor={'ispb': '12345678'},
+            data_hora_pagamento='2026-10-17T10:00:00Z',
+        )
+        path = tmp_path / 'messages.ndjson'
+        lines = [message('E1LOAD0001'), message('E1LOAD0002'), message('E1LOAD0002'), message('E1LOAD0003')]
+        bad = dict(message('E1LOAD0005'), valor='10000000000000')
+        path.write_text(
+            '\n'.join(json.dumps(line) for line in lines)
+            + '\n{"endToEndId": "E1LOAD0004"}\n' + json.dumps(bad) + '\n'
+        )
+        out, err = io.StringIO(), io.StringIO()
+
+        call_command('load_messages', str(path), '--batch-size', '2', stdout=out, stderr=err)
+
+        assert set(PixMessage.objects.values_list('end_to_end_id', flat=True)) == {
+            'E1LOAD0001', 'E1LOAD0002', 'E1LOAD0003',
+        }
+        # Valor fora de numeric(15, 2) não derruba o lote
+        assert '2 rejeitadas' in out.getvalue()
+        assert 'linha 5' in err.getvalue()
+        assert 'linha 6' in err.getvalue()
+
+    def test_load_csv(self, tmp_path):
+        path = tmp_path / 'messages.csv'
+        data = message('E1CSV0001', ispb='99999999')
+        with path.open('w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['endToEndId', 'valor', 'pagador', 'recebedor', 'dataHoraPagamento'])
+            writer.writerow([
+                data['endToEndId'], data['valor'], json.dumps(data['pagador']),
+                json.dumps(data['recebedor']), data['dataHoraPagamento'],
+            ])
+
+        call_command('load_messages', str(path), stdout=io.StringIO())
+
+        assert PixMessage.objects.get(end_to_end_id='E1CSV0001').recebedor_ispb == '99999999'
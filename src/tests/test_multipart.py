@@ -0,0 +1,91 @@
+from datetime import UTC, datetime
+from decimal import Decimal
+import json
+from unittest.mock import patch
+
+import pytest
+
+from pix.encoders import render_payload
+from pix.models import PixMessage
+from pix.multipart import accepted_limit, parts, streaming_response
+
+
+def build_messages(count):
+    return [
+        PixMessage(
+            end_to_end_id=f'E12345678202610171200PART{i:04d}',
+            valor=Decimal('10.00'),
+            pagador={'nome': 'Pagador', 'ispb': '00000000'},
+            recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+            campo_livre='',
+            tx_id='',
+            data_hora_pagamento=datetime(2026, 10, 17, 15, 30, tzinfo=UTC),
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def multipart_settings(settings):
+    settings.PIX_MAX_MESSAGES_PER_REQUEST = 10
+    settings.PIX_MULTIPART_MAX_MESSAGES = 500
+
+
+class TestAcceptedLimit:
+
+    def test_not_multipart(self):
+        assert accepted_limit('') is None
+        assert accepted_limit('application/json') is None
+
+    def test_default_without_param(self):
+        assert accepted_limit('multipart/json') == 10
+
+    def test_param_is_negotiated(self):
+        assert accepted_limit('application/json;q=0.5, Multipart/JSON; max-messages="200"') == 200
+
+    def test_capped_at_server_max(self):
+        assert accepted_limit('multipart/json; max-messages=100000') == 500
+        assert accepted_limit('multipart/json; max-messages=0') == 1
+
+    def test_invalid_param_falls_back(self):
+        assert accepted_limit('multipart/json; max-messages=muitas') == 10
+
+
+class TestParts:
+
+    @pytest.mark.asyncio
+    async def test_one_chunk_per_message(self):
+        messages = build_messages(3)
+        messages[1].payload = b'{"gravado":true}'
+
+        chunks = [chunk async for chunk in parts(messages, b'limite')]
+
+        assert len(chunks) == 4
+        assert chunks[0] == (
+            b'--limite\r\nContent-Type: application/json\r\n\r\n' + render_payload(messages[0]) + b'\r\n'
+        )
+        assert chunks[1].endswith(b'\r\n\r\n{"gravado":true}\r\n')
+        assert chunks[-1] == b'--limite--\r\n'
+
+    @pytest.mark.asyncio
+    async def test_response_boundary_splits_messages(self):
+        messages = build_messages(5)
+        response, size = streaming_response(messages)
+        boundary = response['Content-Type'].split('boundary=')[1].encode()
+        body = b''.join([chunk async for chunk in response])
+
+        sections = body.split(b'--' + boundary)
+        assert sections[-1] == b'--\r\n'
+        bodies = [section.split(b'\r\n\r\n', 1)[1][:-2] for section in sections[1:-1]]
+        assert [json.loads(part)['endToEndId'] for part in bodies] == [m.end_to_end_id for m in messages]
+        assert size == len(render_payload(messages[0])) * 5
+
+    @pytest.mark.asyncio
+    async def test_first_part_encoded_once(self):
+        messages = build_messages(2)
+
+        with patch('pix.multipart.render_payload', wraps=render_payload) as render:
+            response, _ = streaming_response(messages)
+            [chunk async for chunk in response]
+
+        assert render.call_count == 2
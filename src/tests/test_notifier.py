@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+
+from pix.notifier import Notifier, ListeningNotifier, PostgresNotifier, get_notifier
+
+
+class FakeListeningNotifier(ListeningNotifier):
+
+    async def listen(self):
+        self._connected = True
+        await asyncio.Event().wait()
+
+
+class TestNotifier:
+
+    @pytest.mark.asyncio
+    async def test_wake_sets_subscribed_event(self):
+        notifier = Notifier()
+        event = notifier.subscribe('12345678')
+
+        notifier.wake('12345678')
+
+        assert event.is_set()
+
+    @pytest.mark.asyncio
+    async def test_wake_other_ispb_does_not_set_event(self):
+        notifier = Notifier()
+        event = notifier.subscribe('12345678')
+
+        notifier.wake('99999999')
+
+        assert not event.is_set()
+
+    @pytest.mark.asyncio
+    async def test_subscribe_after_wake_returns_new_event(self):
+        notifier = Notifier()
+        first = notifier.subscribe('12345678')
+        notifier.wake('12345678')
+
+        second = notifier.subscribe('12345678')
+
+        assert second is not first
+        assert not second.is_set()
+
+    @pytest.mark.asyncio
+    async def test_wait_returns_true_when_woken(self):
+        notifier = Notifier()
+        event = notifier.subscribe('12345678')
+
+        asyncio.get_running_loop().call_later(0.1, notifier.wake, '12345678')
+
+        assert await notifier.wait(event, timeout=2) is True
+
+    @pytest.mark.asyncio
+    async def test_wait_returns_false_on_timeout(self):
+        notifier = Notifier()
+        event = notifier.subscribe('12345678')
+
+        assert await notifier.wait(event, timeout=0.1) is False
+
+    @pytest.mark.asyncio
+    async def test_listening_notifier_uses_slow_fallback_when_connected(self, settings):
+        settings.PIX_POLL_INTERVAL = 0.5
+        settings.PIX_NOTIFIER_FALLBACK_INTERVAL = 2
+        notifier = FakeListeningNotifier()
+
+        assert notifier.fallback_interval == 0.5
+
+        notifier.subscribe('12345678')
+        await asyncio.sleep(0)
+
+        assert notifier.fallback_interval == 2
+        notifier._task.cancel()
+
+
+class TestGetNotifier:
+
+    @pytest.mark.asyncio
+    async def test_same_instance_within_loop(self, settings):
+        settings.PIX_NOTIFIER_BACKEND = 'postgres'
+
+        assert get_notifier() is get_notifier()
+
+    @pytest.mark.asyncio
+    async def test_backend_from_settings(self, settings):
+        settings.PIX_NOTIFIER_BACKEND = 'postgres'
+
+        assert isinstance(get_notifier(), PostgresNotifier)
@@ -0,0 +1,131 @@
+from datetime import UTC, date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+
+from pix import partitions
+from pix.models import PixMessage
+
+INDEXES = [
+    ('pix_message_claim_idx', 'CREATE INDEX pix_message_claim_idx ON public.pix_message (recebedor_ispb, seq)'),
+]
+
+
+class TestPartitionNames:
+
+    def test_name_round_trip(self):
+        name = partitions.partition_name(date(2026, 10, 17))
+
+        assert name == 'pix_message_p20261017'
+        assert partitions.partition_day(name) == date(2026, 10, 17)
+
+    def test_non_daily_partitions_have_no_day(self):
+        assert partitions.partition_day(partitions.LEGACY) is None
+        assert partitions.partition_day(partitions.DEFAULT) is None
+
+    def test_legacy_index_name_fits_postgres_limit(self):
+        assert len(partitions.legacy_index('x' * 63)) <= 63
+
+
+class TestPartitionSql:
+
+    def test_partition_covers_one_utc_day(self):
+        sql = partitions.create_partition_sql(date(2026, 12, 31))
+
+        assert 'pix_message_p20261231 PARTITION OF pix_message' in sql
+        assert f"FROM ('{datetime(2026, 12, 31, tzinfo=UTC).isoformat()}')" in sql
+        assert f"TO ('{datetime(2027, 1, 1, tzinfo=UTC).isoformat()}')" in sql
+
+    def test_convert_keeps_current_table_as_legacy_partition(self):
+        statements = partitions.convert_sql(INDEXES, date(2026, 10, 18))
+        joined = '\n'.join(statements)
+
+        assert 'RENAME TO pix_message_legacy' in joined
+        assert 'ALTER INDEX pix_message_claim_idx RENAME TO pix_message_claim_idx_legacy' in joined
+        assert "FOR VALUES FROM (MINVALUE) TO ('2026-10-18T00:00:00+00:00')" in joined
+        assert 'PARTITION BY RANGE (created_at)' in joined
+
+    def test_convert_recreates_indexes_after_attaching_legacy(self):
+        statements = partitions.convert_sql(INDEXES, date(2026, 10, 18))
+        attach = next(i for i, sql in enumerate(statements) if 'ATTACH PARTITION' in sql)
+
+        assert statements.index(INDEXES[0][1]) > attach
+
+    def test_roll_forward_is_bounded(self):
+        assert 'LIMIT %s' in partitions.ROLL_FORWARD_SQL
+        assert 'FOR UPDATE SKIP LOCKED' in partitions.ROLL_FORWARD_SQL
+
+
+@pytest.mark.django_db
+class TestConvert:
+
+    def test_convert_attaches_current_table(self):
+        with connection.cursor() as cursor:
+            # DDL do Postgres é transacional: o rollback do teste desfaz a conversão
+            partitions.convert(cursor, timezone.now().date(), 1)
+
+            assert partitions.is_partitioned(cursor)
+            assert partitions.LEGACY in partitions.partitions(cursor)
+
+
+@pytest.mark.django_db
+class TestRollForward:
+
+    def test_moves_pending_in_batches(self):
+        now = timezone.now()
+        old = now - timedelta(days=10)
+        with connection.cursor() as cursor:
+            # DDL do Postgres é transacional: o rollback do teste desfaz a conversão
+            partitions.convert(cursor, now.date(), 1)
+            for i in range(5):
+                PixMessage.objects.create(
+                    end_to_end_id=f'E12345678202301011234ROL{i:02d}',
+                    valor=Decimal('10.00'),
+                    pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                    recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                    data_hora_pagamento=now,
+                    status=PixMessage.STATUS_CONFIRMED if i == 4 else PixMessage.STATUS_PENDING,
+                )
+            # auto_now_add ignora created_at no create
+            PixMessage.objects.update(created_at=old)
+
+            assert partitions.roll_forward(cursor, now - timedelta(days=1), now, batch_size=2) == 4
+
+            cursor.execute(f'SELECT count(*) FROM {partitions.E2E_TABLE} WHERE created_at = %s', [now])
+            assert cursor.fetchone()[0] == 4
+        assert PixMessage.objects.filter(created_at=now).count() == 4
+
+
+@pytest.mark.django_db
+class TestPruneE2e:
+
+    @pytest.fixture
+    def ledger(self):
+        with connection.cursor() as cursor:
+            partitions.convert(cursor, date(2026, 10, 1), 0)
+            for day in (date(2026, 10, 5), date(2026, 10, 10), date(2026, 10, 15)):
+                cursor.execute(
+                    f'INSERT INTO {partitions.E2E_TABLE} VALUES (%s, %s)',
+                    [f'E{day:%Y%m%d}', partitions.day_start(day)],
+                )
+            yield cursor
+
+    def remaining(self, cursor):
+        cursor.execute(f'SELECT end_to_end_id FROM {partitions.E2E_TABLE} ORDER BY 1')
+        return [row[0] for row in cursor.fetchall()]
+
+    def test_prunes_before_cutoff(self, ledger):
+        assert partitions.prune_e2e(ledger, date(2026, 10, 12)) == 2
+        assert self.remaining(ledger) == ['E20261015']
+
+    def test_keeps_ledger_of_busy_partitions(self, ledger):
+        busy = [partitions.partition_name(date(2026, 10, 10))]
+
+        assert partitions.prune_e2e(ledger, date(2026, 10, 12), busy) == 1
+        assert self.remaining(ledger) == ['E20261010', 'E20261015']
+
+    def test_busy_legacy_keeps_everything(self, ledger):
+        assert partitions.prune_e2e(ledger, date(2026, 10, 12), [partitions.LEGACY]) == 0
+        assert len(self.remaining(ledger)) == 3
@@ -0,0 +1,126 @@
+import asyncio
+import time
+import pytest
+
+from pix.poller import IspbPoller, get_poller
+
+
+class FakeStream:
+
+    def __init__(self, id):
+        self.id = id
+        self.iteration = 0
+
+
+class FakeClaim:
+    """Fila em memória repartida como o CLAIM_BATCH_SQL: em ordem, `limit` por waiter."""
+
+    def __init__(self, *messages):
+        self.messages = list(messages)
+        self.calls = []
+
+    async def __call__(self, ispb, demands):
+        self.calls.append([(stream.id, limit) for stream, limit, _ in demands])
+        batches = []
+        for _, limit, _ in demands:
+            batches.append(self.messages[:limit])
+            del self.messages[:limit]
+        return batches
+
+
+@pytest.fixture(autouse=True)
+def no_notifier(settings):
+    settings.PIX_NOTIFIER_BACKEND = 'none'
+    settings.PIX_POLL_INTERVAL = 0.05
+
+
+class TestIspbPoller:
+
+    @pytest.mark.asyncio
+    async def test_one_claim_for_waiting_streams(self):
+        claim = FakeClaim('m1', 'm2', 'm3')
+        poller = IspbPoller('12345678')
+
+        first, second = await asyncio.gather(
+            poller.wait(claim, FakeStream('a'), 2, timeout=1),
+            poller.wait(claim, FakeStream('b'), 2, timeout=1),
+        )
+
+        assert claim.calls == [[('a', 2), ('b', 2)]]
+        assert first == ['m1', 'm2']
+        assert second == ['m3']
+
+    @pytest.mark.asyncio
+    async def test_waiter_without_rows_keeps_waiting(self):
+        claim = FakeClaim('m1')
+        poller = IspbPoller('12345678')
+
+        first = asyncio.ensure_future(poller.wait(claim, FakeStream('a'), 1, timeout=1))
+        second = asyncio.ensure_future(poller.wait(claim, FakeStream('b'), 1, timeout=1))
+        await asyncio.sleep(0.01)
+        claim.messages.append('m2')
+
+        assert await first == ['m1']
+        assert await second == ['m2']
+        assert claim.calls[0] == [('a', 1), ('b', 1)]
+        assert all(call == [('b', 1)] for call in claim.calls[1:])
+
+    @pytest.mark.asyncio
+    async def test_returns_empty_after_timeout(self):
+        poller = IspbPoller('12345678')
+
+        assert await poller.wait(FakeClaim(), FakeStream('a'), 1, timeout=0.1) == []
+        assert not poller._waiters
+
+    @pytest.mark.asyncio
+    async def test_claim_error_reaches_waiters(self):
+        async def failing_claim(ispb, demands):
+            raise RuntimeError('db down')
+
+        poller = IspbPoller('12345678')
+
+        with pytest.raises(RuntimeError):
+            await poller.wait(failing_claim, FakeStream('a'), 1, timeout=1)
+
+    @pytest.mark.asyncio
+    async def test_linger_fills_partial_batch(self):
+        claim = FakeClaim('m1')
+        poller = IspbPoller('12345678')
+
+        waiting = asyncio.ensure_future(poller.wait(claim, FakeStream('a'), 3, timeout=2, linger=1))
+        await asyncio.sleep(0.01)
+        claim.messages += ['m2', 'm3']
+
+        assert await waiting == ['m1', 'm2', 'm3']
+        assert claim.calls[0] == [('a', 3)]
+        assert claim.calls[-1] == [('a', 2)]
+
+    @pytest.mark.asyncio
+    async def test_linger_returns_partial_batch_when_over(self):
+        poller = IspbPoller('12345678')
+        started = time.monotonic()
+
+        assert await poller.wait(FakeClaim('m1'), FakeStream('a'), 3, timeout=2, linger=0.1) == ['m1']
+        assert 0.1 <= time.monotonic() - started < 1
+
+    @pytest.mark.asyncio
+    async def test_linger_does_not_pass_deadline(self):
+        poller = IspbPoller('12345678')
+        started = time.monotonic()
+
+        assert await poller.wait(FakeClaim('m1'), FakeStream('a'), 3, timeout=0.1, linger=5) == ['m1']
+        assert time.monotonic() - started < 1
+
+    @pytest.mark.asyncio
+    async def test_one_poller_per_ispb(self):
+        assert get_poller('12345678') is get_poller('12345678')
+        assert get_poller('12345678') is not get_poller('99999999')
+
+    @pytest.mark.asyncio
+    async def test_idle_poller_leaves_cache(self):
+        poller = get_poller('12345678')
+
+        assert await poller.wait(FakeClaim('m1'), FakeStream('a'), 1, timeout=1) == ['m1']
+        await asyncio.sleep(0)
+
+        assert get_poller('12345678') is not poller
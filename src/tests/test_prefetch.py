@@ -0,0 +1,117 @@
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from django.utils import timezone
+
+from pix import lifespan
+from pix.prefetch import PrefetchBuffers
+
+
+def make_stream(id='s1', iteration=0, ttl=60):
+    return SimpleNamespace(
+        id=id, ispb='12345678', iteration=iteration,
+        lease_expires_at=timezone.now() + timedelta(seconds=ttl),
+    )
+
+
+def make_messages(*ids):
+    return [SimpleNamespace(id=id, iteration=None) for id in ids]
+
+
+@pytest.fixture(autouse=True)
+def prefetch_settings(settings):
+    settings.PIX_PREFETCH_SIZE = 100
+    settings.PIX_PREFETCH_MAX_MESSAGES = 1000
+    settings.PIX_PREFETCH_MAX_AGE = 10
+    settings.PIX_VISIBILITY_TIMEOUT = None
+
+
+class TestPrefetchBuffers:
+
+    def test_prefetch_only_after_full_claim(self):
+        buffers = PrefetchBuffers()
+        stream = make_stream()
+
+        assert buffers.prefetch_size(stream, 10) == 0
+
+        buffers.put(stream, 10, make_messages(*range(10)), [])
+        assert buffers.prefetch_size(stream, 10) == 90
+
+        buffers.put(stream, 10, make_messages(1), [])
+        assert buffers.prefetch_size(stream, 10) == 0
+
+    def test_prefetch_respects_memory_cap(self, settings):
+        settings.PIX_PREFETCH_MAX_MESSAGES = 5
+        buffers = PrefetchBuffers()
+        stream = make_stream()
+
+        buffers.put(stream, 1, make_messages('a'), make_messages('b', 'c', 'd'))
+
+        assert buffers.prefetch_size(stream, 1) == 2
+
+    def test_take_serves_from_memory(self):
+        buffers = PrefetchBuffers()
+        stream = make_stream()
+        buffers.put(stream, 1, make_messages('a'), make_messages('b', 'c', 'd'))
+
+        stream.iteration = 1
+        served = buffers.take(stream, 2)
+
+        assert [m.id for m in served] == ['b', 'c']
+        assert all(m.iteration == 1 for m in served)
+        assert buffers.stats()['hits'] == 1
+        assert buffers.stats()['buffered'] == 1
+
+    def test_take_empty_counts_miss(self):
+        buffers = PrefetchBuffers()
+
+        assert buffers.take(make_stream(), 1) == []
+        assert buffers.stats()['misses'] == 1
+
+    def test_evict_expired_lease(self):
+        buffers = PrefetchBuffers()
+        stream = make_stream(ttl=-1)
+        buffers.put(stream, 1, make_messages('a'), make_messages('b'))
+
+        evicted = buffers.evict(timezone.now())
+
+        assert [m.id for m in evicted['s1']] == ['b']
+        assert buffers.stats()['streams'] == 0
+        assert buffers.stats()['buffered'] == 0
+
+    def test_evict_old_messages_keeps_stream(self, settings):
+        settings.PIX_PREFETCH_MAX_AGE = 0
+        buffers = PrefetchBuffers()
+        buffers.put(make_stream(), 1, make_messages('a'), make_messages('b'))
+
+        evicted = buffers.evict(timezone.now())
+
+        assert list(evicted) == ['s1']
+        assert buffers.stats()['streams'] == 1
+        assert buffers.stats()['buffered'] == 0
+
+    def test_drain_returns_unserved(self):
+        buffers = PrefetchBuffers()
+        buffers.put(make_stream('s1'), 1, make_messages('a'), make_messages('b'))
+        buffers.put(make_stream('s2'), 1, make_messages('c'), [])
+
+        assert {k: [m.id for m in v] for k, v in buffers.drain().items()} == {'s1': ['b']}
+
+
+class TestLifespan:
+
+    @pytest.mark.asyncio
+    async def test_shutdown_releases_prefetch(self):
+        messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        receive = AsyncMock(side_effect=lambda: next(messages))
+        send = AsyncMock()
+
+        with patch.object(lifespan, 'StreamService') as service:
+            service.return_value.release_prefetched = AsyncMock(return_value=0)
+            await lifespan.lifespan({'type': 'lifespan'}, receive, send)
+
+        service.return_value.release_prefetched.assert_awaited_once()
+        assert [call.args[0]['type'] for call in send.await_args_list] == [
+            'lifespan.startup.complete', 'lifespan.shutdown.complete',
+        ]
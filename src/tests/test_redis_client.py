@@ -0,0 +1,44 @@
+import pytest
+import redis.asyncio
+from unittest.mock import AsyncMock
+
+from pix.redis_client import get_redis
+from pix.services import StreamService
+
+
+class TestGetRedis:
+
+    @pytest.mark.asyncio
+    async def test_same_client_within_loop(self):
+        assert get_redis() is get_redis()
+
+    @pytest.mark.asyncio
+    async def test_pool_blocks_at_max_connections(self, settings):
+        settings.PIX_REDIS_MAX_CONNECTIONS = 7
+        settings.PIX_REDIS_POOL_TIMEOUT = 2.5
+
+        pool = get_redis().connection_pool
+
+        assert isinstance(pool, redis.asyncio.BlockingConnectionPool)
+        assert pool.max_connections == 7
+        assert pool.timeout == 2.5
+
+    @pytest.mark.asyncio
+    async def test_service_uses_shared_client(self):
+        assert StreamService().redis is get_redis()
+
+    @pytest.mark.asyncio
+    async def test_service_accepts_injected_client(self):
+        client = AsyncMock()
+
+        assert StreamService(redis_client=client).redis is client
+
+    @pytest.mark.asyncio
+    async def test_active_count_is_awaited(self):
+        client = AsyncMock()
+        client.get.return_value = b'3'
+
+        count = await StreamService(redis_client=client).get_active_count('12345678')
+
+        assert count == 3
+        client.get.assert_awaited_once_with('stream:count:12345678')
@@ -0,0 +1,118 @@
+import pytest
+import redis
+import redis.asyncio
+from datetime import timedelta
+from django.conf import settings as django_settings
+
+from pix.models import Stream
+from pix.registry import RedisStreamRegistry
+
+LEASE_TTL = timedelta(seconds=60)
+
+
+@pytest.fixture
+def registry():
+    client = redis.from_url(django_settings.REDIS_URL)
+    keys = [RedisStreamRegistry.LEASES_KEY, RedisStreamRegistry.HISTORY_KEY]
+    client.delete(*keys)
+    yield RedisStreamRegistry(redis.asyncio.from_url(django_settings.REDIS_URL))
+    for key in client.scan_iter(match='stream:state:*'):
+        client.delete(key)
+    client.delete(*keys)
+    client.close()
+
+
+class TestRedisStreamRegistry:
+
+    @pytest.mark.asyncio
+    async def test_create_and_get(self, registry):
+        stream = await registry.create('12345678', LEASE_TTL)
+
+        found = await registry.get('12345678', stream.id)
+
+        assert found.id == stream.id
+        assert found.status == Stream.STATUS_ACTIVE
+        assert found.iteration == 0
+
+    @pytest.mark.asyncio
+    async def test_get_other_ispb_returns_none(self, registry):
+        stream = await registry.create('12345678', LEASE_TTL)
+
+        assert await registry.get('99999999', stream.id) is None
+
+    @pytest.mark.asyncio
+    async def test_renew_extends_lease(self, registry):
+        stream = await registry.create('12345678', timedelta(seconds=5))
+
+        renewed = await registry.renew('12345678', stream.id, LEASE_TTL)
+
+        assert renewed.lease_expires_at > stream.lease_expires_at
+
+    @pytest.mark.asyncio
+    async def test_renew_expired_returns_none(self, registry):
+        stream = await registry.create('12345678', timedelta(seconds=-1))
+
+        assert await registry.renew('12345678', stream.id, LEASE_TTL) is None
+
+    @pytest.mark.asyncio
+    async def test_renew_advances_only_next_iteration(self, registry):
+        stream = await registry.create('12345678', LEASE_TTL)
+
+        assert await registry.renew('12345678', stream.id, LEASE_TTL, iteration=2) is None
+
+        advanced = await registry.renew('12345678', stream.id, LEASE_TTL, iteration=1)
+        assert advanced.iteration == 1
+
+    @pytest.mark.asyncio
+    async def test_close_only_once(self, registry):
+        stream = await registry.create('12345678', LEASE_TTL)
+
+        assert await registry.close(stream, stream.created_at) is True
+        assert await registry.close(stream, stream.created_at) is False
+        assert await registry.get('12345678', stream.id) is None
+        # Criação e um único fechamento na fila de histórico
+        assert await registry.redis.llen(registry.HISTORY_KEY) == 2
+
+    @pytest.mark.asyncio
+    async def test_expired_and_active_counts(self, registry):
+        expired = await registry.create('12345678', timedelta(seconds=-1))
+        await registry.create('12345678', LEASE_TTL)
+
+        assert [stream.id for stream in await registry.expired(10)] == [expired.id]
+        assert await registry.active_counts() == {'12345678': 2}
+
+    @pytest.mark.asyncio
+    async def test_expired_drops_lease_without_state(self, registry):
+        await registry.redis.zadd(registry.LEASES_KEY, {'sumiu': 0})
+
+        assert await registry.expired(10) == []
+        assert await registry.redis.zscore(registry.LEASES_KEY, 'sumiu') is None
+        assert await registry.active_counts() == {}
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRedisStreamRegistryHistory:
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_history(self, registry):
+        stream = await registry.create('12345678', LEASE_TTL)
+        await registry.close(stream, stream.created_at)
+
+        assert await registry.flush_history() == 2
+
+        row = await Stream.objects.aget(id=stream.id)
+        assert row.status == Stream.STATUS_CLOSED
+        assert row.closed_at is not None
+
+    @pytest.mark.asyncio
+    async def test_flush_never_reopens_closed_stream(self, registry):
+        stream = await registry.create('12345678', LEASE_TTL)
+        await registry.close(stream, stream.created_at)
+        await registry.flush_history()
+        # Evento de criação reenviado depois do fechamento
+        await registry.redis.rpush(registry.HISTORY_KEY, registry._history(stream))
+
+        await registry.flush_history()
+
+        row = await Stream.objects.aget(id=stream.id)
+        assert row.status == Stream.STATUS_CLOSED
@@ -1,22 +1,32 @@
 import asyncio
+import psycopg
 import pytest
-from unittest.mock import MagicMock, patch
+import redis
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
 from decimal import Decimal
+from django.conf import settings as django_settings
+from django.db import connection, transaction
 from django.utils import timezone
 from asgiref.sync import sync_to_async
 
 from pix.models import Stream, PixMessage
-from pix.services import StreamService
+from pix.prefetch import buffers
+from pix.services import (
+    CLAIM_ATTEMPTS, CLAIM_BATCH_STRIPED_SQL, CLAIM_SQL, CLAIM_STRIPED_SQL, RECONCILE_DRIFT_TTL,
+    StreamService, claim_horizon, execute_claim, stream_bucket,
+)
 
 
 @pytest.fixture
 def mock_redis():
-    with patch('pix.services.redis') as mock:
-        client = MagicMock()
+    with patch('pix.services.get_redis') as mock:
+        client = AsyncMock()
         client.get.return_value = None
-        client.incr.return_value = 1
         client.decr.return_value = 0
-        mock.from_url.return_value = client
+        # Script de admissão: devolve o slot ocupado (0 = limite atingido)
+        client.register_script = MagicMock(return_value=AsyncMock(return_value=1))
+        mock.return_value = client
         yield client
 
 
@@ -41,104 +51,278 @@ def pending_message(stream):
     )
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 class TestStreamServiceCreate:
 
-    def test_create_stream_success(self, service, mock_redis):
-        stream = service.create_stream('12345678')
+    @pytest.mark.asyncio
+    async def test_create_stream_success(self, service, mock_redis):
+        stream = await service.create_stream('12345678')
 
         assert stream is not None
         assert stream.ispb == '12345678'
         assert stream.status == Stream.STATUS_ACTIVE
-        mock_redis.incr.assert_called_once()
+        mock_redis.register_script.return_value.assert_awaited_once_with(
+            keys=['stream:count:12345678'], args=[6],
+        )
 
-    def test_create_stream_limit_reached(self, service, mock_redis):
-        mock_redis.get.return_value = b'6'
+    @pytest.mark.asyncio
+    async def test_create_stream_limit_reached(self, service, mock_redis):
+        mock_redis.register_script.return_value.return_value = 0
 
-        stream = service.create_stream('12345678')
+        stream = await service.create_stream('12345678')
 
         assert stream is None
-        mock_redis.incr.assert_not_called()
+        assert await Stream.objects.acount() == 0
 
+    @pytest.mark.asyncio
+    async def test_create_stream_releases_slot_when_insert_fails(self, service, mock_redis):
+        with patch('pix.registry.async_connection', side_effect=RuntimeError('db down')):
+            with pytest.raises(RuntimeError):
+                await service.create_stream('12345678')
 
-@pytest.mark.django_db
+        mock_redis.decr.assert_awaited_once_with('stream:count:12345678')
+
+
+@pytest.mark.django_db(transaction=True)
 class TestStreamServiceGet:
 
-    def test_get_stream_success(self, service, stream):
-        found = service.get_stream(stream.ispb, stream.id)
+    @pytest.mark.asyncio
+    async def test_get_stream_success(self, service, stream):
+        found = await service.get_stream(stream.ispb, stream.id)
 
         assert found == stream
 
-    def test_get_stream_not_found(self, service):
-        found = service.get_stream('12345678', 'invalid_id')
+    @pytest.mark.asyncio
+    async def test_get_stream_not_found(self, service):
+        found = await service.get_stream('12345678', 'invalid_id')
 
         assert found is None
 
-    def test_get_stream_closed_returns_none(self, service, stream):
+    @pytest.mark.asyncio
+    async def test_get_stream_closed_returns_none(self, service, stream):
         stream.status = Stream.STATUS_CLOSED
-        stream.save()
+        await stream.asave()
 
-        found = service.get_stream(stream.ispb, stream.id)
+        found = await service.get_stream(stream.ispb, stream.id)
 
         assert found is None
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 class TestStreamServiceClose:
 
-    def test_close_stream_updates_status(self, service, stream, mock_redis):
-        service.close_stream(stream)
+    @pytest.mark.asyncio
+    async def test_close_stream_updates_status(self, service, stream, mock_redis):
+        await service.close_stream(stream)
 
 
-        stream.refresh_from_db()
+        await stream.arefresh_from_db()
         assert stream.status == Stream.STATUS_CLOSED
         assert stream.closed_at is not None
         mock_redis.decr.assert_called_once()
 
-    def test_close_stream_releases_messages(self, service, stream, pending_message, mock_redis):
+    @pytest.mark.asyncio
+    async def test_close_stream_releases_messages(self, service, stream, pending_message, mock_redis):
         pending_message.stream = stream
         pending_message.status = PixMessage.STATUS_DELIVERED
-        pending_message.save()
+        await pending_message.asave()
 
-        service.close_stream(stream)
+        await service.close_stream(stream)
 
-        pending_message.refresh_from_db()
+        await pending_message.arefresh_from_db()
         assert pending_message.status == PixMessage.STATUS_PENDING
         assert pending_message.stream is None
 
-    def test_close_stream_already_closed(self, service, stream, mock_redis):
+    @pytest.mark.asyncio
+    async def test_close_stream_already_closed(self, service, stream, mock_redis):
         stream.status = Stream.STATUS_CLOSED
-        stream.save()
+        await stream.asave()
 
-        service.close_stream(stream)
+        await service.close_stream(stream)
 
         mock_redis.decr.assert_not_called()
 
 
-@pytest.mark.django_db
+async def scan_keys(*keys):
+    for key in keys:
+        yield key
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamServiceLease:
+
+    @pytest.mark.asyncio
+    async def test_create_stream_sets_lease(self, service):
+        stream = await service.create_stream('12345678')
+
+        assert stream.lease_expires_at > timezone.now()
+
+    @pytest.mark.asyncio
+    async def test_renew_stream_extends_lease(self, service, stream):
+        stream.lease_expires_at = timezone.now() + timedelta(seconds=5)
+        await stream.asave()
+
+        renewed = await service.renew_stream(stream.ispb, stream.id)
+
+        assert renewed is not None
+        assert renewed.lease_expires_at > stream.lease_expires_at
+
+    @pytest.mark.asyncio
+    async def test_renew_stream_expired_returns_none(self, service, stream):
+        stream.lease_expires_at = timezone.now() - timedelta(seconds=1)
+        await stream.asave()
+
+        assert await service.renew_stream(stream.ispb, stream.id) is None
+
+    @pytest.mark.asyncio
+    async def test_reap_closes_expired_stream(self, service, stream, pending_message, mock_redis):
+        stream.lease_expires_at = timezone.now() - timedelta(seconds=1)
+        await stream.asave()
+        pending_message.stream = stream
+        pending_message.status = PixMessage.STATUS_DELIVERED
+        await pending_message.asave()
+
+        reaped = await service.reap_expired_streams()
+
+        assert reaped == 1
+        await stream.arefresh_from_db()
+        await pending_message.arefresh_from_db()
+        assert stream.status == Stream.STATUS_CLOSED
+        assert pending_message.status == PixMessage.STATUS_PENDING
+        assert pending_message.stream_id is None
+        mock_redis.decr.assert_awaited_once_with('stream:count:12345678')
+
+    @pytest.mark.asyncio
+    async def test_reap_keeps_live_stream(self, service, stream):
+        reaped = await service.reap_expired_streams()
+
+        assert reaped == 0
+        await stream.arefresh_from_db()
+        assert stream.status == Stream.STATUS_ACTIVE
+
+    @pytest.mark.asyncio
+    async def test_reconcile_counts_fixes_drift(self, service, stream, mock_redis):
+        mock_redis.scan_iter = MagicMock(return_value=scan_keys(
+            b'stream:count:12345678', b'stream:count:99999999',
+        ))
+        mock_redis.mget.return_value = [b'6', b'2']
+        service._reconcile = AsyncMock(return_value=1)
+
+        fixed = await service.reconcile_counts()
+
+        assert fixed == 2
+        service._reconcile.assert_any_await(
+            keys=['stream:count:12345678', 'stream:drift:12345678'], args=['6', 1, RECONCILE_DRIFT_TTL],
+        )
+        service._reconcile.assert_any_await(
+            keys=['stream:count:99999999', 'stream:drift:99999999'], args=['2', 0, RECONCILE_DRIFT_TTL],
+        )
+
+    @pytest.mark.asyncio
+    async def test_reconcile_counts_skips_correct_counters(self, service, stream, mock_redis):
+        mock_redis.scan_iter = MagicMock(return_value=scan_keys(b'stream:count:12345678'))
+        mock_redis.mget.return_value = [b'1']
+        service._reconcile = AsyncMock(return_value=1)
+
+        assert await service.reconcile_counts() == 0
+        service._reconcile.assert_not_awaited()
+
+
+class TestReconcileScript:
+
+    KEYS = ['stream:count:44444444', 'stream:drift:44444444']
+
+    @pytest.fixture(autouse=True)
+    def clean_keys(self):
+        client = redis.from_url(django_settings.REDIS_URL)
+        client.delete(*self.KEYS)
+        yield
+        client.delete(*self.KEYS)
+        client.close()
+
+    def reconcile(self, current, expected):
+        return StreamService()._reconcile(keys=self.KEYS, args=[current, expected, RECONCILE_DRIFT_TTL])
+
+    @pytest.mark.asyncio
+    async def test_raises_at_once(self):
+        assert await self.reconcile('', 2) == 1
+        assert await self.reconcile('2', 3) == 1
+
+    @pytest.mark.asyncio
+    async def test_lowers_only_when_surplus_repeats(self):
+        await self.reconcile('', 4)
+
+        # Pode ser um stream/start ou DELETE em andamento: só anota
+        assert await self.reconcile('4', 1) == 0
+        assert await self.reconcile('4', 1) == 1
+        assert await self.reconcile('1', 0) == 0
+
+    @pytest.mark.asyncio
+    async def test_moved_counter_is_left_alone(self):
+        await self.reconcile('', 4)
+
+        assert await self.reconcile('3', 1) == 0
+        assert await self.reconcile('3', 1) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamServiceRetention:
+
+    @pytest.mark.asyncio
+    async def test_prune_removes_old_closed_streams(self, service, stream, pending_message):
+        stream.status = Stream.STATUS_CLOSED
+        stream.closed_at = timezone.now() - timedelta(days=10)
+        await stream.asave()
+        pending_message.stream = stream
+        pending_message.status = PixMessage.STATUS_CONFIRMED
+        await pending_message.asave()
+
+        pruned = await service.prune_closed_streams(days=7)
+
+        assert pruned == 1
+        assert not await Stream.objects.filter(id=stream.id).aexists()
+        await pending_message.arefresh_from_db()
+        assert pending_message.stream_id is None
+        assert pending_message.status == PixMessage.STATUS_CONFIRMED
+
+    @pytest.mark.asyncio
+    async def test_prune_keeps_recent_and_active_streams(self, service, stream):
+        recent = await Stream.objects.acreate(
+            ispb='12345678', status=Stream.STATUS_CLOSED, closed_at=timezone.now(),
+        )
+
+        assert await service.prune_closed_streams(days=7) == 0
+        assert await Stream.objects.filter(id__in=[stream.id, recent.id]).acount() == 2
+
+
+@pytest.mark.django_db(transaction=True)
 class TestStreamServiceFetchMessages:
 
-    def test_fetch_messages_returns_pending(self, service, stream, pending_message):
-        messages = service.fetch_messages(stream, limit=1)
+    @pytest.mark.asyncio
+    async def test_fetch_messages_returns_pending(self, service, stream, pending_message):
+        messages = await service.fetch_messages(stream, limit=1)
 
         assert len(messages) == 1
         assert messages[0].id == pending_message.id
 
-    def test_fetch_messages_marks_as_delivered(self, service, stream, pending_message):
-        service.fetch_messages(stream, limit=1)
+    @pytest.mark.asyncio
+    async def test_fetch_messages_marks_as_delivered(self, service, stream, pending_message):
+        await service.fetch_messages(stream, limit=1)
 
-        pending_message.refresh_from_db()
+        await pending_message.arefresh_from_db()
         assert pending_message.status == PixMessage.STATUS_DELIVERED
-        assert pending_message.stream == stream
+        assert pending_message.stream_id == stream.id
 
-    def test_fetch_messages_empty_when_none(self, service, stream):
-        messages = service.fetch_messages(stream, limit=1)
+    @pytest.mark.asyncio
+    async def test_fetch_messages_empty_when_none(self, service, stream):
+        messages = await service.fetch_messages(stream, limit=1)
 
         assert messages == []
 
-    def test_fetch_messages_respects_limit(self, service, stream):
+    @pytest.mark.asyncio
+    async def test_fetch_messages_respects_limit(self, service, stream):
         for i in range(5):
-            PixMessage.objects.create(
+            await PixMessage.objects.acreate(
                 end_to_end_id=f'E12345678202301011234LIM{i}',
                 valor=Decimal('10.00'),
                 pagador={'nome': 'Pagador', 'ispb': '00000000'},
@@ -146,13 +330,26 @@ class TestStreamServiceFetchMessages:
                 data_hora_pagamento=timezone.now(),
             )
 
-        messages = service.fetch_messages(stream, limit=3)
+        messages = await service.fetch_messages(stream, limit=3)
 
         assert len(messages) == 3
 
-    def test_fetch_messages_only_returns_matching_ispb(self, service, stream):
+    @pytest.mark.asyncio
+    async def test_fetch_messages_skips_beyond_claim_horizon(self, service, stream, pending_message, settings):
+        settings.PIX_CLAIM_HORIZON_DAYS = 2
+        await PixMessage.objects.filter(id=pending_message.id).aupdate(
+            created_at=timezone.now() - timedelta(days=3),
+        )
+
+        assert await service.fetch_messages(stream, limit=1) == []
+
+        settings.PIX_CLAIM_HORIZON_DAYS = None
+        assert len(await service.fetch_messages(stream, limit=1)) == 1
+
+    @pytest.mark.asyncio
+    async def test_fetch_messages_only_returns_matching_ispb(self, service, stream):
         # Mensagem para outro ISPB
-        PixMessage.objects.create(
+        await PixMessage.objects.acreate(
             end_to_end_id='E99999999202301011234OTHER',
             valor=Decimal('10.00'),
             pagador={'nome': 'Pagador', 'ispb': '00000000'},
@@ -160,7 +357,7 @@ class TestStreamServiceFetchMessages:
             data_hora_pagamento=timezone.now(),
         )
         # Mensagem para o ISPB correto
-        PixMessage.objects.create(
+        await PixMessage.objects.acreate(
             end_to_end_id='E12345678202301011234MATCH',
             valor=Decimal('20.00'),
             pagador={'nome': 'Pagador', 'ispb': '00000000'},
@@ -168,14 +365,15 @@ class TestStreamServiceFetchMessages:
             data_hora_pagamento=timezone.now(),
         )
 
-        messages = service.fetch_messages(stream, limit=10)
+        messages = await service.fetch_messages(stream, limit=10)
 
         assert len(messages) == 1
         assert messages[0].recebedor_ispb == '12345678'
     
-    def test_fetch_messages_max_ten_multipart(self, service, stream):
+    @pytest.mark.asyncio
+    async def test_fetch_messages_max_ten_multipart(self, service, stream):
         for i in range(15):
-            PixMessage.objects.create(
+            await PixMessage.objects.acreate(
                 end_to_end_id=f'E12345678202301011234MAX{i:02d}',
                 valor=Decimal('10.00'),
                 pagador={'nome': 'Pagador', 'ispb': '00000000'},
@@ -183,33 +381,438 @@ class TestStreamServiceFetchMessages:
                 data_hora_pagamento=timezone.now(),
             )
 
-        messages = service.fetch_messages(stream, limit=10)
+        messages = await service.fetch_messages(stream, limit=10)
 
         assert len(messages) == 10
 
-    def test_closed_stream_not_found(self, service, mock_redis):
-        stream = Stream.objects.create(ispb='12345678')
-        service.close_stream(stream)
+    @pytest.mark.asyncio
+    async def test_fetch_messages_oldest_first(self, service, stream):
+        for i in range(3):
+            await PixMessage.objects.acreate(
+                end_to_end_id=f'E12345678202301011234ORD{i}',
+                valor=Decimal('10.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+
+        messages = await service.fetch_messages(stream, limit=2)
+
+        assert [m.end_to_end_id for m in messages] == [
+            'E12345678202301011234ORD0',
+            'E12345678202301011234ORD1',
+        ]
 
-        found = service.get_stream('12345678', stream.id)
+    @pytest.mark.asyncio
+    async def test_fetch_messages_returns_claimed_state(self, service, stream, pending_message):
+        messages = await service.fetch_messages(stream, limit=1)
+
+        assert messages[0].status == PixMessage.STATUS_DELIVERED
+        assert messages[0].stream_id == stream.id
+        assert messages[0].pagador == {'nome': 'Pagador', 'ispb': '00000000'}
+        assert messages[0].valor == Decimal('100.00')
+
+    @pytest.mark.asyncio
+    async def test_closed_stream_not_found(self, service, mock_redis):
+        stream = await Stream.objects.acreate(ispb='12345678')
+        await service.close_stream(stream)
+
+        found = await service.get_stream('12345678', stream.id)
 
         assert found is None
 
 
 
 @pytest.mark.django_db(transaction=True)
-class TestStreamServiceConcurrency:
+class TestStreamServiceClaimBatch:
+
+    @pytest.mark.asyncio
+    async def test_claim_batch_splits_oldest_first_in_order(self, service):
+        for i in range(5):
+            await PixMessage.objects.acreate(
+                end_to_end_id=f'E12345678202301011234BAT{i:02d}',
+                valor=Decimal('10.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+        first = await Stream.objects.acreate(ispb='12345678')
+        second = await Stream.objects.acreate(ispb='12345678', iteration=3)
+
+        batches = await service.claim_batch('12345678', [(first, 3, 0), (second, 3, 0)])
+
+        assert [m.end_to_end_id[-2:] for m in batches[0]] == ['00', '01', '02']
+        assert [m.end_to_end_id[-2:] for m in batches[1]] == ['03', '04']
+        assert all(m.stream_id == first.id and m.iteration == 0 for m in batches[0])
+        assert all(m.stream_id == second.id and m.iteration == 3 for m in batches[1])
+        assert all(m.status == PixMessage.STATUS_DELIVERED for m in batches[0] + batches[1])
+
+    @pytest.mark.asyncio
+    async def test_claim_batch_empty_when_none(self, service, stream):
+        assert await service.claim_batch('12345678', [(stream, 1, 0)]) == [[]]
+
+    @pytest.mark.asyncio
+    async def test_claim_batch_prefetch_after_all_demands(self, service):
+        for i in range(4):
+            await PixMessage.objects.acreate(
+                end_to_end_id=f'E12345678202301011234PFB{i:02d}',
+                valor=Decimal('10.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+        hot = await Stream.objects.acreate(ispb='12345678')
+        other = await Stream.objects.acreate(ispb='12345678')
+
+        batches = await service.claim_batch('12345678', [(hot, 1, 5), (other, 1, 0)])
+
+        assert [m.iteration for m in batches[0]] == [0, None, None]
+        assert [m.end_to_end_id[-2:] for m in batches[1]] == ['01']
+
+
+class TestExecuteClaim:
+
+    @pytest.mark.asyncio
+    async def test_retries_row_moved_to_another_partition(self):
+        conn = AsyncMock()
+        conn.execute.side_effect = [psycopg.errors.SerializationFailure(), 'cursor']
+
+        assert await execute_claim(conn, CLAIM_SQL, []) == 'cursor'
+        assert conn.execute.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_attempts(self):
+        conn = AsyncMock()
+        conn.execute.side_effect = psycopg.errors.SerializationFailure()
+
+        with pytest.raises(psycopg.errors.SerializationFailure):
+            await execute_claim(conn, CLAIM_SQL, [])
+        assert conn.execute.await_count == CLAIM_ATTEMPTS
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain_claim(sql, params):
+    """Plano do claim com seq scan, bitmap e sort desligados: só sobra o que o índice resolve."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('SET LOCAL enable_bitmapscan = off')
+        cursor.execute('SET LOCAL enable_sort = off')
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    return list(plan_nodes(plan[0]['Plan']))
+
+
+@pytest.mark.django_db
+class TestClaimQueryPlan:
+
+    def test_claim_is_index_range_scan_in_seq_order(self):
+        nodes = explain_claim(CLAIM_SQL, [
+            'stream', PixMessage.STATUS_DELIVERED, timezone.now(), 0, '12345678', claim_horizon(), 10,
+        ])
+
+        scans = [node for node in nodes if node.get('Index Name') == 'pix_message_claim_idx']
+        assert scans and scans[0]['Node Type'] == 'Index Scan'
+        assert not any(node['Node Type'] == 'Sort' for node in nodes)
 
-    def test_concurrent_fetch_no_duplicate_messages(self, mock_redis):
-        """Testa que múltiplas threads não pegam a mesma mensagem."""
-        import threading
-        from concurrent.futures import ThreadPoolExecutor
+    def test_striped_claim_uses_bucket_index(self):
+        nodes = explain_claim(CLAIM_STRIPED_SQL, [
+            'stream', PixMessage.STATUS_DELIVERED, timezone.now(), 0, '12345678',
+            claim_horizon(), 3, 10,
+        ])
 
+        scans = [node for node in nodes if node.get('Index Name') == 'pix_message_bucket_idx']
+        assert scans and scans[0]['Node Type'] == 'Index Scan'
+        assert not any(node['Node Type'] == 'Sort' for node in nodes)
+
+    def test_striped_batch_claim_uses_bucket_index(self):
+        nodes = explain_claim(CLAIM_BATCH_STRIPED_SQL, [
+            ['a', 'b'], [0, 0], [0, 1], [3, 7], '12345678', claim_horizon(),
+            PixMessage.STATUS_DELIVERED, timezone.now(),
+        ])
+
+        scans = [node for node in nodes if node.get('Index Name') == 'pix_message_bucket_idx']
+        assert scans and scans[0]['Node Type'] == 'Index Scan'
+
+
+class TestStreamBucket:
+
+    def test_bucket_in_range_and_rotates_with_iteration(self):
+        stream = Stream(id='abc123', ispb='12345678', iteration=0)
+        first = stream_bucket(stream)
+        stream.iteration = 1
+
+        assert 0 <= first < PixMessage.CLAIM_BUCKETS
+        assert stream_bucket(stream) == (first + 1) % PixMessage.CLAIM_BUCKETS
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamServiceStripedClaim:
+
+    async def create_messages(self, count):
+        for i in range(count):
+            await PixMessage.objects.acreate(
+                end_to_end_id=f'E12345678202301011234STR{i:02d}',
+                valor=Decimal('10.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+
+    @pytest.mark.asyncio
+    async def test_bucket_assigned_at_ingest(self, pending_message):
+        message = await PixMessage.objects.aget(id=pending_message.id)
+
+        assert 0 <= message.bucket < PixMessage.CLAIM_BUCKETS
+
+    @pytest.mark.asyncio
+    async def test_striped_claim_prefers_own_bucket(self, service, settings):
+        settings.PIX_STRIPED_CLAIM = True
+        # ID fixo: bucket e distribuição das mensagens determinísticos
+        stream = await Stream.objects.acreate(id='striped00001', ispb='12345678')
+        await self.create_messages(80)
+        own = [m async for m in PixMessage.objects.filter(bucket=stream_bucket(stream))]
+
+        messages = await service.fetch_messages(stream, limit=len(own))
+
+        assert own
+        assert {m.id for m in messages} == {m.id for m in own}
+
+    @pytest.mark.asyncio
+    async def test_striped_claim_steals_when_own_bucket_empty(self, service, stream, settings):
+        settings.PIX_STRIPED_CLAIM = True
+        await self.create_messages(80)
+        await PixMessage.objects.filter(bucket=stream_bucket(stream)).adelete()
+
+        messages = await service.fetch_messages(stream, limit=5)
+
+        assert len(messages) == 5
+
+    @pytest.mark.asyncio
+    async def test_striped_claim_batch_uses_each_stream_bucket(self, service, settings):
+        settings.PIX_STRIPED_CLAIM = True
+        first = await Stream.objects.acreate(id='striped00001', ispb='12345678')
+        second = await Stream.objects.acreate(id='striped00002', ispb='12345678')
+        await self.create_messages(80)
+
+        batches = await service.claim_batch('12345678', [(first, 2, 0), (second, 2, 0)])
+
+        assert stream_bucket(first) != stream_bucket(second)
+        assert [m.bucket for m in batches[0]] == [stream_bucket(first)] * 2
+        assert [m.bucket for m in batches[1]] == [stream_bucket(second)] * 2
+
+    @pytest.mark.asyncio
+    async def test_striped_claim_batch_fills_from_other_buckets(self, service, settings):
+        settings.PIX_STRIPED_CLAIM = True
+        first = await Stream.objects.acreate(id='striped00001', ispb='12345678')
+        second = await Stream.objects.acreate(id='striped00002', ispb='12345678')
+        await self.create_messages(80)
+        await PixMessage.objects.filter(bucket=stream_bucket(first)).adelete()
+
+        batches = await service.claim_batch('12345678', [(first, 3, 0), (second, 3, 0)])
+
+        assert [len(batch) for batch in batches] == [3, 3]
+        assert [m.bucket for m in batches[1]] == [stream_bucket(second)] * 3
+        assert len({m.id for m in batches[0] + batches[1]}) == 6
+
+
+@pytest.fixture
+def prefetch(settings):
+    settings.PIX_PREFETCH_SIZE = 5
+    settings.PIX_LONG_POLLING_TIMEOUT = 0
+    yield buffers
+    buffers.drain()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamServicePrefetch:
+
+    async def create_messages(self, count):
+        for i in range(count):
+            await PixMessage.objects.acreate(
+                end_to_end_id=f'E12345678202301011234PRE{i:02d}',
+                valor=Decimal('10.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+
+    @pytest.mark.asyncio
+    async def test_hot_stream_claims_ahead_and_serves_from_memory(self, service, prefetch):
+        await self.create_messages(8)
+        stream = await service.create_stream('12345678')
+
+        first = await service.fetch_messages_with_polling(stream, limit=2)
+        await service.start_iteration(stream, 1)
+        second = await service.fetch_messages_with_polling(stream, limit=2)
+
+        assert len(first) == len(second) == 2
+        assert prefetch.stats()['buffered'] == 3
+        assert await PixMessage.objects.filter(status=PixMessage.STATUS_PENDING).acount() == 1
+
+        await service.start_iteration(stream, 2)
+        with patch('pix.services.get_poller') as poller:
+            third = await service.fetch_messages_with_polling(stream, limit=2)
+
+        poller.assert_not_called()
+        assert [m.end_to_end_id[-2:] for m in third] == ['04', '05']
+        # A iteração vai para o banco: replay e ack valem em qualquer worker
+        assert await PixMessage.objects.filter(iteration=2).acount() == 2
+        assert [m.end_to_end_id for m in await service.replay_iteration(stream, 2)] == \
+            [m.end_to_end_id for m in third]
+
+        await service.start_iteration(stream, 3)
+        confirmed = PixMessage.objects.filter(status=PixMessage.STATUS_CONFIRMED)
+        assert await confirmed.acount() == 6
+
+    @pytest.mark.asyncio
+    async def test_buffered_message_swept_meanwhile_not_served(self, service, prefetch):
+        await self.create_messages(8)
+        stream = await service.create_stream('12345678')
+        await service.fetch_messages_with_polling(stream, limit=2)
+        await service.start_iteration(stream, 1)
+        await service.fetch_messages_with_polling(stream, limit=2)
+        # O sweep devolveu uma das reservadas para a fila
+        await PixMessage.objects.filter(end_to_end_id__endswith='PRE04').aupdate(
+            status=PixMessage.STATUS_PENDING, stream=None,
+        )
+
+        await service.start_iteration(stream, 2)
+        served = await service.fetch_messages_with_polling(stream, limit=2)
+
+        assert [m.end_to_end_id[-2:] for m in served] == ['05']
+
+    @pytest.mark.asyncio
+    async def test_close_releases_buffered_messages(self, service, prefetch):
+        await self.create_messages(8)
+        stream = await service.create_stream('12345678')
+        await service.fetch_messages_with_polling(stream, limit=2)
+        await service.fetch_messages_with_polling(stream, limit=2)
+
+        await service.close_stream(stream)
+
+        assert prefetch.stats()['buffered'] == 0
+        assert await PixMessage.objects.filter(status=PixMessage.STATUS_PENDING).acount() == 8
+
+    @pytest.mark.asyncio
+    async def test_release_prefetched_returns_unserved_to_pending(self, service, prefetch):
+        await self.create_messages(8)
+        stream = await service.create_stream('12345678')
+        await service.fetch_messages_with_polling(stream, limit=2)
+        await service.fetch_messages_with_polling(stream, limit=2)
+
+        released = await service.release_prefetched(prefetch.drain())
+
+        assert released == 3
+        assert await PixMessage.objects.filter(status=PixMessage.STATUS_PENDING).acount() == 4
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamServiceConfirm:
+
+    @pytest.mark.asyncio
+    async def test_confirm_marks_delivered_as_confirmed(self, service, stream, pending_message):
+        await service.fetch_messages(stream, limit=1)
+
+        confirmed = await service.confirm_messages(stream, [pending_message.end_to_end_id])
+
+        assert confirmed == 1
+        await pending_message.arefresh_from_db()
+        assert pending_message.status == PixMessage.STATUS_CONFIRMED
+
+    @pytest.mark.asyncio
+    async def test_confirm_ignores_other_stream_messages(self, service, stream, pending_message):
+        other = await Stream.objects.acreate(ispb='12345678')
+        await service.fetch_messages(other, limit=1)
+
+        confirmed = await service.confirm_messages(stream, [pending_message.end_to_end_id])
+
+        assert confirmed == 0
+        await pending_message.arefresh_from_db()
+        assert pending_message.status == PixMessage.STATUS_DELIVERED
+
+    @pytest.mark.asyncio
+    async def test_confirmed_not_released_on_close(self, service, stream, pending_message):
+        await service.fetch_messages(stream, limit=1)
+        await service.confirm_messages(stream, [pending_message.end_to_end_id])
+
+        await service.close_stream(stream)
+
+        await pending_message.arefresh_from_db()
+        assert pending_message.status == PixMessage.STATUS_CONFIRMED
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamServiceVisibilityTimeout:
+
+    async def _delivered(self, stream, suffix, locked_at):
+        return await PixMessage.objects.acreate(
+            end_to_end_id=f'E12345678202301011234VIS{suffix}',
+            valor=Decimal('10.00'),
+            pagador={'nome': 'Pagador', 'ispb': '00000000'},
+            recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+            data_hora_pagamento=timezone.now(),
+            stream=stream,
+            status=PixMessage.STATUS_DELIVERED,
+            locked_at=locked_at,
+        )
+
+    @pytest.mark.asyncio
+    async def test_fetch_messages_stamps_locked_at(self, service, stream, pending_message):
+        messages = await service.fetch_messages(stream, limit=1)
+
+        assert messages[0].locked_at is not None
+
+    @pytest.mark.asyncio
+    async def test_sweep_returns_expired_to_pending(self, service, stream):
+        old = await self._delivered(stream, 'OLD', timezone.now() - timedelta(seconds=120))
+        recent = await self._delivered(stream, 'NEW', timezone.now())
+
+        swept = await service.sweep_expired_messages(timeout=60)
+
+        assert swept == 1
+        await old.arefresh_from_db()
+        await recent.arefresh_from_db()
+        assert old.status == PixMessage.STATUS_PENDING
+        assert old.stream_id is None
+        assert old.locked_at is None
+        assert recent.status == PixMessage.STATUS_DELIVERED
+
+    @pytest.mark.asyncio
+    async def test_sweep_works_in_chunks(self, service, stream):
+        for i in range(5):
+            await self._delivered(stream, f'CHK{i}', timezone.now() - timedelta(seconds=120))
+
+        swept = await service.sweep_expired_messages(timeout=60, chunk_size=2)
+
+        assert swept == 5
+        assert await PixMessage.objects.filter(status=PixMessage.STATUS_PENDING).acount() == 5
+
+    @pytest.mark.asyncio
+    async def test_swept_message_can_be_claimed_again(self, service, stream):
+        await self._delivered(stream, 'AGN', timezone.now() - timedelta(seconds=120))
+        await service.sweep_expired_messages(timeout=60)
+
+        messages = await service.fetch_messages(stream, limit=1)
+
+        assert len(messages) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamServiceConcurrency:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_fetch_no_duplicate_messages(self, mock_redis):
+        """Testa que múltiplos claims simultâneos não pegam a mesma mensagem."""
         ispb = '12345678'
 
         # Cria 10 mensagens
         for i in range(10):
-            PixMessage.objects.create(
+            await PixMessage.objects.acreate(
                 end_to_end_id=f'E12345678202301011234CONC{i:02d}',
                 valor=Decimal('10.00'),
                 pagador={'nome': 'Pagador', 'ispb': '00000000'},
@@ -218,26 +821,54 @@ class TestStreamServiceConcurrency:
             )
 
         # Cria streams separados para cada "cliente"
-        streams = [Stream.objects.create(ispb=ispb) for _ in range(5)]
-        
-        fetched_ids = []
-        lock = threading.Lock()
+        streams = [await Stream.objects.acreate(ispb=ispb) for _ in range(5)]
 
-        def fetch_message(stream):
+        async def fetch_message(stream):
             service = StreamService()
-            messages = service.fetch_messages(stream, limit=2)
-            with lock:
-                for msg in messages:
-                    fetched_ids.append(str(msg.id))
+            return await service.fetch_messages(stream, limit=2)
 
-        # Executa 5 threads simultaneamente
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            executor.map(fetch_message, streams)
+        # Executa 5 claims simultaneamente, cada um em sua conexão
+        results = await asyncio.gather(*(fetch_message(stream) for stream in streams))
+        fetched_ids = [str(msg.id) for messages in results for msg in messages]
 
         # Verifica que não há duplicatas
         assert len(fetched_ids) == len(set(fetched_ids)), "Mensagens duplicadas encontradas!"
         assert len(fetched_ids) == 10  # Todas as mensagens foram distribuídas
 
+    @pytest.mark.asyncio
+    async def test_concurrent_drain_no_duplicate_messages(self, mock_redis):
+        """Streams drenando o mesmo ISPB em paralelo até esvaziar a fila."""
+        ispb = '12345678'
+
+        for i in range(60):
+            await PixMessage.objects.acreate(
+                end_to_end_id=f'E12345678202301011234DRN{i:02d}',
+                valor=Decimal('10.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': ispb},
+                data_hora_pagamento=timezone.now(),
+            )
+
+        streams = [await Stream.objects.acreate(ispb=ispb) for _ in range(6)]
+        claimed = {}
+
+        async def drain(stream):
+            service = StreamService()
+            while True:
+                messages = await service.fetch_messages(stream, limit=3)
+                if not messages:
+                    break
+                for msg in messages:
+                    assert msg.id not in claimed, "Mensagem duplicada!"
+                    claimed[msg.id] = stream.id
+
+        await asyncio.gather(*(drain(stream) for stream in streams))
+
+        assert len(claimed) == 60
+        async for msg in PixMessage.objects.all():
+            assert msg.status == PixMessage.STATUS_DELIVERED
+            assert msg.stream_id == claimed[msg.id]
+
 @pytest.mark.django_db(transaction=True)
 class TestStreamServicePolling:
 
@@ -304,8 +935,41 @@ class TestStreamServicePolling:
             mock_settings.PIX_LONG_POLLING_TIMEOUT = 8
             mock_settings.REDIS_URL = 'redis://localhost:6379/0'
             mock_settings.PIX_MAX_STREAMS_PER_ISPB = 6
+            mock_settings.PIX_STREAM_LEASE_TTL = 60
+            mock_settings.PIX_PREFETCH_SIZE = 0
+            mock_settings.PIX_STRIPED_CLAIM = False
+            mock_settings.PIX_CLAIM_HORIZON_DAYS = None
+            mock_settings.PIX_PRERENDERED_PAYLOAD = False
 
             service = StreamService()
             messages = await service.fetch_messages_with_polling(stream, limit=1)
 
             assert messages == []
+
+    @pytest.mark.asyncio
+    async def test_replay_waits_for_in_flight_poll(self):
+        stream = await Stream.objects.acreate(ispb='12345678')
+        service = StreamService()
+
+        async def retry_then_insert():
+            # Retry chega enquanto a leitura original ainda espera mensagem
+            await asyncio.sleep(0.2)
+            replay = asyncio.create_task(service.replay_iteration(stream, stream.iteration))
+            await asyncio.sleep(0.3)
+            assert not replay.done()
+            await PixMessage.objects.acreate(
+                end_to_end_id='E12345678202301011234RETRY',
+                valor=Decimal('100.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+            return await replay
+
+        polled, replayed = await asyncio.gather(
+            service.fetch_messages_with_polling(stream, limit=1, wait=3), retry_then_insert(),
+        )
+
+        assert [m.end_to_end_id for m in polled] == ['E12345678202301011234RETRY']
+        assert [m.end_to_end_id for m in replayed] == [m.end_to_end_id for m in polled]
+        assert await service.redis.get(f'stream:polling:{stream.id}') is None
@@ -0,0 +1,59 @@
+import io
+import json
+from datetime import UTC, datetime
+
+import pytest
+from django.core.management import call_command
+
+from pix.models import PixMessage
+from pix.synthetic import MessageGenerator, parse_ispbs, zipf_ispbs
+
+START = datetime(2026, 10, 17, 12, 0, tzinfo=UTC)
+
+
+class TestMessageGenerator:
+
+    def test_rows_are_deterministic_with_seed_and_start(self):
+        first = MessageGenerator(seed=42, pool_size=50, start=START).rows(['12345678'] * 20)
+        second = MessageGenerator(seed=42, pool_size=50, start=START).rows(['12345678'] * 20)
+
+        assert first == second
+
+    def test_row_shape(self):
+        row = MessageGenerator(seed=1, pool_size=10, start=START).rows(['99999999'])[0]
+        line, end_to_end_id, valor, pagador, recebedor, _, _, paid_at, payload = row
+
+        assert line == 1
+        assert end_to_end_id.startswith('E99999999202610171')
+        assert len(end_to_end_id) == 32
+        assert float(valor) > 0
+        assert json.loads(recebedor)['ispb'] == '99999999'
+        assert len(json.loads(pagador)['ispb']) == 8
+        assert datetime.fromisoformat(paid_at) <= START
+        assert payload is None
+
+    def test_zipf_weights_favor_first_ispbs(self):
+        ispbs, weights = zipf_ispbs(3, skew=1.0)
+
+        assert ispbs == ['90000001', '90000002', '90000003']
+        assert weights == sorted(weights, reverse=True)
+
+    def test_parse_ispbs(self):
+        assert parse_ispbs('12345678:5,99999999') == (['12345678', '99999999'], [5.0, 1.0])
+
+        with pytest.raises(ValueError):
+            parse_ispbs('123:1')
+
+
+@pytest.mark.django_db(transaction=True)
+class TestSeedMessages:
+
+    def test_seed_spreads_across_ispbs(self):
+        call_command(
+            'seed_messages', '--count', '300', '--ispbs', '12345678:2,99999999:1',
+            '--seed', '7', '--batch-size', '100', '--pool-size', '20', stdout=io.StringIO(),
+        )
+
+        assert PixMessage.objects.count() == 300
+        assert PixMessage.objects.filter(recebedor_ispb='12345678').count() > \
+            PixMessage.objects.filter(recebedor_ispb='99999999').count()
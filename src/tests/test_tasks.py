@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from pix import tasks
+
+
+class TestStartBackgroundTasks:
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, settings):
+        settings.PIX_SWEEPER_IN_PROCESS = False
+
+        tasks.start_background_tasks()
+
+        assert asyncio.get_running_loop() not in tasks._tasks
+
+    @pytest.mark.asyncio
+    async def test_requires_visibility_timeout(self, settings):
+        settings.PIX_SWEEPER_IN_PROCESS = True
+        settings.PIX_VISIBILITY_TIMEOUT = None
+
+        tasks.start_background_tasks()
+
+        assert asyncio.get_running_loop() not in tasks._tasks
+
+    @pytest.mark.asyncio
+    async def test_starts_once_per_loop(self, settings):
+        settings.PIX_SWEEPER_IN_PROCESS = True
+        settings.PIX_VISIBILITY_TIMEOUT = 60
+
+        with patch.object(tasks, '_sweep_forever', AsyncMock()) as sweep:
+            tasks.start_background_tasks()
+            tasks.start_background_tasks()
+            await asyncio.sleep(0)
+
+        assert sweep.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_flushes_history_with_redis_registry(self, settings):
+        settings.PIX_SWEEPER_IN_PROCESS = False
+        settings.PIX_STREAM_REGISTRY = 'redis'
+
+        with patch.object(tasks, '_flush_history_forever', AsyncMock()) as flush:
+            tasks.start_background_tasks()
+            await asyncio.sleep(0)
+
+        assert flush.await_count == 1
@@ -1,10 +1,20 @@
+import asyncio
+import json
+import zlib
 import pytest
-from unittest.mock import patch, MagicMock
-from rest_framework.test import APIClient
+import httpx
+import redis
+from unittest.mock import patch, AsyncMock, MagicMock
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from datetime import timedelta
 from decimal import Decimal
+from django.conf import settings as django_settings
 from django.utils import timezone
 
 from pix.models import PixMessage, Stream
+from pix.serializers import PixMessageSerializer
+from pix.views import get_wait_preferences
 
 
 @pytest.fixture
@@ -12,14 +22,22 @@ def client():
     return APIClient()
 
 
+def multipart_messages(response) -> list[dict]:
+    """Mensagens de uma resposta multipart/json, uma por parte."""
+    boundary = response['Content-Type'].split('boundary=')[1].encode()
+    sections = b''.join(response).split(b'--' + boundary)
+    return [json.loads(section.split(b'\r\n\r\n', 1)[1]) for section in sections[1:-1]]
+
+
 @pytest.fixture
 def mock_redis():
-    with patch('pix.services.redis') as mock:
-        client = MagicMock()
+    with patch('pix.services.get_redis') as mock:
+        client = AsyncMock()
         client.get.return_value = None
-        client.incr.return_value = 1
         client.decr.return_value = 0
-        mock.from_url.return_value = client
+        # Script de admissão: devolve o slot ocupado (0 = limite atingido)
+        client.register_script = MagicMock(return_value=AsyncMock(return_value=1))
+        mock.return_value = client
         yield client
 
 
@@ -54,7 +72,7 @@ class TestGenerateMessages:
         assert 'error' in response.data
 
     def test_generate_messages_quantity_too_high(self, client):
-        response = client.post('/api/pix/util/msgs/12345678/101/')
+        response = client.post(f'/api/pix/util/msgs/12345678/{django_settings.PIX_GENERATE_MAX_MESSAGES + 1}/')
 
         assert response.status_code == 400
         assert 'error' in response.data
@@ -66,8 +84,141 @@ class TestGenerateMessages:
         assert msg.recebedor_ispb == '99999999'
 
 
+def ingest_payload(end_to_end_id, ispb='12345678'):
+    return {
+        'endToEndId': end_to_end_id,
+        'valor': '150.25',
+        'pagador': {'nome': 'Pagador', 'ispb': '00000000'},
+        'recebedor': {'nome': 'Recebedor', 'ispb': ispb},
+        'campoLivre': '',
+        'txId': 'TX1',
+        'dataHoraPagamento': '2026-10-17T10:00:00Z',
+    }
+
 
 @pytest.mark.django_db
+class TestIngestMessages:
+
+    def test_ingest_json_array(self, client):
+        response = client.post(
+            '/api/pix/messages/ingest',
+            [ingest_payload('E1INGEST0001'), ingest_payload('E1INGEST0002', ispb='99999999')],
+            format='json',
+        )
+
+        assert response.status_code == 201
+        assert response.data == {'accepted': 2, 'duplicates': 0}
+        msg = PixMessage.objects.get(end_to_end_id='E1INGEST0002')
+        assert msg.recebedor_ispb == '99999999'
+        assert msg.status == PixMessage.STATUS_PENDING
+        assert msg.valor == Decimal('150.25')
+
+    def test_ingest_ndjson(self, client):
+        body = '\n'.join(json.dumps(ingest_payload(f'E1NDJSON000{i}')) for i in range(3))
+
+        response = client.post('/api/pix/messages/ingest', body, content_type='application/x-ndjson')
+
+        assert response.status_code == 201
+        assert response.data['accepted'] == 3
+        assert PixMessage.objects.count() == 3
+
+    def test_ingest_skips_duplicates(self, client):
+        client.post('/api/pix/messages/ingest', [ingest_payload('E1DUP0001')], format='json')
+
+        response = client.post(
+            '/api/pix/messages/ingest',
+            [ingest_payload('E1DUP0001'), ingest_payload('E1DUP0002'), ingest_payload('E1DUP0002')],
+            format='json',
+        )
+
+        assert response.data == {'accepted': 1, 'duplicates': 2}
+        assert PixMessage.objects.count() == 2
+
+    def test_ingest_invalid_recebedor_ispb(self, client):
+        response = client.post(
+            '/api/pix/messages/ingest', [ingest_payload('E1BAD0001', ispb='123')], format='json',
+        )
+
+        assert response.status_code == 400
+        assert PixMessage.objects.count() == 0
+
+    def test_ingest_requires_list(self, client):
+        response = client.post('/api/pix/messages/ingest', ingest_payload('E1OBJ0001'), format='json')
+
+        assert response.status_code == 400
+        assert 'error' in response.data
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPrerenderedPayload:
+
+    def test_ingest_stores_payload_served_as_is(self, client, mock_redis, settings):
+        settings.PIX_PRERENDERED_PAYLOAD = True
+        client.post(
+            '/api/pix/messages/ingest',
+            [ingest_payload('E1PAYLOAD0001'), ingest_payload('E1PAYLOAD0002')],
+            format='json',
+        )
+        messages = list(PixMessage.objects.order_by('seq'))
+        assert all(message.payload for message in messages)
+
+        response = client.get('/api/pix/12345678/stream/start?format=multipart')
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'multipart/json'
+        assert 'Pull-Next' in response.headers
+        # jsonb reordena as chaves de pagador/recebedor; o payload guarda a ordem recebida
+        assert json.loads(response.content) == PixMessageSerializer(messages, many=True).data
+
+    def test_orm_create_renders_payload(self, settings):
+        settings.PIX_PRERENDERED_PAYLOAD = True
+        message = PixMessage.objects.create(
+            end_to_end_id='E1PAYLOAD0003', valor='1.5', pagador={}, recebedor={'ispb': '12345678'},
+            data_hora_pagamento='2026-10-17T10:00:00Z',
+        )
+        message.refresh_from_db()
+
+        assert bytes(message.payload) == JSONRenderer().render(PixMessageSerializer(message).data)
+
+
+class TestWaitPreferences:
+
+    def preferences(self, prefer):
+        return get_wait_preferences(APIRequestFactory().get('/', HTTP_PREFER=prefer))
+
+    def test_without_header(self):
+        assert self.preferences('') == (None, 0, '')
+
+    def test_wait_and_linger(self, settings):
+        settings.PIX_LONG_POLLING_TIMEOUT = 8
+        settings.PIX_MAX_LINGER_MS = 1000
+
+        assert self.preferences('wait=3, linger=250') == (3, 0.25, 'wait=3, linger=250')
+
+    def test_capped_and_invalid(self, settings):
+        settings.PIX_LONG_POLLING_TIMEOUT = 8
+        settings.PIX_MAX_LINGER_MS = 1000
+
+        assert self.preferences('wait=60, linger=5000, respond-async') == (8, 1.0, 'wait=8, linger=1000')
+        assert self.preferences('wait=abc') == (None, 0, '')
+
+
+class TestMetrics:
+
+    def test_metrics_returns_pool_stats(self, client):
+        with patch('pix.views.pool_stats', return_value={'requests_waiting': 0}):
+            response = client.get('/api/pix/util/metrics/')
+
+        assert response.status_code == 200
+        assert response.data['db_pool'] == {'requests_waiting': 0}
+
+    def test_metrics_returns_prefetch_stats(self, client):
+        response = client.get('/api/pix/util/metrics/')
+
+        assert set(response.data['prefetch']) >= {'buffered', 'hits', 'misses'}
+
+
+@pytest.mark.django_db(transaction=True)
 class TestStreamStart:
 
     def test_stream_start_returns_message(self, client, mock_redis):
@@ -83,7 +234,7 @@ class TestStreamStart:
 
         assert response.status_code == 200
         assert 'Pull-Next' in response.headers
-        assert response.data['endToEndId'] == 'E12345678202301011234START'
+        assert response.json()['endToEndId'] == 'E12345678202301011234START'
 
     def test_stream_start_invalid_ispb(self, client):
         response = client.get('/api/pix/123/stream/start')
@@ -91,14 +242,14 @@ class TestStreamStart:
         assert response.status_code == 400
 
     def test_stream_start_limit_exceeded(self, client, mock_redis):
-        mock_redis.get.return_value = b'6'
+        mock_redis.register_script.return_value.return_value = 0
 
         response = client.get('/api/pix/12345678/stream/start')
 
         assert response.status_code == 429
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 class TestStreamContinue:
 
     def test_stream_continue_returns_message(self, client, mock_redis):
@@ -116,6 +267,26 @@ class TestStreamContinue:
         assert response.status_code == 200
         assert 'Pull-Next' in response.headers
     
+    def test_stream_continue_renews_lease(self, client, mock_redis, settings):
+        settings.PIX_LONG_POLLING_TIMEOUT = 0
+        stream = Stream.objects.create(
+            ispb='12345678', lease_expires_at=timezone.now() + timedelta(seconds=5),
+        )
+
+        client.get(f'/api/pix/12345678/stream/{stream.id}')
+
+        stream.refresh_from_db()
+        assert stream.lease_expires_at > timezone.now() + timedelta(seconds=5)
+
+    def test_stream_continue_expired_lease_not_found(self, client, mock_redis):
+        stream = Stream.objects.create(
+            ispb='12345678', lease_expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        response = client.get(f'/api/pix/12345678/stream/{stream.id}')
+
+        assert response.status_code == 404
+
     def test_stream_continue_not_found(self, client, mock_redis):
         response = client.get('/api/pix/12345678/stream/invalidid')
 
@@ -136,7 +307,157 @@ class TestStreamContinue:
         assert response.status_code == 404
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
+class TestStreamAck:
+
+    def test_ack_confirms_messages(self, client, mock_redis):
+        stream = Stream.objects.create(ispb='12345678')
+        for i in range(3):
+            PixMessage.objects.create(
+                end_to_end_id=f'E12345678202301011234ACK{i}',
+                valor=Decimal('100.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+                stream=stream,
+                status=PixMessage.STATUS_DELIVERED,
+            )
+
+        response = client.post(
+            f'/api/pix/12345678/stream/{stream.id}/ack',
+            {'endToEndIds': ['E12345678202301011234ACK0', 'E12345678202301011234ACK1']},
+            format='json',
+        )
+
+        assert response.status_code == 200
+        assert response.data['confirmed'] == 2
+        assert PixMessage.objects.filter(status=PixMessage.STATUS_CONFIRMED).count() == 2
+
+    def test_ack_empty_list_invalid(self, client, mock_redis):
+        stream = Stream.objects.create(ispb='12345678')
+
+        response = client.post(
+            f'/api/pix/12345678/stream/{stream.id}/ack', {'endToEndIds': []}, format='json',
+        )
+
+        assert response.status_code == 400
+
+    def test_ack_stream_not_found(self, client, mock_redis):
+        response = client.post(
+            '/api/pix/12345678/stream/invalidid/ack', {'endToEndIds': ['E1']}, format='json',
+        )
+
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamIterations:
+
+    @pytest.fixture(autouse=True)
+    def messages(self, settings):
+        settings.PIX_LONG_POLLING_TIMEOUT = 0
+        for i in range(2):
+            PixMessage.objects.create(
+                end_to_end_id=f'E12345678202301011234ITR{i}',
+                valor=Decimal('100.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+
+    def test_pull_next_carries_iteration(self, client, mock_redis):
+        response = client.get('/api/pix/12345678/stream/start')
+
+        assert response.headers['Pull-Next'].endswith('.1')
+
+    def test_next_iteration_confirms_previous_batch(self, client, mock_redis):
+        first = client.get('/api/pix/12345678/stream/start')
+
+        second = client.get(first.headers['Pull-Next'])
+
+        assert second.status_code == 200
+        assert second.headers['Pull-Next'].endswith('.2')
+        confirmed = PixMessage.objects.get(status=PixMessage.STATUS_CONFIRMED)
+        assert confirmed.end_to_end_id == first.json()['endToEndId']
+
+    def test_retry_replays_same_batch(self, client, mock_redis):
+        first = client.get('/api/pix/12345678/stream/start')
+        second = client.get(first.headers['Pull-Next'])
+
+        retry = client.get(first.headers['Pull-Next'])
+
+        assert retry.status_code == 200
+        assert retry.json()['endToEndId'] == second.json()['endToEndId']
+        assert retry.headers['Pull-Next'] == second.headers['Pull-Next']
+        assert PixMessage.objects.filter(status=PixMessage.STATUS_DELIVERED).count() == 1
+
+    def test_out_of_order_iteration_not_found(self, client, mock_redis):
+        first = client.get('/api/pix/12345678/stream/start')
+        stream_id = first.headers['Pull-Next'].rsplit('/', 1)[1].split('.')[0]
+
+        response = client.get(f'/api/pix/12345678/stream/{stream_id}.5')
+
+        assert response.status_code == 404
+
+    def test_delete_on_pull_next_confirms_last_batch(self, client, mock_redis):
+        first = client.get('/api/pix/12345678/stream/start')
+
+        client.delete(first.headers['Pull-Next'])
+
+        assert PixMessage.objects.filter(status=PixMessage.STATUS_CONFIRMED).count() == 1
+        assert PixMessage.objects.filter(status=PixMessage.STATUS_PENDING).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+class TestSignedCursors:
+
+    @pytest.fixture(autouse=True)
+    def signed(self, settings):
+        settings.PIX_SIGNED_CURSORS = True
+        settings.PIX_LONG_POLLING_TIMEOUT = 0
+        for i in range(2):
+            PixMessage.objects.create(
+                end_to_end_id=f'E12345678202301011234SIG{i}',
+                valor=Decimal('100.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+
+    def test_pull_next_is_signed(self, client, mock_redis):
+        response = client.get('/api/pix/12345678/stream/start')
+
+        assert ':' in response.headers['Pull-Next']
+
+    def test_signed_pull_next_advances_without_lookup(self, client, mock_redis):
+        first = client.get('/api/pix/12345678/stream/start')
+
+        with patch('pix.views.StreamService.renew_stream') as renew:
+            second = client.get(first.headers['Pull-Next'])
+
+        assert second.status_code == 200
+        renew.assert_not_called()
+        assert PixMessage.objects.filter(status=PixMessage.STATUS_CONFIRMED).count() == 1
+
+    def test_signed_retry_replays(self, client, mock_redis):
+        first = client.get('/api/pix/12345678/stream/start')
+        second = client.get(first.headers['Pull-Next'])
+
+        retry = client.get(first.headers['Pull-Next'])
+
+        assert retry.status_code == 200
+        assert retry.json()['endToEndId'] == second.json()['endToEndId']
+
+    def test_signed_delete_closes_stream(self, client, mock_redis):
+        first = client.get('/api/pix/12345678/stream/start')
+
+        response = client.delete(first.headers['Pull-Next'])
+
+        assert response.status_code == 200
+        assert Stream.objects.get().status == Stream.STATUS_CLOSED
+
+
+@pytest.mark.django_db(transaction=True)
 class TestStreamResponse:
 
     def test_response_has_pull_next_header(self, client, mock_redis):
@@ -166,8 +487,10 @@ class TestStreamResponse:
         response = client.get('/api/pix/12345678/stream/start?format=multipart')
 
         assert response.status_code == 200
-        assert isinstance(response.data, list)
-        assert len(response.data) == 3
+        assert response['Content-Type'] == 'multipart/json'
+        data = json.loads(response.content)
+        assert isinstance(data, list)
+        assert len(data) == 3
     
     def test_multipart_with_accept_header(self, client, mock_redis):
         for i in range(3):
@@ -185,8 +508,57 @@ class TestStreamResponse:
         )
 
         assert response.status_code == 200
-        assert isinstance(response.data, list)
+        assert response['Content-Type'].startswith('multipart/json; boundary=')
+        assert 'Pull-Next' in response.headers
+        messages = multipart_messages(response)
+        assert len(messages) == 3
+        assert all('endToEndId' in message for message in messages)
+
+    def test_multipart_batch_size_negotiated(self, client, mock_redis, settings):
+        settings.PIX_MULTIPART_MAX_MESSAGES = 12
+        for i in range(15):
+            PixMessage.objects.create(
+                end_to_end_id=f'E12345678202301011234NEG{i:02d}',
+                valor=Decimal('100.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+
+        small = client.get('/api/pix/12345678/stream/start', HTTP_ACCEPT='multipart/json; max-messages=2')
+        capped = client.get('/api/pix/12345678/stream/start', HTTP_ACCEPT='multipart/json; max-messages=100')
+
+        assert len(multipart_messages(small)) == 2
+        assert len(multipart_messages(capped)) == 12
     
+    def test_multipart_compressed_when_accepted(self, client, mock_redis, settings):
+        settings.PIX_COMPRESSION_ENCODINGS = ['zstd', 'gzip']
+        settings.PIX_COMPRESSION_MIN_BYTES = 1024
+        for i in range(10):
+            PixMessage.objects.create(
+                end_to_end_id=f'E12345678202301011234GZP{i}',
+                valor=Decimal('100.00'),
+                pagador={'nome': 'Pagador', 'ispb': '00000000'},
+                recebedor={'nome': 'Recebedor', 'ispb': '12345678'},
+                data_hora_pagamento=timezone.now(),
+            )
+
+        response = client.get(
+            '/api/pix/12345678/stream/start', HTTP_ACCEPT='multipart/json', HTTP_ACCEPT_ENCODING='gzip',
+        )
+
+        assert response['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response['Vary']
+        body = zlib.decompress(b''.join(response), 31)
+        assert body.count(b'"endToEndId"') == 10
+
+    def test_prefer_wait_zero_returns_immediately(self, client, mock_redis):
+        response = client.get('/api/pix/12345678/stream/start', HTTP_PREFER='wait=0')
+
+        assert response.status_code == 204
+        assert response['Preference-Applied'] == 'wait=0'
+        assert 'Pull-Next' in response.headers
+
     def test_single_returns_object(self, client, mock_redis):
         PixMessage.objects.create(
             end_to_end_id='E12345678202301011234SGL',
@@ -199,7 +571,39 @@ class TestStreamResponse:
         response = client.get('/api/pix/12345678/stream/start')
 
         assert response.status_code == 200
-        assert isinstance(response.data, dict)
-        assert 'endToEndId' in response.data
+        assert isinstance(response.json(), dict)
+        assert 'endToEndId' in response.json()
+
+    
 
-    
\ No newline at end of file
+
+@pytest.fixture
+def clean_stream_count():
+    client = redis.from_url(django_settings.REDIS_URL)
+    key = 'stream:count:55555555'
+    client.delete(key)
+    yield key
+    client.delete(key)
+    client.close()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStreamAdmissionConcurrency:
+
+    @pytest.mark.asyncio
+    async def test_burst_admits_exactly_max_streams(self, settings, clean_stream_count):
+        """Rajada de stream/start no mesmo ISPB: só PIX_MAX_STREAMS_PER_ISPB passam."""
+        from config.asgi import application
+
+        settings.PIX_LONG_POLLING_TIMEOUT = 0
+        transport = httpx.ASGITransport(app=application)
+
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            responses = await asyncio.gather(*(
+                client.get('/api/pix/55555555/stream/start') for _ in range(300)
+            ))
+
+        codes = [response.status_code for response in responses]
+        assert codes.count(204) == settings.PIX_MAX_STREAMS_PER_ISPB
+        assert codes.count(429) == 300 - settings.PIX_MAX_STREAMS_PER_ISPB
+        assert await Stream.objects.filter(ispb='55555555').acount() == settings.PIX_MAX_STREAMS_PER_ISPB